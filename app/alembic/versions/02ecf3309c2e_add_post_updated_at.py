@@ -0,0 +1,28 @@
+"""Add post updated_at
+
+Revision ID: 02ecf3309c2e
+Revises: 9064548d7100
+Create Date: 2026-10-19 10:03:17.228940
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '02ecf3309c2e'
+down_revision: Union[str, None] = '9064548d7100'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('posts', sa.Column('updated_at', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('posts', 'updated_at')
@@ -0,0 +1,30 @@
+"""Add post version label and per-post index
+
+Revision ID: 1631bfb6da2e
+Revises: d5bb63eb902a
+Create Date: 2026-10-19 19:12:05.331870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1631bfb6da2e'
+down_revision: Union[str, None] = 'd5bb63eb902a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('post_versions', sa.Column('label', sa.String(), nullable=True))
+    op.create_index('ix_post_versions_post_id_created_at', 'post_versions', ['post_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_post_versions_post_id_created_at', table_name='post_versions')
+    op.drop_column('post_versions', 'label')
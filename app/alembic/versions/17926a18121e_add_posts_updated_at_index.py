@@ -0,0 +1,28 @@
+"""Add posts updated_at index
+
+Revision ID: 17926a18121e
+Revises: 02ecf3309c2e
+Create Date: 2026-10-19 10:41:52.870316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '17926a18121e'
+down_revision: Union[str, None] = '02ecf3309c2e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_posts_updated_at'), 'posts', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_posts_updated_at'), table_name='posts')
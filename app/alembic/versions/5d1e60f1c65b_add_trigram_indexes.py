@@ -0,0 +1,32 @@
+"""Add trigram indexes
+
+Revision ID: 5d1e60f1c65b
+Revises: f75bb4fad183
+Create Date: 2026-10-19 14:02:37.418260
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d1e60f1c65b'
+down_revision: Union[str, None] = 'f75bb4fad183'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Used by the fuzzy fallback of /suggest, which is skipped when pg_trgm is missing
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_posts_title_trgm', 'posts', ['title'], unique=False, postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+    op.create_index('ix_tags_name_trgm', 'tags', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tags_name_trgm', table_name='tags')
+    op.drop_index('ix_posts_title_trgm', table_name='posts')
@@ -0,0 +1,39 @@
+"""Add post render columns
+
+Revision ID: b3e6d9ea1b49
+Revises: 5120894dad63
+Create Date: 2026-10-19 16:04:12.337905
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e6d9ea1b49'
+down_revision: Union[str, None] = '5120894dad63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing posts are rendered by the background re-render job
+    op.add_column('posts', sa.Column('html', sa.String(), nullable=True))
+    op.add_column('posts', sa.Column('excerpt', sa.String(), nullable=True))
+    op.add_column('posts', sa.Column('word_count', sa.Integer(), nullable=True))
+    op.add_column('posts', sa.Column('content_hash', sa.String(), nullable=True))
+    op.add_column('posts', sa.Column('render_version', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_posts_render_version'), 'posts', ['render_version'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_posts_render_version'), table_name='posts')
+    op.drop_column('posts', 'render_version')
+    op.drop_column('posts', 'content_hash')
+    op.drop_column('posts', 'word_count')
+    op.drop_column('posts', 'excerpt')
+    op.drop_column('posts', 'html')
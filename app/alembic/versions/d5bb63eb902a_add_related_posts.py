@@ -0,0 +1,42 @@
+"""Add related posts
+
+Revision ID: d5bb63eb902a
+Revises: e86b8145fa7e
+Create Date: 2026-10-19 18:41:37.905114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5bb63eb902a'
+down_revision: Union[str, None] = 'e86b8145fa7e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('related_posts',
+    sa.Column('post_id', sa.String(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('related_id', sa.String(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('post_id', 'rank')
+    )
+    op.create_index(op.f('ix_related_posts_related_id'), 'related_posts', ['related_id'], unique=False)
+    op.create_table('related_queue',
+    sa.Column('post_id', sa.String(), nullable=False),
+    sa.Column('queued_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('post_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('related_queue')
+    op.drop_index(op.f('ix_related_posts_related_id'), table_name='related_posts')
+    op.drop_table('related_posts')
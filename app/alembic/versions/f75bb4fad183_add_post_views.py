@@ -0,0 +1,34 @@
+"""Add post views
+
+Revision ID: f75bb4fad183
+Revises: 17926a18121e
+Create Date: 2026-10-19 11:58:06.114592
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f75bb4fad183'
+down_revision: Union[str, None] = '17926a18121e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('post_views',
+    sa.Column('post_id', sa.String(), nullable=False),
+    sa.Column('views', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('post_id')
+    )
+    op.create_index(op.f('ix_post_views_views'), 'post_views', ['views'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_post_views_views'), table_name='post_views')
+    op.drop_table('post_views')
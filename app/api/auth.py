@@ -1,18 +1,21 @@
 import uuid
 from datetime import datetime, UTC
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.future import select
 from starlette import status
 from starlette.status import HTTP_401_UNAUTHORIZED
 
-from app.core.security import hash_password, verify_password, create_access_token, get_current_user
-from app.db.postgres import get_db
+from app.core.security import (
+    hash_password, verify_password, create_access_token, get_current_user, password_needs_rehash, rehash_password,
+)
+from app.core.tracing import TracedRoute
+from app.db.postgres import get_db, get_sessionmaker
 from app.models.models import UserCreate, UserRead
 from app.models.sql import User
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 @router.post("/auth/register", tags=["auth"], status_code=status.HTTP_201_CREATED)
 async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
@@ -69,12 +72,18 @@ async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
 
 
 @router.post("/auth/login", tags=["auth"])
-async def login(user: UserCreate, db: AsyncSession = Depends(get_db)):
+async def login(
+    user: UserCreate,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker = Depends(get_sessionmaker),
+):
     """
     Logs in a user. This function handles the login process by validating the user's credentials
     and generating an access token if the credentials are valid. It returns the access token
     and user information if the login is successful. If the credentials are invalid, it raises
-    an HTTP exception.
+    an HTTP exception. Passwords hashed with another bcrypt cost than the current one are
+    hashed again once the response is sent.
 
     :param: email: The email address of the user.
     :type: email: str
@@ -82,6 +91,8 @@ async def login(user: UserCreate, db: AsyncSession = Depends(get_db)):
     :type: password: str
     :param: db: The database session dependency for interacting with the database.
     :type: db: AsyncSession
+    :param: session_factory: The factory the password is rehashed with, after the response.
+    :type: session_factory: async_sessionmaker
     :return: A success message or the access token and user information.
 
     """
@@ -94,6 +105,9 @@ async def login(user: UserCreate, db: AsyncSession = Depends(get_db)):
     if not user or not verify_password(password, user.hashed_password):
         raise HTTPException(status_code=HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
+    if password_needs_rehash(user.hashed_password):
+        background_tasks.add_task(rehash_password, session_factory, user.id, user.hashed_password, password)
+
     # Generate access token
     access_token = create_access_token(data={"sub": user.email})
 
@@ -0,0 +1,92 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+import app.core.config as config
+from app.core.changes import change_feed
+from app.core.tracing import TracedRoute
+from app.db.postgres import get_db, get_sessionmaker
+from app.models.models import ChangesPage
+
+
+router = APIRouter(route_class=TracedRoute)
+
+@router.get("/changes", tags=["Changes"], response_model=ChangesPage)
+async def get_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=config.CHANGES_MAX_LIMIT),
+    wait: float = Query(0, ge=0, le=config.CHANGES_MAX_WAIT),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Returns the changes made to posts and tags after a cursor, oldest first.
+
+    Consumers keep the returned ``next`` cursor and pass it as ``since`` on their
+    next call, so every call only costs as much as the changes it returns. With
+    ``wait`` set, the request long-polls: if there are no changes yet, it waits up
+    to that many seconds for one before returning.
+
+    :param since: The cursor returned by the previous call, 0 to read from the beginning.
+    :type since: int
+    :param limit: The maximum number of changes to return.
+    :type limit: int
+    :param wait: The maximum time to wait for a change, in seconds.
+    :type wait: float
+    :param db: The database session dependency for interacting with the database.
+    :type db: AsyncSession
+    :return: The changes and the cursor to continue from.
+    :rtype: ChangesPage
+    """
+    changes = await change_feed.poll(db, since, limit, wait)
+    return {"changes": changes, "next": changes[-1]["id"] if changes else since}
+
+@router.get("/changes/stream", tags=["Changes"])
+async def stream_changes(
+    since: int = Query(0, ge=0),
+    last_event_id: Optional[int] = Header(None),
+    session_factory: async_sessionmaker = Depends(get_sessionmaker),
+):
+    """
+    Streams the changes after a cursor as server-sent events, one ``change`` event per
+    change with its id as the event id.
+
+    The stream ends after ``CHANGES_STREAM_SECONDS``, and EventSource clients then
+    reconnect with the ``Last-Event-ID`` header, which takes precedence over ``since``.
+
+    :param since: The id of the last change already seen.
+    :type since: int
+    :param last_event_id: The id of the last event received before reconnecting.
+    :type last_event_id: Optional[int]
+    :param session_factory: The factory used to open a session for each read.
+    :type session_factory: async_sessionmaker
+    :return: The event stream.
+    :rtype: StreamingResponse
+    """
+    cursor = since if last_event_id is None else last_event_id
+
+    async def events():
+        nonlocal cursor
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + config.CHANGES_STREAM_SECONDS
+        idle_since = loop.time()
+        yield f"retry: {int(config.CHANGES_POLL_SECONDS * 1000)}\n\n"
+        while loop.time() < deadline:
+            async with session_factory() as db:
+                changes = await change_feed.read(db, cursor, config.CHANGES_MAX_LIMIT)
+            for change in changes:
+                cursor = change["id"]
+                yield f"id: {cursor}\nevent: change\ndata: {json.dumps(change)}\n\n"
+            if changes:
+                idle_since = loop.time()
+                continue
+            if loop.time() - idle_since >= config.CHANGES_KEEPALIVE_SECONDS:
+                # Comments keep proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                idle_since = loop.time()
+            await change_feed.wait(min(config.CHANGES_POLL_SECONDS, max(deadline - loop.time(), 0)))
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+
+from app.core.metrics import metrics
+from app.core.tracing import TracedRoute
+
+
+router = APIRouter(route_class=TracedRoute)
+
+@router.get("/metrics", tags=["Metrics"])
+async def get_metrics():
+    """
+    Returns the current value of the in-process metrics of this worker, such as
+    the event loop lag and the state of the admission control gates.
+
+    :return: The metrics by name.
+    :rtype: dict
+    """
+    return metrics.snapshot()
@@ -1,14 +1,227 @@
-from fastapi import APIRouter
+from datetime import datetime, UTC
+from typing import Optional
 
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from starlette.concurrency import run_in_threadpool
 
-router = APIRouter()
+from app.core.cdn import LISTING_KEYS, cdn_purger, post_key, slug_key
+from app.core.changes import change_feed, record_change
+from app.core.diff import content_hash, diff_cache, diff_texts
+from app.core.etag import make_etag, parse_if_match
+from app.core.render import render_post
+from app.core.singleflight import feed_flights, post_flights
+from app.core.sitemap import sitemap_shards
+from app.core.suggest import suggester
+from app.core.tracing import TracedRoute
+from app.core.webhooks import enqueue_webhooks, post_event_data, webhook_dispatcher
+from app.db.postgres import get_db
+from app.models.models import PostRead, PostVersionDiff, PostVersionLabel, PostVersionRead
+from app.models.sql import Post, PostVersion
+
+
+router = APIRouter(route_class=TracedRoute)
 
 @router.get("/posts/{slug}/versions", tags=["Post Versions"])
 def get_posts_versions(slug: str):
     #TODO: Implement logic to get all versions of a specific post
     pass
 
-@router.post("/posts/{slug}/restore/{version_id}", tags=["Post Versions"])
-def restore_post(slug: str, version_id: int):
-    #TODO: Implement logic to restore a specific version of a post
-    pass
+@router.get("/posts/{slug}/versions/{a}/diff/{b}", tags=["Post Versions"], response_model=PostVersionDiff)
+async def diff_post_versions(slug: str, a: int, b: int, db: AsyncSession = Depends(get_db)):
+    """
+    Compares two versions of a post and returns a structured line level diff, with
+    replaced lines refined into word level changes.
+
+    Diffs are memoized by the content hashes of both versions, so repeated comparisons
+    of the same pair are served from memory. The diff itself runs in a worker thread
+    and is bounded by ``DIFF_CPU_BUDGET``; when the budget is exhausted the remaining
+    changes are reported as whole-block replacements and ``coarse`` is set.
+
+    :param slug: The unique identifier of the post.
+    :type slug: str
+    :param a: The version number to compare from.
+    :type a: int
+    :param b: The version number to compare to.
+    :type b: int
+    :param db: The database session dependency for interacting with the database.
+    :type db: AsyncSession
+    :return: The diff between the two versions.
+    :rtype: PostVersionDiff
+    :raises HTTPException: If the post or one of the versions does not exist.
+    """
+
+    # Check if the post exists
+    result = await db.execute(select(Post.id).where(Post.slug == slug))
+    post_id = result.scalar_one_or_none()
+    if not post_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post does not exist")
+
+    # Fetch both versions at once
+    result = await db.execute(
+        select(PostVersion).where(PostVersion.post_id == post_id, PostVersion.version.in_([str(a), str(b)]))
+    )
+    # Versions are stored as strings, compare them as such rather than parsing what was stored
+    versions = {version.version: version for version in result.scalars().all()}
+    if str(a) not in versions or str(b) not in versions:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Version does not exist")
+
+    old, new = versions[str(a)], versions[str(b)]
+    key = (content_hash(old.content), content_hash(new.content))
+    diff = diff_cache.get(key)
+    if diff is None:
+        diff = await run_in_threadpool(diff_texts, old.content, new.content)
+        diff_cache.set(key, diff)
+
+    return {
+        "slug": slug,
+        "from_version": a,
+        "to_version": b,
+        "from_hash": key[0],
+        "to_hash": key[1],
+        **diff,
+    }
+
+@router.put("/posts/{slug}/versions/{version_id}/label", tags=["Post Versions"], response_model=PostVersionRead)
+async def label_post_version(
+    slug: str,
+    version_id: int,
+    label: PostVersionLabel,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Sets or clears the label of a version of a post.
+
+    Labelled versions, such as published milestones, are exempt from the retention
+    policy and kept forever; clearing the label makes the version subject to it again.
+
+    :param slug: The unique identifier of the post.
+    :type slug: str
+    :param version_id: The version number to label.
+    :type version_id: int
+    :param label: The new label, or null to clear it.
+    :type label: PostVersionLabel
+    :param db: The database session dependency for interacting with the database.
+    :type db: AsyncSession
+    :return: The labelled version.
+    :rtype: PostVersionRead
+    :raises HTTPException: If the post or the version does not exist.
+    """
+    result = await db.execute(
+        update(PostVersion)
+        .where(
+            PostVersion.post_id == select(Post.id).where(Post.slug == slug).scalar_subquery(),
+            PostVersion.version == str(version_id),
+        )
+        .values(label=label.label or None)
+        .returning(PostVersion)
+    )
+    version = result.scalar_one_or_none()
+    if version is None:
+        await db.rollback()
+        await _ensure_version_exists(slug, version_id, db)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Version does not exist")
+    await record_change(
+        db, "post_version", version.id, "updated", {"slug": slug, "version": version.version, "label": version.label}
+    )
+    await db.commit()
+    change_feed.notify()
+    return version
+
+@router.post("/posts/{slug}/restore/{version_id}", tags=["Post Versions"], response_model=PostRead)
+async def restore_post(
+    slug: str,
+    version_id: int,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Restores the title and content of a post from one of its versions.
+
+    Like post updates, restores require the post's current ETag in the ``If-Match``
+    header. The version is read and rendered first, then written to the post along
+    with its render in a single conditional ``UPDATE ... WHERE revision = ?``, so a
+    restore never clobbers an edit made after the client last read the post.
+
+    :param slug: The unique identifier of the post.
+    :type slug: str
+    :param version_id: The version number to restore.
+    :type version_id: int
+    :param response: The outgoing response, used to set the new ETag header.
+    :type response: Response
+    :param if_match: The ETag of the revision the restore is based on.
+    :type if_match: Optional[str]
+    :param db: The database session dependency for interacting with the database.
+    :type db: AsyncSession
+    :return: The restored post.
+    :rtype: PostRead
+    :raises HTTPException: If the post or version does not exist, if If-Match is missing (428)
+                           or if the post has been modified since the given ETag (412).
+    """
+
+    if if_match is None:
+        await _ensure_version_exists(slug, version_id, db)
+        raise HTTPException(status_code=status.HTTP_428_PRECONDITION_REQUIRED, detail="If-Match header required")
+    expected_revision = parse_if_match(if_match)
+
+    result = await db.execute(
+        select(PostVersion.title, PostVersion.content)
+        .join(Post, Post.id == PostVersion.post_id)
+        .where(Post.slug == slug, PostVersion.version == str(version_id))
+    )
+    version = result.one_or_none()
+    if version is None:
+        await _ensure_version_exists(slug, version_id, db)
+        # The post or version may have been created since the select
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Version does not exist")
+    rendered = await run_in_threadpool(render_post, version.content)
+
+    # Write the version onto the post only if the post is still at the expected revision
+    statement = update(Post).where(Post.slug == slug)
+    if expected_revision is not None:
+        statement = statement.where(Post.revision == expected_revision)
+    statement = statement.values(
+        title=version.title,
+        content=version.content,
+        revision=Post.revision + 1,
+        updated_at=datetime.now(UTC).strftime("%Y-%m-%d %H:%M:%S"),
+        **rendered,
+    ).returning(Post)
+
+    result = await db.execute(statement)
+    restored_post = result.scalar_one_or_none()
+    if not restored_post:
+        await db.rollback()
+        await _ensure_version_exists(slug, version_id, db)
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Post has been modified")
+
+    await enqueue_webhooks(db, "post.updated", {**post_event_data(restored_post), "restored_version": version_id})
+    await record_change(db, "post", restored_post.id, "updated", {"slug": restored_post.slug, "restored_version": version_id})
+    await db.commit()
+    change_feed.notify()
+    webhook_dispatcher.notify()
+    sitemap_shards.invalidate(restored_post.id)
+    suggester.post_saved(restored_post)
+    post_flights.forget(restored_post.slug)
+    feed_flights.clear()
+    cdn_purger.purge(post_key(restored_post.id), slug_key(restored_post.slug), *LISTING_KEYS)
+
+    response.headers["ETag"] = make_etag(restored_post.revision)
+    return restored_post
+
+
+async def _ensure_version_exists(slug: str, version_id: int, db: AsyncSession) -> None:
+    # Only used on failure paths to report a missing post or version instead of a failed precondition
+    result = await db.execute(select(Post.id).where(Post.slug == slug))
+    post_id = result.scalar_one_or_none()
+    if not post_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post does not exist")
+
+    result = await db.execute(
+        select(PostVersion.id).where(PostVersion.post_id == post_id, PostVersion.version == str(version_id))
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Version does not exist")
@@ -1,17 +1,49 @@
 import uuid
-
-from fastapi import APIRouter, status, HTTPException, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, UTC
+from typing import Optional
+
+from fastapi import APIRouter, status, HTTPException, Depends, Header, Response
+from sqlalchemy import String, any_, bindparam, delete, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.future import select
-
-from app.db.postgres import get_db
-from app.models.models import PostCreate, PostRead, PostUpdate
-from app.models.sql import Post
-
-router = APIRouter()
+from starlette.concurrency import run_in_threadpool
+
+import app.core.config as config
+from app.core.cdn import LISTING_KEYS, POSTS_KEY, cdn_purger, post_key, set_surrogate_keys, slug_key, surrogate_headers
+from app.core.changes import change_feed, record_change
+from app.core.etag import make_etag, parse_if_match
+from app.core.loader import Loaders, get_loaders
+from app.core.related import queue_related_refresh
+from app.core.render import render_post
+from app.core.sitemap import sitemap_shards
+from app.core.singleflight import MISSING, feed_flights, post_flights
+from app.core.slug_filter import slug_filter
+from app.core.suggest import suggester
+from app.core.tracing import TracedRoute
+from app.core.views import view_counter
+from app.core.webhooks import enqueue_webhooks, post_event_data, webhook_dispatcher
+from app.db.postgres import dialect_name, get_db, get_sessionmaker
+from app.models.models import PostBatchItem, PostBatchRequest, PostCreate, PostListItem, PostRead, PostUpdate
+from app.models.sql import Post, PostView
+
+router = APIRouter(route_class=TracedRoute)
+
+async def _fetch_post(slug: str, session_factory: async_sessionmaker) -> Optional[Post]:
+    # Shared by every waiting request, so it must not use any one request's session
+    async with session_factory() as db:
+        result = await db.execute(select(Post).where(Post.slug == slug))
+        return result.scalar_one_or_none()
+
+async def _ensure_post_exists(slug: str, db: AsyncSession) -> None:
+    # Only used on failure paths to tell a missing post apart from a failed precondition
+    result = await db.execute(select(Post.id).where(Post.slug == slug))
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Slug does not exist")
 
 @router.post("/posts/", tags=["Posts"], response_model=PostRead, status_code=status.HTTP_201_CREATED)
-async def create_post(post : PostCreate, db: AsyncSession = Depends(get_db)):
+async def create_post(post : PostCreate, response: Response, db: AsyncSession = Depends(get_db)):
     """
     Creates a new blog post. This function handles the creation of a post provided by the user
     and stores it in the database. It ensures that the slug for the post is unique. If the slug
@@ -20,6 +52,8 @@ async def create_post(post : PostCreate, db: AsyncSession = Depends(get_db)):
 
     :param post: The PostCreate object containing the details for the post to be created.
     :type post: PostCreate
+    :param response: The outgoing response, used to set the ETag header.
+    :type response: Response
     :param db: The asynchronous database session dependency to interact with the database.
     :type db: AsyncSession
     :return: The newly created post as a PostRead object.
@@ -33,101 +67,229 @@ async def create_post(post : PostCreate, db: AsyncSession = Depends(get_db)):
     if existing_post:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Slug already exists")
 
-    # Create a new post
+    # Create a new post, rendered once here rather than on every view
+    rendered = await run_in_threadpool(render_post, post.content)
     new_post = Post(
         id=str(uuid.uuid4()),
         title=post.title,
         content=post.content,
         user_id=post.user_id,
-        slug=post.slug
+        slug=post.slug,
+        # Set upfront rather than by the column default, the event payload below needs it
+        revision=1,
+        updated_at=datetime.now(UTC).strftime("%Y-%m-%d %H:%M:%S"),
+        **rendered,
     )
 
     # Add the new post to the database
     db.add(new_post)
+    await enqueue_webhooks(db, "post.created", post_event_data(new_post))
+    await record_change(db, "post", new_post.id, "created", {"slug": new_post.slug})
     await  db.commit()
     await db.refresh(new_post)
-
+    change_feed.notify()
+    webhook_dispatcher.notify()
+    sitemap_shards.post_added(new_post.id)
+    slug_filter.add(new_post.slug)
+    suggester.post_saved(new_post)
+    post_flights.forget(new_post.slug)
+    feed_flights.clear()
+    # The CDN may hold a 404 for the slug
+    cdn_purger.purge(slug_key(new_post.slug), *LISTING_KEYS)
+
+    response.headers["ETag"] = make_etag(new_post.revision)
     return new_post
 
 @router.put("/posts/{slug}", tags=["Posts"], response_model=PostRead, status_code=status.HTTP_200_OK)
-async def update_post(slug: str, post: PostUpdate, db: AsyncSession = Depends(get_db)):
+async def update_post(
+    slug: str,
+    post: PostUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
     """
-    Update an existing post based on the given slug. Validates the uniqueness of the slug and performs
-    an update in the database if the post exists. If the post with the specified slug does not exist or
-    the new slug is already in use, an appropriate HTTP exception is raised.
+    Update an existing post based on the given slug, using optimistic concurrency control.
+
+    The client must send the post's current ETag in the ``If-Match`` header. The update is
+    applied with a single conditional ``UPDATE ... WHERE revision = ?`` that also bumps the
+    revision, so concurrent editors never overwrite each other and no row locks are held.
+    If another edit landed first, the request fails with 412 and the client has to re-fetch.
 
     :param slug: The unique identifier for the post that needs to be updated
     :type slug: str
     :param post: The data containing the updated post details
     :type post: PostUpdate
+    :param response: The outgoing response, used to set the new ETag header
+    :type response: Response
+    :param if_match: The ETag of the revision the update is based on
+    :type if_match: Optional[str]
     :param db: The database session dependency for interacting with the database
     :type db: AsyncSession
     :return: The updated post object after successful modification and saving to the database
     :rtype: PostRead
-    :raises HTTPException: If the post with the specified slug does not exist or if the new slug is
-                           already in use by another post
+    :raises HTTPException: If the post with the specified slug does not exist, if the new slug is
+                           already in use by another post, if If-Match is missing (428) or if the
+                           post has been modified since the given ETag (412)
     """
 
-    # Check if the post exists in order to update it
-    result = await db.execute(select(Post).where(Post.slug == slug))
-    existing_post = result.scalar_one_or_none()
-    if not existing_post:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Slug does not exist")
-
-    # Check if the new slug is unique
-    result = await db.execute(select(Post).where(Post.slug == post.slug))
-    existing_slug_post = result.scalar_one_or_none()
-    if existing_slug_post and existing_slug_post.id != existing_post.id:
+    if if_match is None:
+        await _ensure_post_exists(slug, db)
+        raise HTTPException(status_code=status.HTTP_428_PRECONDITION_REQUIRED, detail="If-Match header required")
+    expected_revision = parse_if_match(if_match)
+
+    # Apply the update only if the post is still at the expected revision
+    rendered = await run_in_threadpool(render_post, post.content)
+    statement = update(Post).where(Post.slug == slug)
+    if expected_revision is not None:
+        statement = statement.where(Post.revision == expected_revision)
+    statement = statement.values(
+        title=post.title,
+        content=post.content,
+        slug=post.slug,
+        revision=Post.revision + 1,
+        updated_at=datetime.now(UTC).strftime("%Y-%m-%d %H:%M:%S"),
+        **rendered,
+    ).returning(Post)
+
+    try:
+        result = await db.execute(statement)
+        updated_post = result.scalar_one_or_none()
+    except IntegrityError:
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Slug already exists")
 
-    # Update the post
-    existing_post.title = post.title
-    existing_post.content = post.content
-    existing_post.slug = post.slug
+    if not updated_post:
+        await db.rollback()
+        await _ensure_post_exists(slug, db)
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Post has been modified")
 
     # Commit the changes to the database
-    db.add(existing_post)
+    await enqueue_webhooks(db, "post.updated", {**post_event_data(updated_post), "previous_slug": slug})
+    await record_change(db, "post", updated_post.id, "updated", {"slug": updated_post.slug, "previous_slug": slug})
     await db.commit()
-    await db.refresh(existing_post)
-
-    return existing_post
-
-@router.get("/posts/", tags=["Posts"])
-async def list_posts(db: AsyncSession = Depends(get_db)):
+    change_feed.notify()
+    webhook_dispatcher.notify()
+    sitemap_shards.invalidate(updated_post.id)
+    slug_filter.add(updated_post.slug)
+    if updated_post.slug != slug:
+        slug_filter.discard(slug)
+    suggester.post_saved(updated_post)
+    post_flights.forget(slug)
+    post_flights.forget(updated_post.slug)
+    feed_flights.clear()
+    cdn_purger.purge(post_key(updated_post.id), slug_key(slug), slug_key(updated_post.slug), *LISTING_KEYS)
+
+    response.headers["ETag"] = make_etag(updated_post.revision)
+    return updated_post
+
+@router.get("/posts/", tags=["Posts"], response_model=list[PostListItem])
+async def list_posts(response: Response, db: AsyncSession = Depends(get_db), loaders: Loaders = Depends(get_loaders)):
     """
     Fetches and returns a list of all posts from the database.
 
     This function queries the database to retrieve all available posts. It
     executes a SELECT statement on the `Post` table, collects the results, and
-    returns the posts in the response.
+    returns the posts in the response. Each post embeds its author and tags, which
+    are loaded for all posts at once, so the endpoint runs three queries however
+    many posts there are.
 
+    :param response: The outgoing response, used to set the surrogate keys.
+    :type response: Response
     :param db: The database session dependency used for executing the query.
     :type db: AsyncSession
+    :param loaders: The request scoped loaders of the authors and tags.
+    :type loaders: Loaders
     :return: A list of all posts retrieved from the database.
-    :rtype: list
+    :rtype: list[PostListItem]
     """
 
     # Fetch all posts from the database
     result = await db.execute(select(Post))
     posts = result.scalars().all()
 
-    return posts
+    authors = await loaders.authors.load_many([post.user_id for post in posts])
+    tags = await loaders.post_tags.load_many([post.id for post in posts])
+
+    set_surrogate_keys(response, POSTS_KEY)
+    return [
+        {**PostListItem.model_validate(post, from_attributes=True).model_dump(), "author": author, "tags": post_tags}
+        for post, author, post_tags in zip(posts, authors, tags)
+    ]
+
+@router.post("/posts/batch", tags=["Posts"], response_model=list[PostBatchItem], status_code=status.HTTP_200_OK)
+async def get_posts_batch(batch: PostBatchRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Fetch several posts at once, by slug or by id.
+
+    All requested posts are resolved with a single ``WHERE ... = ANY(...)`` query.
+    Slugs that are cached, or that the negative-lookup filter knows to be missing,
+    are answered without touching the database. Results are returned in request order, with
+    ``found`` set to false for keys that do not match any post.
+
+    :param batch: The slugs or the ids of the posts to fetch.
+    :type batch: PostBatchRequest
+    :param db: The database session dependency for interacting with the database.
+    :type db: AsyncSession
+    :return: One item per requested key, in request order.
+    :rtype: list[PostBatchItem]
+    :raises HTTPException: If neither or both of slugs and ids are given, or if too
+                           many keys are requested.
+    """
+
+    if (batch.slugs is None) == (batch.ids is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Provide either slugs or ids")
+    keys = batch.slugs if batch.slugs is not None else batch.ids
+    if len(keys) > config.POSTS_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {config.POSTS_BATCH_MAX} posts can be requested at once",
+        )
+
+    column = Post.slug if batch.slugs is not None else Post.id
+    lookup = set(keys)
+    posts = {}
+    if batch.slugs is not None:
+        lookup = {slug for slug in lookup if slug_filter.might_contain(slug)}
+        for slug in list(lookup):
+            cached = post_flights.peek(slug)
+            if cached is not MISSING:
+                lookup.discard(slug)
+                if cached is not None:
+                    posts[slug] = cached
+
+    # Resolve every remaining key in a single query
+    if lookup:
+        if dialect_name(db) == "postgresql":
+            # One array parameter keeps a single prepared statement whatever the batch size
+            condition = column == any_(bindparam("keys", list(lookup), type_=ARRAY(String)))
+        else:
+            condition = column.in_(lookup)
+        result = await db.execute(select(Post).where(condition))
+        posts.update({getattr(post, column.key): post for post in result.scalars().all()})
+
+    return [
+        {"key": key, "found": key in posts, "post": posts.get(key)}
+        for key in keys
+    ]
 
 @router.get("/posts/{slug}", tags=["Posts"], response_model=PostRead, status_code=status.HTTP_200_OK)
-async def get_post(slug: str, db: AsyncSession = Depends(get_db)):
+async def get_post(slug: str, response: Response, session_factory: async_sessionmaker = Depends(get_sessionmaker)):
     """
     Fetch a post by its unique slug from the database.
 
     This endpoint retrieves a specific post based on the slug provided in the
     request. The slug is a unique identifier for each post in the database.
     If no post with the provided slug is found, an HTTP exception is raised.
+    Concurrent requests for the same slug share a single query.
 
     :param slug: The unique identifier for the post, provided as a string
                  in the URL path.
     :type slug: str
-    :param db: An asynchronous database session object used for querying
-               the post.
-    :type db: AsyncSession
+    :param response: The outgoing response, used to set the ETag and surrogate key headers.
+    :type response: Response
+    :param session_factory: The factory the shared query opens its own session with.
+    :type session_factory: async_sessionmaker
     :return: The post corresponding to the given slug if it exists in
              the database.
     :rtype: Post
@@ -135,12 +297,26 @@ async def get_post(slug: str, db: AsyncSession = Depends(get_db)):
                            post, raises an HTTP 400 exception.
     """
 
-    # Check if the post exists
-    result = await db.execute(select(Post).where(Post.slug == slug))
-    existing_post = result.scalar_one_or_none()
+    # Slugs the filter has never seen cannot exist, so skip the query for them. Posts
+    # other workers created are only known after the next catch-up of the filter
+    if not slug_filter.might_contain(slug):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Post does not exist", headers=surrogate_headers([slug_key(slug)])
+        )
+
+    # Check if the post exists, sharing the query with concurrent requests for the same slug
+    try:
+        existing_post = await post_flights.do(slug, lambda: _fetch_post(slug, session_factory))
+    except TimeoutError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Timed out fetching post")
     if not existing_post:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post does not exist")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Post does not exist", headers=surrogate_headers([slug_key(slug)])
+        )
 
+    view_counter.incr(existing_post.id)
+    response.headers["ETag"] = make_etag(existing_post.revision)
+    set_surrogate_keys(response, post_key(existing_post.id), slug_key(slug))
     return existing_post
 
 
@@ -173,9 +349,21 @@ async def delete_post(slug: str, db: AsyncSession = Depends(get_db)):
     if not existing_post:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post does not exist")
 
-    # Delete the post
+    # Delete the post along with its view counter
     await db.delete(existing_post)
+    await db.execute(delete(PostView).where(PostView.post_id == existing_post.id))
+    await queue_related_refresh(db, existing_post.id)
+    await enqueue_webhooks(db, "post.deleted", {"id": existing_post.id, "slug": existing_post.slug})
+    await record_change(db, "post", existing_post.id, "deleted", {"slug": existing_post.slug})
     await db.commit()
+    change_feed.notify()
+    webhook_dispatcher.notify()
+    sitemap_shards.post_removed(existing_post.id)
+    slug_filter.discard(existing_post.slug)
+    suggester.post_removed(existing_post.id)
+    post_flights.forget(existing_post.slug)
+    feed_flights.clear()
+    cdn_purger.purge(post_key(existing_post.id), slug_key(existing_post.slug), *LISTING_KEYS)
 
     return {
         "detail": "Post deleted successfully"
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException, status
+
+from app.core.tracing import TracedRoute
+from app.core.warmup import warmup
+
+
+router = APIRouter(route_class=TracedRoute)
+
+@router.get("/ready", tags=["Health"])
+async def get_ready():
+    """
+    Readiness probe for load balancers. Reports ready only once the startup
+    warm-up has finished, and not ready again as soon as shutdown begins.
+
+    :return: The readiness status and the outcome of each warm-up step.
+    :rtype: dict
+    :raises HTTPException: With status 503 while the worker is not ready.
+    """
+    if not warmup.ready:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Warming up")
+    return {"status": "ready", "warmup": warmup.steps}
@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.cdn import RELATED_KEY, post_key, set_surrogate_keys, slug_key
+from app.core.tracing import TracedRoute
+from app.db.postgres import get_db
+from app.models.models import RelatedPostRead
+from app.models.sql import Post, RelatedPost
+
+
+router = APIRouter(route_class=TracedRoute)
+
+@router.get("/posts/{slug}/related", tags=["Posts"], response_model=list[RelatedPostRead])
+async def get_related_posts(slug: str, response: Response, db: AsyncSession = Depends(get_db)):
+    """
+    Returns the posts most related to a post by shared tags, best first.
+
+    Related posts are precomputed in the background whenever tags change, so this
+    is a single lookup of the ``related_posts`` primary key. A post whose tags just
+    changed may show its previous related posts for a few seconds.
+
+    :param slug: The unique identifier of the post.
+    :type slug: str
+    :param db: The database session dependency for interacting with the database.
+    :type db: AsyncSession
+    :return: The related posts, with their similarity score between 0 and 1.
+    :rtype: list[RelatedPostRead]
+    :raises HTTPException: If the post does not exist.
+    """
+    source = select(Post.id).where(Post.slug == slug).scalar_subquery()
+    result = await db.execute(
+        select(Post.id, Post.slug, Post.title, Post.excerpt, RelatedPost.score)
+        .join(RelatedPost, RelatedPost.related_id == Post.id)
+        .where(RelatedPost.post_id == source)
+        .order_by(RelatedPost.rank)
+    )
+    related = [row._asdict() for row in result.all()]
+    if not related:
+        # Only then tell a post without related posts apart from a missing post
+        result = await db.execute(select(Post.id).where(Post.slug == slug))
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post does not exist")
+    # The related posts show in the page as well, and the list changes whenever it is recomputed
+    set_surrogate_keys(response, slug_key(slug), RELATED_KEY, *(post_key(post["id"]) for post in related))
+    return related
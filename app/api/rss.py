@@ -1,9 +1,37 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
+import app.core.config as config
+from app.core.cdn import FEED_KEY, surrogate_headers
+from app.core.feed import build_feed
+from app.core.singleflight import feed_flights
+from app.core.tracing import TracedRoute
+from app.db.postgres import get_sessionmaker
 
-router = APIRouter()
+
+router = APIRouter(route_class=TracedRoute)
 
 @router.get("/rss.xml", tags=["rss"])
-def get_rss():
-    #TODO: Implement logic to get RSS feed
-    pass
\ No newline at end of file
+async def get_rss(session_factory: async_sessionmaker = Depends(get_sessionmaker)):
+    """
+    Returns the RSS feed of the most recently updated posts.
+
+    Concurrent requests share a single build of the feed, which is cached for
+    ``FEED_CACHE_TTL`` seconds and served stale for up to ``FEED_CACHE_STALE_TTL``
+    more seconds while it is rebuilt. Absolute URLs start with ``SITE_URL``, never
+    with the Host of the request, which clients choose and the cache would keep.
+
+    :param session_factory: The factory the shared build opens its own session with.
+    :type session_factory: async_sessionmaker
+    :return: The RSS XML document.
+    :rtype: Response
+    :raises HTTPException: If ``SITE_URL`` is not configured, or building the feed times out.
+    """
+    if not config.SITE_URL:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="SITE_URL is not configured")
+    base_url = config.SITE_URL.rstrip("/")
+    try:
+        feed = await feed_flights.do(base_url, lambda: build_feed(base_url, session_factory))
+    except TimeoutError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Timed out building feed")
+    return Response(content=feed, media_type="application/rss+xml", headers=surrogate_headers([FEED_KEY]))
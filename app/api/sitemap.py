@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.core.config as config
+from app.core.cdn import SITEMAP_KEY, surrogate_headers
+from app.core.sitemap import sitemap_shards
+from app.core.tracing import TracedRoute
+from app.db.postgres import get_db
+
+
+router = APIRouter(route_class=TracedRoute)
+
+def _base_url() -> str:
+    # Never taken from the Host header: clients choose it, and the documents are cached
+    base_url = config.SITEMAP_BASE_URL or config.SITE_URL
+    if not base_url:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="SITEMAP_BASE_URL or SITE_URL is not configured"
+        )
+    return base_url.rstrip("/")
+
+@router.get("/sitemap.xml", tags=["Sitemap"])
+async def get_sitemap_index(db: AsyncSession = Depends(get_db)):
+    """
+    Returns the sitemap index, which links one sitemap shard per block of at most
+    ``SITEMAP_SHARD_SIZE`` posts. Absolute URLs start with ``SITEMAP_BASE_URL``,
+    or ``SITE_URL`` if it is not set.
+
+    :param db: The database session dependency for interacting with the database.
+    :type db: AsyncSession
+    :return: The sitemap index XML document.
+    :rtype: Response
+    :raises HTTPException: If neither base URL is configured.
+    """
+    document = await sitemap_shards.index(db, _base_url())
+    return Response(content=document, media_type="application/xml", headers=surrogate_headers([SITEMAP_KEY]))
+
+@router.get("/sitemaps/{shard}.xml", tags=["Sitemap"])
+async def get_sitemap_shard(shard: int, db: AsyncSession = Depends(get_db)):
+    """
+    Returns one sitemap shard listing the posts of its key range. Shards are cached
+    and only re-rendered after a post in their range changes.
+
+    :param shard: The shard number, as linked from the sitemap index.
+    :type shard: int
+    :param db: The database session dependency for interacting with the database.
+    :type db: AsyncSession
+    :return: The urlset XML document of the shard.
+    :rtype: Response
+    :raises HTTPException: If the shard does not exist, or if neither base URL is configured.
+    """
+    document = await sitemap_shards.shard(db, _base_url(), shard)
+    if document is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sitemap does not exist")
+    return Response(content=document, media_type="application/xml", headers=surrogate_headers([SITEMAP_KEY]))
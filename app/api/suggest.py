@@ -0,0 +1,42 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.core.config as config
+from app.core.suggest import suggester
+from app.core.tracing import TracedRoute
+from app.db.postgres import get_db
+from app.models.models import Suggestions
+
+
+router = APIRouter(route_class=TracedRoute)
+
+@router.get("/suggest", tags=["Suggestions"], response_model=Suggestions)
+async def suggest(
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Literal["all", "posts", "tags"] = "all",
+    limit: int = Query(10, ge=1, le=config.SUGGEST_MAX_LIMIT),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Suggests post titles and tag names as the user types.
+
+    Suggestions come from in-memory prefix indexes and match any word of a title or
+    tag name. When nothing matches the prefix, fuzzy matches are looked up with
+    ``pg_trgm`` instead, if the extension is installed.
+
+    :param q: The text typed so far.
+    :type q: str
+    :param kind: Whether to suggest posts, tags or both.
+    :type kind: str
+    :param limit: The maximum number of suggestions of each kind.
+    :type limit: int
+    :param db: The database session dependency, used when the indexes cannot answer.
+    :type db: AsyncSession
+    :return: The suggested posts and tags.
+    :rtype: Suggestions
+    """
+    posts = await suggester.posts(db, q, limit) if kind in ("all", "posts") else []
+    tags = await suggester.tag_names(db, q, limit) if kind in ("all", "tags") else []
+    return {"posts": posts, "tags": tags}
@@ -1,14 +1,115 @@
-from fastapi import APIRouter
+import uuid
 
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.future import select
 
-router = APIRouter()
+from app.core.cdn import POSTS_KEY, TAGS_KEY, cdn_purger, set_surrogate_keys
+from app.core.changes import change_feed, record_change
+from app.core.related import queue_related_refresh
+from app.core.singleflight import tag_flights
+from app.core.suggest import suggester
+from app.core.tracing import TracedRoute
+from app.db.postgres import get_db, get_sessionmaker, insert
+from app.models.models import TagCreate, TagRead
+from app.models.sql import Post, PostTag, Tag
 
-@router.get("/tags/", tags=["Tags"])
-def get_tags():
-    #TODO: Implement logic to get all tags
-    pass
 
-@router.post("/posts/{slug}/tags", tags=["Tags"])
-def add_post_tags(slug: str):
-    #TODO: Implement logic to add tags to a specific post
-    pass
\ No newline at end of file
+router = APIRouter(route_class=TracedRoute)
+
+async def _fetch_tags(session_factory: async_sessionmaker) -> list[Tag]:
+    # Shared by every waiting request, so it must not use any one request's session
+    async with session_factory() as db:
+        result = await db.execute(select(Tag).order_by(Tag.name))
+        return result.scalars().all()
+
+@router.get("/tags/", tags=["Tags"], response_model=list[TagRead])
+async def get_tags(response: Response, session_factory: async_sessionmaker = Depends(get_sessionmaker)):
+    """
+    Fetches all tags, ordered by name.
+
+    Concurrent requests share a single query, and the result is cached for
+    ``TAGS_CACHE_TTL`` seconds and served stale for up to ``TAGS_CACHE_STALE_TTL``
+    more seconds while it is refreshed.
+
+    :param session_factory: The factory the shared query opens its own session with.
+    :type session_factory: async_sessionmaker
+    :return: A list of all tags.
+    :rtype: list[TagRead]
+    """
+    set_surrogate_keys(response, TAGS_KEY)
+    try:
+        return await tag_flights.do("tags", lambda: _fetch_tags(session_factory))
+    except TimeoutError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Timed out fetching tags")
+
+@router.post("/posts/{slug}/tags", tags=["Tags"], response_model=list[TagRead])
+async def add_post_tags(slug: str, tags: list[TagCreate], db: AsyncSession = Depends(get_db)):
+    """
+    Adds tags to a post, creating the tags that do not exist yet.
+
+    Tags the post already has are left as they are, so the request can safely be repeated.
+
+    :param slug: The unique identifier of the post.
+    :type slug: str
+    :param tags: The tags to add to the post.
+    :type tags: list[TagCreate]
+    :param db: The database session dependency for interacting with the database.
+    :type db: AsyncSession
+    :return: All tags of the post, ordered by name.
+    :rtype: list[TagRead]
+    :raises HTTPException: If the post does not exist or a tag name is empty.
+    """
+    result = await db.execute(select(Post.id).where(Post.slug == slug))
+    post_id = result.scalar_one_or_none()
+    if not post_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post does not exist")
+
+    names = list(dict.fromkeys(tag.name.strip() for tag in tags))
+    if "" in names:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Tag names cannot be empty")
+
+    created = []
+    if names:
+        # Create missing tags, tolerating concurrent requests creating the same ones
+        result = await db.execute(
+            insert(db, Tag)
+            .values([{"id": str(uuid.uuid4()), "name": name} for name in names])
+            .on_conflict_do_nothing(index_elements=[Tag.name])
+            .returning(Tag.id, Tag.name)
+        )
+        created = result.all()
+
+        result = await db.execute(select(Tag.id).where(Tag.name.in_(names)))
+        result = await db.execute(
+            insert(db, PostTag)
+            .values([{"post_id": post_id, "tag_id": tag_id} for tag_id in result.scalars().all()])
+            .on_conflict_do_nothing()
+            .returning(PostTag.tag_id)
+        )
+        linked = result.scalars().all()
+
+        for tag in created:
+            await record_change(db, "tag", tag.id, "created", {"name": tag.name})
+        if linked:
+            await queue_related_refresh(db, post_id)
+        for tag_id in linked:
+            await record_change(db, "post_tag", f"{post_id}:{tag_id}", "created", {"post_id": post_id, "tag_id": tag_id})
+        await db.commit()
+        if created or linked:
+            change_feed.notify()
+        # Tags only show in the list of posts and the list of tags
+        if linked:
+            cdn_purger.purge(POSTS_KEY)
+        if created:
+            cdn_purger.purge(TAGS_KEY)
+
+    for tag in created:
+        suggester.tag_saved(tag)
+    if created:
+        tag_flights.clear()
+
+    result = await db.execute(
+        select(Tag).join(PostTag, PostTag.tag_id == Tag.id).where(PostTag.post_id == post_id).order_by(Tag.name)
+    )
+    return result.scalars().all()
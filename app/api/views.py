@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.future import select
+
+import app.core.config as config
+from app.core.tracing import TracedRoute
+from app.core.views import view_counter
+from app.db.postgres import get_db, get_sessionmaker
+from app.models.models import PostViews, TopPost
+from app.models.sql import Post
+
+
+router = APIRouter(route_class=TracedRoute)
+
+@router.get("/posts/{slug}/views", tags=["Views"], response_model=PostViews)
+async def get_post_views(
+    slug: str,
+    db: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker = Depends(get_sessionmaker),
+):
+    """
+    Returns the number of views of a post.
+
+    Totals are read from a cache refreshed every ``VIEWS_CACHE_TTL`` seconds, and
+    views counted by this worker that have not been flushed yet are added on top.
+
+    :param slug: The unique identifier of the post.
+    :type slug: str
+    :param db: The database session dependency for interacting with the database.
+    :type db: AsyncSession
+    :param session_factory: The factory the shared read of the total opens its own session with.
+    :type session_factory: async_sessionmaker
+    :return: The slug and number of views of the post.
+    :rtype: PostViews
+    :raises HTTPException: If the post does not exist.
+    """
+    result = await db.execute(select(Post.id).where(Post.slug == slug))
+    post_id = result.scalar_one_or_none()
+    if not post_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post does not exist")
+
+    return {"slug": slug, "views": await view_counter.count(session_factory, post_id)}
+
+@router.get("/stats/top-posts", tags=["Views"], response_model=list[TopPost])
+async def get_top_posts(
+    limit: int = Query(10, ge=1, le=config.VIEWS_TOP_MAX),
+    session_factory: async_sessionmaker = Depends(get_sessionmaker),
+):
+    """
+    Returns the most viewed posts, from a cache refreshed every ``VIEWS_CACHE_TTL`` seconds.
+
+    :param limit: The number of posts to return.
+    :type limit: int
+    :param session_factory: The factory the shared read of the ranking opens its own session with.
+    :type session_factory: async_sessionmaker
+    :return: The most viewed posts, most viewed first.
+    :rtype: list[TopPost]
+    """
+    return await view_counter.top(session_factory, limit)
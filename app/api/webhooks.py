@@ -0,0 +1,109 @@
+import uuid
+from datetime import datetime, UTC
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.security import get_current_user
+from app.core.tracing import TracedRoute
+from app.db.postgres import get_db
+from app.models.models import WebhookCreate, WebhookRead
+from app.models.sql import User, WebhookEndpoint
+
+
+router = APIRouter(route_class=TracedRoute)
+
+# Events sent to webhook endpoints
+WEBHOOK_EVENTS = ("post.created", "post.updated", "post.deleted")
+
+async def _require_superuser(current_user: User = Depends(get_current_user)) -> User:
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Managing webhooks requires a superuser")
+    return current_user
+
+@router.post("/webhooks/", tags=["Webhooks"], response_model=WebhookRead, status_code=status.HTTP_201_CREATED)
+async def create_webhook(
+    webhook: WebhookCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(_require_superuser),
+):
+    """
+    Registers an endpoint to receive post lifecycle events.
+
+    Events are sent as ``POST`` requests with a JSON body holding a list of events,
+    each with its id, name and data. With a secret set, every request carries an
+    ``X-Webhook-Signature`` header with the HMAC-SHA256 of the body.
+
+    :param webhook: The URL of the endpoint, the events it subscribes to (all of them
+                    when omitted) and an optional signing secret.
+    :type webhook: WebhookCreate
+    :param db: The database session dependency for interacting with the database.
+    :type db: AsyncSession
+    :param current_user: The authenticated superuser.
+    :type current_user: User
+    :return: The registered endpoint.
+    :rtype: WebhookRead
+    :raises HTTPException: If the URL is not an HTTP URL or an event is unknown.
+    """
+    if not webhook.url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Webhook URL must be an HTTP URL")
+    unknown = set(webhook.events or ()) - set(WEBHOOK_EVENTS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown events: {', '.join(sorted(unknown))}"
+        )
+
+    endpoint = WebhookEndpoint(
+        id=str(uuid.uuid4()),
+        url=webhook.url,
+        events=webhook.events,
+        secret=webhook.secret,
+        is_active=True,
+        created_at=datetime.now(UTC).strftime("%Y-%m-%d %H:%M:%S"),
+    )
+    db.add(endpoint)
+    await db.commit()
+    return endpoint
+
+@router.get("/webhooks/", tags=["Webhooks"], response_model=list[WebhookRead])
+async def list_webhooks(db: AsyncSession = Depends(get_db), current_user: User = Depends(_require_superuser)):
+    """
+    Lists the registered webhook endpoints.
+
+    :param db: The database session dependency for interacting with the database.
+    :type db: AsyncSession
+    :param current_user: The authenticated superuser.
+    :type current_user: User
+    :return: The endpoints, oldest first.
+    :rtype: list[WebhookRead]
+    """
+    result = await db.execute(select(WebhookEndpoint).order_by(WebhookEndpoint.created_at, WebhookEndpoint.id))
+    return result.scalars().all()
+
+@router.delete("/webhooks/{webhook_id}", tags=["Webhooks"])
+async def delete_webhook(
+    webhook_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(_require_superuser),
+):
+    """
+    Unregisters a webhook endpoint. Its pending deliveries are dropped.
+
+    :param webhook_id: The id of the endpoint.
+    :type webhook_id: str
+    :param db: The database session dependency for interacting with the database.
+    :type db: AsyncSession
+    :param current_user: The authenticated superuser.
+    :type current_user: User
+    :return: A confirmation message.
+    :rtype: dict
+    :raises HTTPException: If the endpoint does not exist.
+    """
+    result = await db.execute(select(WebhookEndpoint).where(WebhookEndpoint.id == webhook_id))
+    endpoint = result.scalar_one_or_none()
+    if endpoint is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Webhook does not exist")
+    await db.delete(endpoint)
+    await db.commit()
+    return {"detail": "Webhook deleted successfully"}
@@ -0,0 +1,207 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+
+import app.core.config as config
+from app.core.metrics import metrics
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request cannot be admitted in time.
+    """
+
+
+class AdmissionGate:
+    """
+    Concurrency limit with a bounded FIFO wait queue for one class of routes.
+
+    The limit adapts to the observed latency with AIMD: every request that
+    completes within ``target_latency`` while the limit is in use raises it by
+    ``1 / limit`` (about one per round trip), and a slow request cuts it by
+    ``backoff``, at most once per ``target_latency`` so a burst of slow requests
+    counts as a single congestion signal.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        target_latency: float,
+        min_limit: int = None,
+        max_limit: int = None,
+        queue_size: int = None,
+        queue_timeout: float = None,
+        backoff: float = None,
+    ):
+        self.name = name
+        self.limit = float(limit)
+        self.target_latency = target_latency
+        self.min_limit = config.ADMISSION_MIN_LIMIT if min_limit is None else min_limit
+        self.max_limit = config.ADMISSION_MAX_LIMIT if max_limit is None else max_limit
+        self.queue_size = config.ADMISSION_QUEUE_SIZE if queue_size is None else queue_size
+        self.queue_timeout = config.ADMISSION_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self.backoff = config.ADMISSION_BACKOFF if backoff is None else backoff
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._decreased_at = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        """
+        Waits for a free slot.
+        :raises Overloaded: If the queue is full or no slot frees up within ``queue_timeout``.
+        """
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            self.shed += 1
+            raise Overloaded(self.name)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # The slot is handed over by release(), which counts it as in flight
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            raise Overloaded(self.name)
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                # Cancelled right after being handed a slot, pass it on
+                self.in_flight -= 1
+                self._wake()
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+        self.admitted += 1
+
+    def release(self, latency: float) -> None:
+        """
+        Frees a slot, adjusts the limit and admits waiting requests.
+        :param latency: How long the request held its slot, in seconds.
+        :type latency: float
+        """
+        in_use = self.in_flight >= int(self.limit)
+        self.in_flight -= 1
+
+        now = time.monotonic()
+        if latency > self.target_latency:
+            if now - self._decreased_at >= self.target_latency:
+                self.limit = max(self.limit * self.backoff, self.min_limit)
+                self._decreased_at = now
+        elif in_use:
+            self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def stats(self) -> dict:
+        """
+        Returns the current state of the gate.
+        :return: The limit, requests in flight and queued, and counts of admitted and shed requests.
+        :rtype: dict
+        """
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+
+def _create_gates() -> dict[str, AdmissionGate]:
+    return {
+        "read": AdmissionGate("read", config.ADMISSION_READ_LIMIT, config.ADMISSION_READ_TARGET),
+        "write": AdmissionGate("write", config.ADMISSION_WRITE_LIMIT, config.ADMISSION_WRITE_TARGET),
+        "auth": AdmissionGate("auth", config.ADMISSION_AUTH_LIMIT, config.ADMISSION_AUTH_TARGET),
+    }
+
+
+gates = _create_gates()
+metrics.collector("admission", lambda: {name: gate.stats() for name, gate in gates.items()})
+
+
+def reset() -> None:
+    """
+    Restores every gate to its configured initial state.
+    """
+    gates.update(_create_gates())
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """
+    Classifies a request for admission control.
+    :param method: The HTTP method.
+    :type method: str
+    :param path: The request path.
+    :type path: str
+    :return: "auth" for authentication, "write" for requests that modify data, "read" otherwise,
+             or None for requests exempt from admission control.
+    :rtype: Optional[str]
+    """
+    # Long polls and event streams mostly wait, and would hold slots for their whole duration
+    if path == "/changes" or path.startswith("/changes/"):
+        return None
+    if path.startswith("/auth/"):
+        return "auth"
+    # The batch multi-get is a POST only because its keys do not fit in a URL
+    if method in ("GET", "HEAD", "OPTIONS") or path == "/posts/batch":
+        return "read"
+    return "write"
+
+
+class AdmissionMiddleware:
+    """
+    Sheds load before it queues up inside the app: requests beyond the concurrency
+    limit of their route class wait in a short queue, and are rejected with 503 and
+    ``Retry-After`` when the queue is full or their wait exceeds the deadline.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        name = route_class(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if name is None or not config.ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        gate = gates[name]
+        try:
+            await gate.acquire()
+        except Overloaded:
+            response = JSONResponse(
+                {"detail": "Server is overloaded, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(math.ceil(config.ADMISSION_RETRY_AFTER))},
+            )
+            await response(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.perf_counter() - start)
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LRUCache:
+    """
+    A small bounded mapping that evicts the least recently used entry once
+    ``maxsize`` entries are stored. It is meant to be used from the event loop
+    thread only and performs no locking.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the value stored for ``key`` and marks it as recently used.
+        :param key: The cache key.
+        :type key: Hashable
+        :param default: The value returned when the key is not cached.
+        :type default: Any
+        :return: The cached value or ``default``.
+        :rtype: Any
+        """
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Stores ``value`` under ``key``, evicting the oldest entry if the cache is full.
+        :param key: The cache key.
+        :type key: Hashable
+        :param value: The value to store.
+        :type value: Any
+        """
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Removes ``key`` from the cache and returns its value.
+        :param key: The cache key.
+        :type key: Hashable
+        :param default: The value returned when the key is not cached.
+        :type default: Any
+        :return: The removed value or ``default``.
+        :rtype: Any
+        """
+        return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,149 @@
+import logging
+from typing import Iterable, Optional
+from urllib.parse import quote
+
+import httpx
+from fastapi import Response
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import app.core.config as config
+from app.core.metrics import metrics
+from app.core.scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+SURROGATE_KEY_HEADER = "Surrogate-Key"
+
+# Keys of the pages listing posts rather than showing one
+POSTS_KEY = "posts"
+FEED_KEY = "feed"
+SITEMAP_KEY = "sitemap"
+TAGS_KEY = "tags"
+RELATED_KEY = "related"
+
+# Every page showing posts changes along with the list of posts
+LISTING_KEYS = (POSTS_KEY, FEED_KEY, SITEMAP_KEY)
+
+
+def post_key(post_id: str) -> str:
+    return f"post-{post_id}"
+
+
+def slug_key(slug: str) -> str:
+    # Keys are separated by spaces in the header
+    return f"slug-{quote(slug, safe='')}"
+
+
+def surrogate_headers(keys: Iterable[str]) -> dict:
+    """
+    Returns the headers tagging a response with surrogate keys, by which the CDN
+    purges it, and with the ``CDN_MAX_AGE`` the CDN keeps it for when set.
+    :param keys: The surrogate keys of the response.
+    :type keys: Iterable[str]
+    :return: The headers.
+    :rtype: dict
+    """
+    headers = {SURROGATE_KEY_HEADER: " ".join(dict.fromkeys(keys))}
+    if config.CDN_MAX_AGE:
+        headers["Surrogate-Control"] = f"max-age={config.CDN_MAX_AGE}"
+    return headers
+
+
+def set_surrogate_keys(response: Response, *keys: str) -> None:
+    """
+    Tags a response with surrogate keys.
+    :param response: The outgoing response.
+    :type response: Response
+    :param keys: The surrogate keys of the response.
+    """
+    response.headers.update(surrogate_headers(keys))
+
+
+class CdnPurger:
+    """
+    Purges the CDN by surrogate key through the HTTP endpoint at ``CDN_PURGE_URL``.
+
+    Writes hand the keys of the pages they changed over after committing. Keys are
+    collected in memory, so a key purged by several writes goes out once, and sent
+    every ``CDN_PURGE_SECONDS``, or as soon as ``CDN_PURGE_BATCH`` of them are
+    pending, as a JSON body ``{"surrogate_keys": [...]}`` of at most that many keys.
+    Keys of failed requests are sent again with the next batch.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.reset()
+        self.requests = metrics.counter("cdn_purge_requests_total")
+        self.purged = metrics.counter("cdn_purged_keys_total")
+        self.failures = metrics.counter("cdn_purge_failures_total")
+
+    def reset(self) -> None:
+        """
+        Drops the pending keys.
+        """
+        self._pending: dict[str, None] = {}
+
+    @property
+    def pending(self) -> list[str]:
+        return list(self._pending)
+
+    def purge(self, *keys: str) -> None:
+        """
+        Queues surrogate keys for purging. Does nothing unless ``CDN_PURGE_URL`` is set.
+        :param keys: The surrogate keys of the changed pages.
+        """
+        if not config.CDN_PURGE_URL:
+            return
+        self._pending.update(dict.fromkeys(keys))
+        if len(self._pending) >= config.CDN_PURGE_BATCH:
+            scheduler.trigger("cdn_purge")
+
+    async def flush(self, client: httpx.AsyncClient) -> int:
+        """
+        Sends the pending keys.
+        :param client: The HTTP client the purge requests are sent with.
+        :type client: httpx.AsyncClient
+        :return: The number of keys purged.
+        :rtype: int
+        """
+        keys, self._pending = list(self._pending), {}
+        headers = {"Authorization": f"Bearer {config.CDN_PURGE_TOKEN}"} if config.CDN_PURGE_TOKEN else {}
+        purged = 0
+        for start in range(0, len(keys), config.CDN_PURGE_BATCH):
+            batch = keys[start:start + config.CDN_PURGE_BATCH]
+            try:
+                response = await client.post(config.CDN_PURGE_URL, json={"surrogate_keys": batch}, headers=headers)
+                response.raise_for_status()
+            except httpx.HTTPError as exc:
+                self.failures.incr()
+                logger.warning("Purging %d surrogate keys failed: %s", len(keys) - start, exc)
+                self._pending.update(dict.fromkeys(keys[start:]))
+                break
+            self.requests.incr()
+            self.purged.incr(len(batch))
+            purged += len(batch)
+        return purged
+
+    async def drain(self, session_factory: async_sessionmaker) -> None:
+        """
+        Sends the pending keys over a connection pool kept between runs. Run every
+        ``CDN_PURGE_SECONDS``.
+        :param session_factory: Unused, purging needs no database.
+        :type session_factory: async_sessionmaker
+        """
+        if not self._pending:
+            return
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=config.CDN_PURGE_TIMEOUT)
+        await self.flush(self._client)
+
+    async def close(self) -> None:
+        """
+        Closes the connection pool of the purge requests.
+        """
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+
+cdn_purger = CdnPurger()
@@ -0,0 +1,128 @@
+import asyncio
+from contextlib import suppress
+from datetime import datetime, UTC
+from typing import Optional
+
+from sqlalchemy import func, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+import app.core.config as config
+from app.db.postgres import dialect_name
+from app.models.sql import Change
+
+# Arbitrary key of the advisory lock serializing change log appends
+CHANGES_LOCK_ID = 0x63686E67
+
+
+async def record_change(db: AsyncSession, entity: str, entity_id: str, action: str, data: Optional[dict] = None) -> None:
+    """
+    Appends an entry to the change log, in the caller's transaction.
+
+    A transaction level advisory lock is taken first, so entries commit in the
+    order of their ids and a consumer reading past a cursor never misses an entry
+    that commits later with a smaller id. Callers should record their changes as
+    the last statements before committing, since the lock is held until then.
+    SQLite needs no lock, its write transactions already run one at a time.
+
+    :param db: The database session of the write being recorded.
+    :type db: AsyncSession
+    :param entity: The kind of record that changed, such as "post" or "tag".
+    :type entity: str
+    :param entity_id: The id of the changed record.
+    :type entity_id: str
+    :param action: "created", "updated" or "deleted".
+    :type action: str
+    :param data: Details useful to consumers, such as the slug of a post.
+    :type data: Optional[dict]
+    """
+    if dialect_name(db) == "postgresql":
+        await db.execute(select(func.pg_advisory_xact_lock(CHANGES_LOCK_ID)))
+    await db.execute(
+        insert(Change).values(
+            entity=entity,
+            entity_id=entity_id,
+            action=action,
+            data=data,
+            created_at=datetime.now(UTC).strftime("%Y-%m-%d %H:%M:%S"),
+        )
+    )
+
+
+class ChangeFeed:
+    """
+    Reads the change log and wakes up consumers waiting for new entries.
+
+    Writes made by this worker wake waiting consumers right after they commit.
+    Writes made by other workers are picked up by polling every
+    ``CHANGES_POLL_SECONDS`` while a consumer waits.
+    """
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def notify(self) -> None:
+        """
+        Wakes up every consumer waiting for changes. Called after committing a change.
+        """
+        self._event.set()
+        self._event = asyncio.Event()
+
+    async def wait(self, timeout: float) -> None:
+        """
+        Waits until the next notification or until ``timeout`` seconds have passed.
+        :param timeout: The maximum time to wait, in seconds.
+        :type timeout: float
+        """
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._event.wait(), timeout)
+
+    async def read(self, db: AsyncSession, since: int, limit: int) -> list[dict]:
+        """
+        Returns the entries following a cursor.
+        :param db: The database session used for the query.
+        :type db: AsyncSession
+        :param since: The id of the last entry already seen, 0 to start from the beginning.
+        :type since: int
+        :param limit: The maximum number of entries to return.
+        :type limit: int
+        :return: The entries, oldest first.
+        :rtype: list[dict]
+        """
+        result = await db.execute(
+            select(Change.id, Change.entity, Change.entity_id, Change.action, Change.data, Change.created_at)
+            .where(Change.id > since)
+            .order_by(Change.id)
+            .limit(limit)
+        )
+        changes = [row._asdict() for row in result.all()]
+        # End the read transaction so no connection is held while waiting for more
+        await db.rollback()
+        return changes
+
+    async def poll(self, db: AsyncSession, since: int, limit: int, wait: float) -> list[dict]:
+        """
+        Returns the entries following a cursor, waiting up to ``wait`` seconds for
+        new entries if there are none yet.
+        :param db: The database session used for the queries.
+        :type db: AsyncSession
+        :param since: The id of the last entry already seen.
+        :type since: int
+        :param limit: The maximum number of entries to return.
+        :type limit: int
+        :param wait: The maximum time to wait for new entries, in seconds.
+        :type wait: float
+        :return: The entries, oldest first, possibly none.
+        :rtype: list[dict]
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while True:
+            changes = await self.read(db, since, limit)
+            remaining = deadline - loop.time()
+            if changes or remaining <= 0:
+                return changes
+            await self.wait(min(remaining, config.CHANGES_POLL_SECONDS))
+
+
+change_feed = ChangeFeed()
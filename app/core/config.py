@@ -8,4 +8,178 @@ PORT = int(os.getenv("PORT", 8000))
 HOST = os.getenv("HOST", "0.0.0.0")
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
\ No newline at end of file
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+
+# SQLite (sqlite+aiosqlite database URLs)
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", 8))
+SQLITE_WRITE_TIMEOUT = float(os.getenv("SQLITE_WRITE_TIMEOUT", 30))
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", -64_000))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+
+# Post version diffs
+DIFF_CACHE_SIZE = int(os.getenv("DIFF_CACHE_SIZE", 256))
+DIFF_CPU_BUDGET = int(os.getenv("DIFF_CPU_BUDGET", 1_000_000))
+
+# Batch reads
+POSTS_BATCH_MAX = int(os.getenv("POSTS_BATCH_MAX", 100))
+
+# Sitemaps
+SITEMAP_BASE_URL = os.getenv("SITEMAP_BASE_URL")
+SITEMAP_SHARD_SIZE = int(os.getenv("SITEMAP_SHARD_SIZE", 50_000))
+SITEMAP_CACHE_TTL = int(os.getenv("SITEMAP_CACHE_TTL", 3600))
+SITEMAP_STREAM_BATCH = int(os.getenv("SITEMAP_STREAM_BATCH", 1000))
+
+# Negative lookup filter for post slugs
+SLUG_FILTER_ENABLED = os.getenv("SLUG_FILTER_ENABLED", "true").lower() == "true"
+SLUG_FILTER_FP_RATE = float(os.getenv("SLUG_FILTER_FP_RATE", 0.01))
+SLUG_FILTER_MAX_BYTES = int(os.getenv("SLUG_FILTER_MAX_BYTES", 16 * 1024 * 1024))
+SLUG_FILTER_MIN_CAPACITY = int(os.getenv("SLUG_FILTER_MIN_CAPACITY", 10_000))
+SLUG_FILTER_HEADROOM = float(os.getenv("SLUG_FILTER_HEADROOM", 2.0))
+SLUG_FILTER_SCAN_BATCH = int(os.getenv("SLUG_FILTER_SCAN_BATCH", 5000))
+SLUG_FILTER_REFRESH_SECONDS = int(os.getenv("SLUG_FILTER_REFRESH_SECONDS", 5))
+SLUG_FILTER_REBUILD_SECONDS = int(os.getenv("SLUG_FILTER_REBUILD_SECONDS", 900))
+SLUG_FILTER_MAX_STALE = int(os.getenv("SLUG_FILTER_MAX_STALE", 1000))
+
+# Read coalescing and caching
+SINGLEFLIGHT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_TIMEOUT", 10))
+POST_CACHE_TTL = float(os.getenv("POST_CACHE_TTL", 0))
+POST_CACHE_STALE_TTL = float(os.getenv("POST_CACHE_STALE_TTL", 0))
+POST_CACHE_SIZE = int(os.getenv("POST_CACHE_SIZE", 10_000))
+FEED_CACHE_TTL = float(os.getenv("FEED_CACHE_TTL", 30))
+FEED_CACHE_STALE_TTL = float(os.getenv("FEED_CACHE_STALE_TTL", 300))
+TAGS_CACHE_TTL = float(os.getenv("TAGS_CACHE_TTL", 30))
+TAGS_CACHE_STALE_TTL = float(os.getenv("TAGS_CACHE_STALE_TTL", 300))
+
+# Site metadata used by the RSS feed, and by sitemaps unless SITEMAP_BASE_URL is set.
+# Absolute URLs are never taken from the request, so the feed needs SITE_URL
+SITE_URL = os.getenv("SITE_URL")
+SITE_TITLE = os.getenv("SITE_TITLE", "PointPost")
+SITE_DESCRIPTION = os.getenv("SITE_DESCRIPTION", "Latest posts")
+RSS_ITEMS = int(os.getenv("RSS_ITEMS", 20))
+
+# Post view counters
+VIEWS_FLUSH_SECONDS = float(os.getenv("VIEWS_FLUSH_SECONDS", 10))
+VIEWS_FLUSH_BATCH = int(os.getenv("VIEWS_FLUSH_BATCH", 5000))
+VIEWS_CACHE_TTL = float(os.getenv("VIEWS_CACHE_TTL", 30))
+VIEWS_TOP_MAX = int(os.getenv("VIEWS_TOP_MAX", 100))
+
+# Request tracing
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.0))
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "jsonl")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", 10_000))
+
+# Title and tag suggestions
+SUGGEST_ENABLED = os.getenv("SUGGEST_ENABLED", "true").lower() == "true"
+SUGGEST_MAX_LIMIT = int(os.getenv("SUGGEST_MAX_LIMIT", 50))
+SUGGEST_KEY_LENGTH = int(os.getenv("SUGGEST_KEY_LENGTH", 64))
+SUGGEST_SCAN_BATCH = int(os.getenv("SUGGEST_SCAN_BATCH", 5000))
+SUGGEST_REBUILD_SECONDS = float(os.getenv("SUGGEST_REBUILD_SECONDS", 300))
+
+# Admission control, per class of routes
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_READ_LIMIT = int(os.getenv("ADMISSION_READ_LIMIT", 64))
+ADMISSION_WRITE_LIMIT = int(os.getenv("ADMISSION_WRITE_LIMIT", 16))
+ADMISSION_AUTH_LIMIT = int(os.getenv("ADMISSION_AUTH_LIMIT", 4))
+ADMISSION_READ_TARGET = float(os.getenv("ADMISSION_READ_TARGET", 0.25))
+ADMISSION_WRITE_TARGET = float(os.getenv("ADMISSION_WRITE_TARGET", 0.5))
+ADMISSION_AUTH_TARGET = float(os.getenv("ADMISSION_AUTH_TARGET", 1.0))
+ADMISSION_MIN_LIMIT = int(os.getenv("ADMISSION_MIN_LIMIT", 1))
+ADMISSION_MAX_LIMIT = int(os.getenv("ADMISSION_MAX_LIMIT", 256))
+ADMISSION_BACKOFF = float(os.getenv("ADMISSION_BACKOFF", 0.9))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 128))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 1.0))
+ADMISSION_RETRY_AFTER = float(os.getenv("ADMISSION_RETRY_AFTER", 1))
+
+# Event loop monitoring
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", 0.5))
+LOOP_BLOCK_DEBUG = os.getenv("LOOP_BLOCK_DEBUG", "false").lower() == "true"
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", 0.1))
+
+# Per-request profiling
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.001))
+
+# Startup warm-up
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", 5))
+WARMUP_HOT_POSTS = int(os.getenv("WARMUP_HOT_POSTS", 100))
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", 30))
+
+# Batched loading of related data
+LOADER_MAX_BATCH = int(os.getenv("LOADER_MAX_BATCH", 1000))
+
+# Change feed
+CHANGES_MAX_LIMIT = int(os.getenv("CHANGES_MAX_LIMIT", 1000))
+CHANGES_MAX_WAIT = float(os.getenv("CHANGES_MAX_WAIT", 30))
+CHANGES_POLL_SECONDS = float(os.getenv("CHANGES_POLL_SECONDS", 1))
+CHANGES_KEEPALIVE_SECONDS = float(os.getenv("CHANGES_KEEPALIVE_SECONDS", 15))
+CHANGES_STREAM_SECONDS = float(os.getenv("CHANGES_STREAM_SECONDS", 300))
+
+# Rendering posts at write time
+EXCERPT_LENGTH = int(os.getenv("EXCERPT_LENGTH", 200))
+RENDER_BATCH = int(os.getenv("RENDER_BATCH", 100))
+RENDER_JOB_SECONDS = float(os.getenv("RENDER_JOB_SECONDS", 300))
+
+# Related posts
+RELATED_ENABLED = os.getenv("RELATED_ENABLED", "true").lower() == "true"
+RELATED_TOP_K = int(os.getenv("RELATED_TOP_K", 5))
+RELATED_MAX_TAG_POSTS = int(os.getenv("RELATED_MAX_TAG_POSTS", 10_000))
+RELATED_SCAN_BATCH = int(os.getenv("RELATED_SCAN_BATCH", 5000))
+RELATED_WRITE_BATCH = int(os.getenv("RELATED_WRITE_BATCH", 500))
+RELATED_REFRESH_BATCH = int(os.getenv("RELATED_REFRESH_BATCH", 100))
+RELATED_REFRESH_SECONDS = float(os.getenv("RELATED_REFRESH_SECONDS", 10))
+RELATED_REBUILD_SECONDS = float(os.getenv("RELATED_REBUILD_SECONDS", 3600))
+
+# Post version retention
+VERSIONS_COMPACT_ENABLED = os.getenv("VERSIONS_COMPACT_ENABLED", "true").lower() == "true"
+VERSIONS_KEEP_ALL_DAYS = int(os.getenv("VERSIONS_KEEP_ALL_DAYS", 7))
+VERSIONS_KEEP_DAILY_DAYS = int(os.getenv("VERSIONS_KEEP_DAILY_DAYS", 90))
+VERSIONS_KEEP_MONTHLY_DAYS = int(os.getenv("VERSIONS_KEEP_MONTHLY_DAYS", 0))
+VERSIONS_SCAN_BATCH = int(os.getenv("VERSIONS_SCAN_BATCH", 100))
+VERSIONS_DELETE_BATCH = int(os.getenv("VERSIONS_DELETE_BATCH", 500))
+VERSIONS_DELETE_PAUSE = float(os.getenv("VERSIONS_DELETE_PAUSE", 0.5))
+VERSIONS_COMPACT_SECONDS = float(os.getenv("VERSIONS_COMPACT_SECONDS", 3600))
+# A cron expression such as "0 3 * * *" runs compaction at set times instead
+VERSIONS_COMPACT_CRON = os.getenv("VERSIONS_COMPACT_CRON")
+
+# Webhooks
+WEBHOOKS_ENABLED = os.getenv("WEBHOOKS_ENABLED", "true").lower() == "true"
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", 100))
+WEBHOOK_MAX_EVENTS = int(os.getenv("WEBHOOK_MAX_EVENTS", 20))
+WEBHOOK_ENDPOINT_CONCURRENCY = int(os.getenv("WEBHOOK_ENDPOINT_CONCURRENCY", 2))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 100))
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", 10))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 10))
+WEBHOOK_BACKOFF_BASE = float(os.getenv("WEBHOOK_BACKOFF_BASE", 5))
+WEBHOOK_BACKOFF_MAX = float(os.getenv("WEBHOOK_BACKOFF_MAX", 3600))
+WEBHOOK_POLL_SECONDS = float(os.getenv("WEBHOOK_POLL_SECONDS", 5))
+
+# Background job scheduler
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", 0.1))
+SCHEDULER_JOB_TIMEOUT = float(os.getenv("SCHEDULER_JOB_TIMEOUT", 1800))
+SCHEDULER_LOCK_KEY = int(os.getenv("SCHEDULER_LOCK_KEY", 7_140_001))
+SCHEDULER_LEADER_SECONDS = float(os.getenv("SCHEDULER_LEADER_SECONDS", 15))
+
+# Password hashing, with the bcrypt cost calibrated at startup unless BCRYPT_ROUNDS pins it
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 0))
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", 12))
+BCRYPT_TARGET_SECONDS = float(os.getenv("BCRYPT_TARGET_SECONDS", 0.25))
+
+# Structured logging, written by a background thread
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10_000))
+LOG_SQL = os.getenv("LOG_SQL", "false").lower() == "true"
+LOG_SQL_SAMPLE_RATE = float(os.getenv("LOG_SQL_SAMPLE_RATE", 0.01))
+LOG_ACCESS_SAMPLE_RATE = float(os.getenv("LOG_ACCESS_SAMPLE_RATE", 0.1))
+LOG_SLOW_REQUEST_SECONDS = float(os.getenv("LOG_SLOW_REQUEST_SECONDS", 1.0))
+
+# CDN surrogate keys and purging
+CDN_MAX_AGE = int(os.getenv("CDN_MAX_AGE", 0))
+CDN_PURGE_URL = os.getenv("CDN_PURGE_URL")
+CDN_PURGE_TOKEN = os.getenv("CDN_PURGE_TOKEN")
+CDN_PURGE_BATCH = int(os.getenv("CDN_PURGE_BATCH", 256))
+CDN_PURGE_SECONDS = float(os.getenv("CDN_PURGE_SECONDS", 1))
+CDN_PURGE_TIMEOUT = float(os.getenv("CDN_PURGE_TIMEOUT", 10))
@@ -0,0 +1,229 @@
+import hashlib
+import re
+from typing import Optional
+
+import app.core.config as config
+from app.core.cache import LRUCache
+
+# Splits text into runs of whitespace, words and single punctuation characters
+_WORD_RE = re.compile(r"\s+|\w+|[^\w\s]")
+
+# Diffs keyed by the content hashes of the two compared texts
+diff_cache = LRUCache(config.DIFF_CACHE_SIZE)
+
+
+class _Budget:
+    """
+    Tracks how much work the diff is still allowed to do. One unit roughly
+    corresponds to one diagonal explored by the middle snake search.
+    """
+
+    def __init__(self, limit: int):
+        self.remaining = limit
+
+    def spend(self, units: int) -> bool:
+        self.remaining -= units
+        return self.remaining >= 0
+
+
+def content_hash(text: str) -> str:
+    """
+    Returns a stable hash of the given text.
+    :param text: The text to hash.
+    :type text: str
+    :return: The hex encoded SHA-256 digest of the text.
+    :rtype: str
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _intern(a: list, b: list) -> tuple[list[int], list[int]]:
+    # Replace every token by a small integer so comparisons are cheap
+    table: dict = {}
+    return (
+        [table.setdefault(token, len(table)) for token in a],
+        [table.setdefault(token, len(table)) for token in b],
+    )
+
+
+def _middle_snake(a, a_lo, a_hi, b, b_lo, b_hi, budget: _Budget) -> Optional[tuple[int, int, int, int]]:
+    """
+    Finds the middle snake of an optimal edit script between ``a[a_lo:a_hi]`` and
+    ``b[b_lo:b_hi]`` (Myers, 1986) using space linear in the input size.
+    Returns the snake as ``(x, y, u, v)`` offsets relative to the start of the
+    ranges, or None when the budget runs out before the snake is found.
+    """
+    n = a_hi - a_lo
+    m = b_hi - b_lo
+    delta = n - m
+    odd = delta & 1
+    offset = (n + m + 1) // 2 + 1
+    forward = [0] * (2 * offset + 1)
+    backward = [0] * (2 * offset + 1)
+
+    for d in range(offset):
+        if not budget.spend(2 * d + 2):
+            return None
+
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[a_lo + x] == b[b_lo + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            if odd and -(d - 1) <= delta - k <= d - 1 and x + backward[offset + delta - k] >= n:
+                return x0, y0, x, y
+
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and backward[offset + k - 1] < backward[offset + k + 1]):
+                x = backward[offset + k + 1]
+            else:
+                x = backward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[a_hi - 1 - x] == b[b_hi - 1 - y]:
+                x += 1
+                y += 1
+            backward[offset + k] = x
+            if not odd and -d <= delta - k <= d and x + forward[offset + delta - k] >= n:
+                return n - x, m - y, n - x0, m - y0
+
+    return None
+
+
+def _diff_spans(a: list, b: list, budget: _Budget) -> tuple[list[tuple[str, int, int, int, int]], bool]:
+    """
+    Computes a list of ``(op, a_start, a_end, b_start, b_end)`` spans turning ``a``
+    into ``b``. Ranges whose middle snake cannot be found within the budget are
+    reported as a single delete/insert pair and the result is flagged as coarse.
+    """
+    spans: list[tuple[str, int, int, int, int]] = []
+    coarse = False
+
+    def emit(op, a_start, a_end, b_start, b_end):
+        if a_end > a_start or b_end > b_start:
+            spans.append((op, a_start, a_end, b_start, b_end))
+
+    # Work items are processed depth first so spans come out in order
+    stack: list[tuple] = [("range", 0, len(a), 0, len(b))]
+    while stack:
+        item = stack.pop()
+        if item[0] != "range":
+            emit(*item)
+            continue
+
+        _, a_lo, a_hi, b_lo, b_hi = item
+
+        # Strip the common prefix and suffix, which are cheap to find
+        start_a, start_b = a_lo, b_lo
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            a_lo += 1
+            b_lo += 1
+        emit("equal", start_a, a_lo, start_b, b_lo)
+
+        end_a, end_b = a_hi, b_hi
+        while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+            a_hi -= 1
+            b_hi -= 1
+        stack.append(("equal", a_hi, end_a, b_hi, end_b))
+
+        if a_lo == a_hi or b_lo == b_hi:
+            emit("delete", a_lo, a_hi, b_lo, b_lo)
+            emit("insert", a_hi, a_hi, b_lo, b_hi)
+            continue
+
+        snake = _middle_snake(a, a_lo, a_hi, b, b_lo, b_hi, budget) if budget.remaining > 0 else None
+        if snake is None:
+            coarse = True
+            emit("delete", a_lo, a_hi, b_lo, b_lo)
+            emit("insert", a_hi, a_hi, b_lo, b_hi)
+            continue
+
+        x, y, u, v = snake
+        stack.append(("range", a_lo + u, a_hi, b_lo + v, b_hi))
+        stack.append(("equal", a_lo + x, a_lo + u, b_lo + y, b_lo + v))
+        stack.append(("range", a_lo, a_lo + x, b_lo, b_lo + y))
+
+    return spans, coarse
+
+
+def _opcodes(spans: list[tuple[str, int, int, int, int]]) -> list[tuple[str, int, int, int, int]]:
+    # Merge adjacent spans and fold neighbouring deletes and inserts into replaces
+    opcodes: list[list] = []
+    for op, a_start, a_end, b_start, b_end in spans:
+        changed = op != "equal"
+        if opcodes and (opcodes[-1][0] != "equal") == changed:
+            opcodes[-1][2] = a_end
+            opcodes[-1][4] = b_end
+        else:
+            opcodes.append([op, a_start, a_end, b_start, b_end])
+
+    for opcode in opcodes:
+        if opcode[0] != "equal":
+            has_old = opcode[2] > opcode[1]
+            has_new = opcode[4] > opcode[3]
+            opcode[0] = "replace" if has_old and has_new else "delete" if has_old else "insert"
+    return [tuple(opcode) for opcode in opcodes]
+
+
+def _word_diff(old_lines: list[str], new_lines: list[str], budget: _Budget) -> Optional[list[dict]]:
+    old_words = _WORD_RE.findall("\n".join(old_lines))
+    new_words = _WORD_RE.findall("\n".join(new_lines))
+    a, b = _intern(old_words, new_words)
+    spans, coarse = _diff_spans(a, b, budget)
+    if coarse:
+        # A coarse word diff is no more useful than the line diff itself
+        return None
+
+    words = []
+    for op, a_start, a_end, b_start, b_end in _opcodes(spans):
+        if op in ("equal", "delete", "replace"):
+            words.append({"op": "delete" if op == "replace" else op, "text": "".join(old_words[a_start:a_end])})
+        if op in ("insert", "replace"):
+            words.append({"op": "insert", "text": "".join(new_words[b_start:b_end])})
+    return words
+
+
+def diff_texts(old: str, new: str, cpu_budget: int = None) -> dict:
+    """
+    Computes a line level diff between two texts, refining replaced lines with a
+    word level diff. The work is bounded by ``cpu_budget``; once it is spent the
+    remaining differences are reported as whole-block replacements and the result
+    is marked as coarse.
+    :param old: The original text.
+    :type old: str
+    :param new: The modified text.
+    :type new: str
+    :param cpu_budget: The maximum amount of work, defaults to ``DIFF_CPU_BUDGET``.
+    :type cpu_budget: int
+    :return: A dictionary with the ``coarse`` flag and the list of ``hunks``.
+    :rtype: dict
+    """
+    budget = _Budget(config.DIFF_CPU_BUDGET if cpu_budget is None else cpu_budget)
+    old_lines = old.splitlines()
+    new_lines = new.splitlines()
+    a, b = _intern(old_lines, new_lines)
+    spans, coarse = _diff_spans(a, b, budget)
+
+    hunks = []
+    for op, a_start, a_end, b_start, b_end in _opcodes(spans):
+        hunk = {
+            "op": op,
+            "a_start": a_start,
+            "a_end": a_end,
+            "b_start": b_start,
+            "b_end": b_end,
+            "a_lines": old_lines[a_start:a_end],
+            "b_lines": new_lines[b_start:b_end],
+            "words": None,
+        }
+        if op == "replace" and budget.remaining > 0:
+            hunk["words"] = _word_diff(hunk["a_lines"], hunk["b_lines"], budget)
+        hunks.append(hunk)
+
+    return {"coarse": coarse, "hunks": hunks}
@@ -0,0 +1,34 @@
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+
+def make_etag(revision: int) -> str:
+    """
+    Builds the strong entity tag for a post revision.
+    :param revision: The revision counter of the post.
+    :type revision: int
+    :return: The quoted entity tag.
+    :rtype: str
+    """
+    return f'"{revision}"'
+
+def parse_if_match(if_match: str) -> Optional[int]:
+    """
+    Parses an If-Match header into the revision it expects.
+    :param if_match: The raw If-Match header value.
+    :type if_match: str
+    :return: The expected revision, or None if the header is ``*`` and matches any revision.
+    :rtype: Optional[int]
+    :raises HTTPException: If the header does not hold a single valid entity tag.
+    """
+    value = if_match.strip()
+    if value == "*":
+        return None
+    if value.startswith("W/"):
+        # Weak tags never match under the strong comparison If-Match requires
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Post has been modified")
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Post has been modified")
@@ -0,0 +1,59 @@
+from datetime import datetime, UTC
+
+from feedgen.feed import FeedGenerator
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.future import select
+from starlette.concurrency import run_in_threadpool
+
+import app.core.config as config
+from app.core.render import render_markdown
+from app.models.sql import Post
+
+
+def render_feed(posts: list[Post], base_url: str) -> bytes:
+    """
+    Renders posts as an RSS document.
+    :param posts: The posts to include, in feed order.
+    :type posts: list[Post]
+    :param base_url: The absolute URL the site is served from, without trailing slash.
+    :type base_url: str
+    :return: The RSS XML document.
+    :rtype: bytes
+    """
+    feed = FeedGenerator()
+    feed.title(config.SITE_TITLE)
+    feed.link(href=base_url, rel="alternate")
+    feed.description(config.SITE_DESCRIPTION)
+
+    for post in posts:
+        url = f"{base_url}/posts/{post.slug}"
+        entry = feed.add_entry(order="append")
+        entry.id(url)
+        entry.title(post.title)
+        entry.link(href=url)
+        # Readers show the description as HTML, so it must be the sanitized render
+        entry.description(post.html if post.html is not None else render_markdown(post.content))
+        if post.updated_at:
+            entry.pubDate(datetime.strptime(post.updated_at, "%Y-%m-%d %H:%M:%S").replace(tzinfo=UTC))
+
+    return feed.rss_str()
+
+async def build_feed(base_url: str, session_factory: async_sessionmaker) -> bytes:
+    """
+    Builds the RSS feed of the ``RSS_ITEMS`` most recently updated posts. The posts
+    are fetched in a session of its own, as the build is shared by every caller
+    waiting on it and must outlive whichever of them started it.
+    :param base_url: The absolute URL the site is served from, without trailing slash.
+    :type base_url: str
+    :param session_factory: The factory used to open the session fetching the posts.
+    :type session_factory: async_sessionmaker
+    :return: The RSS XML document.
+    :rtype: bytes
+    """
+    async with session_factory() as db:
+        result = await db.execute(
+            select(Post).order_by(Post.updated_at.desc().nulls_last()).limit(config.RSS_ITEMS)
+        )
+        posts = result.scalars().all()
+    # Building the XML is CPU bound, keep it off the event loop
+    return await run_in_threadpool(render_feed, posts, base_url)
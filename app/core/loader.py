@@ -0,0 +1,124 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+import app.core.config as config
+from app.db.postgres import get_db
+from app.models.sql import PostTag, Tag, User
+
+
+class DataLoader:
+    """
+    Batches the keys loaded during one turn of the event loop into a single call
+    of ``batch_load``, and caches every result for the lifetime of the loader.
+
+    ``batch_load`` receives a list of distinct keys and returns a dict of the
+    values found; keys missing from it resolve to ``missing()``. Failed batches
+    are not cached, so a later load retries them.
+    """
+
+    def __init__(
+        self,
+        batch_load: Callable[[list], Awaitable[dict]],
+        missing: Callable[[], Any] = lambda: None,
+        max_batch_size: int = None,
+    ):
+        self._batch_load = batch_load
+        self._missing = missing
+        self.max_batch_size = max_batch_size or config.LOADER_MAX_BATCH
+        self._cache: dict[Hashable, asyncio.Future] = {}
+        self._queue: list[Hashable] = []
+
+    def load(self, key: Hashable) -> asyncio.Future:
+        """
+        Schedules a key to be loaded with the next batch.
+        :param key: The key to load.
+        :type key: Hashable
+        :return: A future resolving to the value of the key.
+        :rtype: asyncio.Future
+        """
+        future = self._cache.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._cache[key] = future
+            self._queue.append(key)
+            if len(self._queue) == 1:
+                # Give the caller's siblings a chance to queue their keys first
+                loop.call_soon(self._dispatch)
+        return future
+
+    async def load_many(self, keys: list[Hashable]) -> list:
+        """
+        Loads several keys at once.
+        :param keys: The keys to load, possibly with duplicates.
+        :type keys: list[Hashable]
+        :return: The values of the keys, in the same order.
+        :rtype: list
+        """
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self) -> None:
+        keys, self._queue = self._queue, []
+        for start in range(0, len(keys), self.max_batch_size):
+            asyncio.ensure_future(self._run(keys[start:start + self.max_batch_size]))
+
+    async def _run(self, keys: list[Hashable]) -> None:
+        try:
+            values = await self._batch_load(keys)
+        except Exception as exc:
+            for key in keys:
+                future = self._cache.pop(key)
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for key in keys:
+            future = self._cache[key]
+            if not future.done():
+                future.set_result(values[key] if key in values else self._missing())
+
+
+class Loaders:
+    """
+    The data loaders of one request. They share the request's database session,
+    on which the batches run one at a time.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self._lock = asyncio.Lock()
+        self.authors = DataLoader(self._load_authors)
+        self.post_tags = DataLoader(self._load_post_tags, missing=list)
+
+    async def _load_authors(self, user_ids: list[str]) -> dict[str, dict]:
+        async with self._lock:
+            # Only the id is embedded, listings are public and emails are not
+            result = await self.db.execute(select(User.id).where(User.id.in_(user_ids)))
+            return {id: {"id": id} for id in result.scalars().all()}
+
+    async def _load_post_tags(self, post_ids: list[str]) -> dict[str, list[dict]]:
+        async with self._lock:
+            result = await self.db.execute(
+                select(PostTag.post_id, Tag.id, Tag.name)
+                .join(Tag, Tag.id == PostTag.tag_id)
+                .where(PostTag.post_id.in_(post_ids))
+                .order_by(Tag.name)
+            )
+            tags: dict[str, list[dict]] = {}
+            for post_id, id, name in result.all():
+                tags.setdefault(post_id, []).append({"id": id, "name": name})
+            return tags
+
+
+async def get_loaders(db: AsyncSession = Depends(get_db)) -> Loaders:
+    """
+    Request scoped data loaders dependency.
+    :param db: The database session of the request.
+    :type db: AsyncSession
+    :return: Fresh loaders, shared by everything resolved within the request.
+    :rtype: Loaders
+    """
+    return Loaders(db)
@@ -0,0 +1,200 @@
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from datetime import datetime, UTC
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+import app.core.config as config
+from app.core.metrics import metrics
+from app.core.tracing import current_span
+
+# Attributes every record has, anything else was passed through ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id"}
+
+access_logger = logging.getLogger("app.access")
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as single line JSON objects, with the fields passed through
+    ``extra`` and the trace id of the request, if it was traced.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, UTC).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction of the records of high volume loggers, by the longest logger
+    name prefix with a rate. Warnings and errors are always kept.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.sampled_out = metrics.counter("log_records_sampled_out_total")
+        self._cache: dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            rate, prefix = 1.0, ""
+            for logger_name, logger_rate in self.rates.items():
+                if (name == logger_name or name.startswith(logger_name + ".")) and len(logger_name) > len(prefix):
+                    rate, prefix = logger_rate, logger_name
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1 or random.random() < rate:
+            return True
+        self.sampled_out.incr()
+        return False
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Puts records on a bounded queue, drained by a background thread, so logging
+    never waits on I/O. Records are dropped, and counted, when the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = metrics.counter("log_records_dropped_total")
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Arguments and tracebacks are rendered now, as they may change before the
+        # record is written, while the JSON is left to the background thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        span = current_span()
+        if span is not None:
+            record.trace_id = span.trace.trace_id
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped.incr()
+
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging() -> None:
+    """
+    Sends the records of every logger through a bounded queue to a background
+    thread writing JSON lines to stderr, replacing the handlers of the root logger.
+    SQL statements are logged with ``LOG_SQL`` set and kept at ``LOG_SQL_SAMPLE_RATE``,
+    access logs are kept at ``LOG_ACCESS_SAMPLE_RATE``.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter())
+    handler = DroppingQueueHandler(queue.Queue(maxsize=config.LOG_QUEUE_SIZE))
+    handler.addFilter(SamplingFilter({
+        "sqlalchemy.engine": config.LOG_SQL_SAMPLE_RATE,
+        "app.access": config.LOG_ACCESS_SAMPLE_RATE,
+        "uvicorn.access": config.LOG_ACCESS_SAMPLE_RATE,
+    }))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(config.LOG_LEVEL)
+    # Uvicorn writes to stdout itself when it configured logging before the app started
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).handlers.clear()
+        logging.getLogger(name).propagate = True
+    # The engines log statements at INFO once their logger allows it
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO if config.LOG_SQL else logging.WARNING)
+
+    _listener = QueueListener(handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """
+    Writes out the queued records and stops the background thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class AccessLogMiddleware:
+    """
+    Logs every HTTP request with its status and duration to the ``app.access``
+    logger. Failed requests are logged as errors and requests slower than
+    ``LOG_SLOW_REQUEST_SECONDS`` as warnings, so sampling never drops them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def logged_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, logged_send)
+        finally:
+            duration = time.perf_counter() - start
+            if status_code >= 500:
+                level = logging.ERROR
+            elif duration >= config.LOG_SLOW_REQUEST_SECONDS:
+                level = logging.WARNING
+            else:
+                level = logging.INFO
+            if access_logger.isEnabledFor(level):
+                access_logger.log(
+                    level, "%s %s %d", scope["method"], scope["path"], status_code,
+                    extra={
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status_code,
+                        "duration_ms": round(duration * 1000, 3),
+                    },
+                )
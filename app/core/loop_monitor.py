@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+import app.core.config as config
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _request_of(frame) -> Optional[str]:
+    # The ASGI scope of the request being served is a local of the app's frames
+    while frame is not None:
+        scope = frame.f_locals.get("scope")
+        if isinstance(scope, dict) and scope.get("type") == "http":
+            route = scope.get("route")
+            return f"{scope.get('method')} {getattr(route, 'path', None) or scope.get('path')}"
+        frame = frame.f_back
+    return None
+
+
+class LoopMonitor:
+    """
+    Measures how late the event loop runs a callback scheduled every
+    ``LOOP_MONITOR_INTERVAL`` seconds, which is how long any request would have
+    waited for the loop, and records it in the ``loop_lag_seconds`` histogram.
+
+    With ``LOOP_BLOCK_DEBUG`` set, a watchdog thread also reports every callback
+    that holds the loop for longer than ``LOOP_BLOCK_THRESHOLD`` seconds, with the
+    request being served and a sample of the blocking stack.
+    """
+
+    def __init__(self):
+        self.lag = metrics.histogram("loop_lag_seconds")
+        self.blocked = metrics.counter("loop_blocked_total")
+        self._heartbeat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def _check_blocked(self) -> None:
+        reported = None
+        while not self._stopped.wait(config.LOOP_BLOCK_THRESHOLD / 4):
+            heartbeat = self._heartbeat
+            blocked_for = time.monotonic() - heartbeat
+            if blocked_for < config.LOOP_BLOCK_THRESHOLD or reported == heartbeat:
+                continue
+            # Report every stall once, with the stack as it is while still blocked
+            reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            self.blocked.incr()
+            logger.warning(
+                "Event loop blocked for more than %.3fs while serving %s\n%s",
+                blocked_for,
+                _request_of(frame) or "no request",
+                "".join(traceback.format_stack(frame)),
+            )
+
+    async def run(self) -> None:
+        """
+        Samples the event loop lag until cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        interval = config.LOOP_MONITOR_INTERVAL
+        if config.LOOP_BLOCK_DEBUG:
+            # The heartbeat has to beat well within the threshold to tell blocking apart from sleeping
+            interval = min(interval, config.LOOP_BLOCK_THRESHOLD / 4)
+            self._loop_thread = threading.get_ident()
+            self._heartbeat = time.monotonic()
+            self._stopped.clear()
+            self._watchdog = threading.Thread(target=self._check_blocked, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+        try:
+            while True:
+                expected = loop.time() + interval
+                await asyncio.sleep(interval)
+                self.lag.observe(max(loop.time() - expected, 0.0))
+                self._heartbeat = time.monotonic()
+        finally:
+            if self._watchdog is not None:
+                self._stopped.set()
+                self._watchdog.join()
+                self._watchdog = None
+
+
+loop_monitor = LoopMonitor()
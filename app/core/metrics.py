@@ -0,0 +1,152 @@
+import math
+from bisect import bisect_left
+from typing import Any, Callable
+
+# Upper bounds in seconds, suited to request and event loop latencies
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """
+    A monotonically increasing count.
+    """
+
+    def __init__(self):
+        self.value = 0
+
+    def incr(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def snapshot(self) -> int:
+        return self.value
+
+
+class Histogram:
+    """
+    Counts observations in fixed buckets, from which quantiles are estimated by
+    the upper bound of the bucket they fall in.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.reset()
+
+    def reset(self) -> None:
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Records an observation.
+        :param value: The observed value.
+        :type value: float
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile of the observations.
+        :param q: The quantile, between 0 and 1.
+        :type q: float
+        :return: The upper bound of the bucket containing the quantile, or the maximum
+                 observation if it falls beyond the last bucket.
+        :rtype: float
+        """
+        if not self.count:
+            return 0.0
+        rank = max(math.ceil(q * self.count), 1)
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "max": round(self.max, 6),
+            "p50": round(self.quantile(0.5), 6),
+            "p90": round(self.quantile(0.9), 6),
+            "p99": round(self.quantile(0.99), 6),
+            "buckets": buckets,
+        }
+
+
+class Metrics:
+    """
+    In-process registry of the metrics exposed by ``/metrics``.
+
+    Counters and histograms are updated as things happen. Collectors are called
+    when a snapshot is taken, for values that other components already keep.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Any] = {}
+        self._collectors: dict[str, Callable[[], Any]] = {}
+
+    def counter(self, name: str) -> Counter:
+        """
+        Returns the counter with the given name, creating it if needed.
+        :param name: The name of the counter.
+        :type name: str
+        :return: The counter.
+        :rtype: Counter
+        """
+        return self._metrics.setdefault(name, Counter())
+
+    def histogram(self, name: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        """
+        Returns the histogram with the given name, creating it if needed.
+        :param name: The name of the histogram.
+        :type name: str
+        :param buckets: The bucket upper bounds, used when the histogram is created.
+        :type buckets: tuple[float, ...]
+        :return: The histogram.
+        :rtype: Histogram
+        """
+        return self._metrics.setdefault(name, Histogram(buckets))
+
+    def collector(self, name: str, collect: Callable[[], Any]) -> None:
+        """
+        Registers a function returning the current value of a metric.
+        :param name: The name of the metric.
+        :type name: str
+        :param collect: Called on every snapshot, must return a JSON serializable value.
+        :type collect: Callable[[], Any]
+        """
+        self._collectors[name] = collect
+
+    def reset(self) -> None:
+        """
+        Zeroes every counter and histogram.
+        """
+        for metric in self._metrics.values():
+            if isinstance(metric, Counter):
+                metric.value = 0
+            else:
+                metric.reset()
+
+    def snapshot(self) -> dict:
+        """
+        Returns the current value of every metric.
+        :return: The metrics by name.
+        :rtype: dict
+        """
+        values = {name: metric.snapshot() for name, metric in self._metrics.items()}
+        values.update({name: collect() for name, collect in self._collectors.items()})
+        return dict(sorted(values.items()))
+
+
+metrics = Metrics()
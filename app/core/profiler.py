@@ -0,0 +1,156 @@
+import asyncio
+import cProfile
+import marshal
+import sys
+import threading
+from collections import Counter
+from contextlib import suppress
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse, Response
+
+import app.core.config as config
+from app.core.security import get_current_user
+from app.db.postgres import get_db
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_FORMATS = ("pstats", "collapsed")
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class _Sampler:
+    """
+    Samples the stack of the event loop thread from a background thread and
+    counts identical stacks, in the collapsed format read by flame graph tools.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._thread_id = threading.get_ident()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+
+    def _sample(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            # The sampler wakes up while the loop is idle as well, which shows up as the loop's select
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> bytes:
+        self._stopped.set()
+        self._thread.join()
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()).encode("utf-8")
+
+
+class ProfilerMiddleware:
+    """
+    Profiles a single request when it carries an ``X-Profile`` header and a bearer
+    token of a superuser, and returns the profile as a download instead of the
+    response. ``X-Profile: pstats`` uses cProfile and returns a file readable with
+    ``pstats.Stats``; ``X-Profile: collapsed`` samples the stack every
+    ``PROFILE_SAMPLE_INTERVAL`` seconds and returns collapsed stacks.
+
+    Both profilers see everything running on the event loop meanwhile, including
+    other requests, so profiles are best taken on an otherwise idle worker. Only
+    one request is profiled at a time. Requests without the header only pay for
+    the header lookup.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = asyncio.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.PROFILING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        profile_format = _header(scope, PROFILE_HEADER)
+        if profile_format is None:
+            await self.app(scope, receive, send)
+            return
+
+        error = await self._authorize(scope, profile_format)
+        if error is not None:
+            await error(scope, receive, send)
+            return
+        if self._lock.locked():
+            response = JSONResponse({"detail": "Another request is being profiled"}, status_code=409)
+            await response(scope, receive, send)
+            return
+
+        async with self._lock:
+            status = None
+
+            async def capture_send(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+
+            if profile_format == "pstats":
+                profile = cProfile.Profile()
+                profile.enable()
+                try:
+                    await self.app(scope, receive, capture_send)
+                finally:
+                    profile.disable()
+                profile.create_stats()
+                content = marshal.dumps(profile.stats)
+            else:
+                sampler = _Sampler(config.PROFILE_SAMPLE_INTERVAL)
+                sampler.start()
+                try:
+                    await self.app(scope, receive, capture_send)
+                finally:
+                    content = sampler.stop()
+
+        extension = "prof" if profile_format == "pstats" else "txt"
+        response = Response(
+            content,
+            media_type="application/octet-stream" if profile_format == "pstats" else "text/plain",
+            headers={
+                "Content-Disposition": f'attachment; filename="profile.{extension}"',
+                "X-Profiled-Status": str(status),
+            },
+        )
+        await response(scope, receive, send)
+
+    async def _authorize(self, scope, profile_format: str) -> Optional[Response]:
+        if profile_format not in PROFILE_FORMATS:
+            return JSONResponse(
+                {"detail": f"X-Profile must be one of {', '.join(PROFILE_FORMATS)}"}, status_code=400
+            )
+        authorization = _header(scope, b"authorization") or ""
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return JSONResponse({"detail": "Not authenticated"}, status_code=401)
+
+        # Resolve the session the same way endpoints do, honouring dependency overrides
+        get_session = scope["app"].dependency_overrides.get(get_db, get_db)
+        sessions = get_session()
+        try:
+            user = await get_current_user(token, await anext(sessions))
+        except HTTPException as exc:
+            return JSONResponse({"detail": exc.detail}, status_code=exc.status_code)
+        finally:
+            # Run the dependency to completion so its teardown happens
+            with suppress(StopAsyncIteration):
+                await anext(sessions)
+        if not user.is_superuser:
+            return JSONResponse({"detail": "Profiling requires a superuser"}, status_code=403)
+        return None
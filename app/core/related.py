@@ -0,0 +1,269 @@
+import heapq
+import logging
+import math
+import time
+from collections import defaultdict
+from typing import Optional
+
+from sqlalchemy import bindparam, delete, distinct, func, insert as core_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.future import select
+from starlette.concurrency import run_in_threadpool
+
+import app.core.config as config
+from app.core.cdn import RELATED_KEY, cdn_purger
+from app.db.postgres import insert
+from app.models.sql import Post, PostTag, RelatedPost, RelatedQueue
+
+logger = logging.getLogger(__name__)
+
+
+async def queue_related_refresh(db: AsyncSession, post_id: str) -> None:
+    """
+    Queues the related posts of a post, and of the posts sharing tags with it, for
+    a refresh, in the caller's transaction. Called whenever the tags of a post
+    change or a post is deleted.
+    :param db: The database session of the write.
+    :type db: AsyncSession
+    :param post_id: The id of the post whose tags changed.
+    :type post_id: str
+    """
+    statement = insert(db, RelatedQueue).values(post_id=post_id, queued_at=time.time())
+    # A newer timestamp tells a refresh that started before this write not to dequeue the post
+    statement = statement.on_conflict_do_update(
+        index_elements=[RelatedQueue.post_id], set_={"queued_at": statement.excluded.queued_at}
+    )
+    await db.execute(statement)
+
+
+def compute_related(
+    post_tags: dict[str, set],
+    post_ids,
+    top_k: int,
+    max_tag_posts: int,
+    tag_counts: Optional[dict[str, int]] = None,
+    post_count: Optional[int] = None,
+) -> dict[str, list]:
+    """
+    Finds the nearest neighbours of posts by tag overlap: the cosine similarity of
+    their tag vectors, with every tag weighted by its inverse document frequency,
+    so sharing a rare tag counts for more than sharing a common one. Tags on more
+    than ``max_tag_posts`` posts say next to nothing about relatedness and are skipped.
+
+    Without ``tag_counts`` and ``post_count``, ``post_tags`` must hold every post, the
+    frequencies are counted from it. With them, it only needs the posts to find
+    neighbours for, every post sharing one of their non skipped tags, and the tags of all those.
+
+    :param post_tags: The tag ids of every post, or of the posts involved.
+    :type post_tags: dict[str, set]
+    :param post_ids: The posts to find neighbours for.
+    :param top_k: The number of neighbours kept per post.
+    :type top_k: int
+    :param max_tag_posts: The number of posts above which a tag is skipped.
+    :type max_tag_posts: int
+    :param tag_counts: The number of posts of every tag in ``post_tags``.
+    :type tag_counts: Optional[dict[str, int]]
+    :param post_count: The number of posts with tags.
+    :type post_count: Optional[int]
+    :return: The neighbours of each post, as (post id, score) pairs, best first.
+    :rtype: dict[str, list]
+    """
+    postings = defaultdict(list)
+    for post_id, tags in post_tags.items():
+        for tag in tags:
+            postings[tag].append(post_id)
+    if tag_counts is None:
+        tag_counts = {tag: len(posts) for tag, posts in postings.items()}
+        post_count = len(post_tags)
+    weights = {tag: math.log((post_count + 1) / tag_counts[tag]) ** 2 for tag in postings}
+    norms = {
+        post_id: math.sqrt(sum(weights[tag] for tag in tags))
+        for post_id, tags in post_tags.items()
+    }
+
+    related = {}
+    for post_id in post_ids:
+        scores = defaultdict(float)
+        # Only posts sharing a tag get a score, through the posting lists of the post's tags
+        for tag in post_tags.get(post_id, ()):
+            if tag_counts[tag] > max_tag_posts:
+                continue
+            for other in postings[tag]:
+                if other != post_id:
+                    scores[other] += weights[tag]
+        norm = norms.get(post_id)
+        related[post_id] = [
+            (other, score / (norm * norms[other]))
+            for other, score in heapq.nsmallest(
+                top_k, ((other, score) for other, score in scores.items() if score > 0),
+                key=lambda item: (-item[1] / norms[item[0]], item[0]),
+            )
+        ]
+    return related
+
+
+class RelatedIndex:
+    """
+    Keeps the ``related_posts`` table, holding the ``RELATED_TOP_K`` nearest
+    neighbours of every post by tag overlap, so reading the related posts of a
+    post is a single indexed lookup.
+
+    Posts are refreshed through the ``related_queue`` table, written along with
+    the tag change. A refresh recomputes the queued posts, the posts sharing a tag
+    with them and the posts listing them as related, since those are the only
+    ones whose neighbours can have changed, loading only the tags these posts are
+    scored with and the post counts of those tags. Tag weights shift slightly with
+    every change, which the full rebuild every ``RELATED_REBUILD_SECONDS`` catches up with.
+    """
+
+    def __init__(self):
+        self._rebuilt_at: Optional[float] = None
+
+    async def _load_post_tags(
+        self, db: AsyncSession, post_ids: Optional[set] = None, tag_ids: Optional[set] = None
+    ) -> dict[str, set]:
+        # The tags of every post, of the given posts, or of the posts with one of the
+        # given tags, in which case only those tags are loaded
+        post_tags = defaultdict(set)
+        # Tags of deleted posts are left behind in post_tags, the join skips them
+        statement = select(PostTag.post_id, PostTag.tag_id).join(Post, Post.id == PostTag.post_id)
+        if post_ids is None and tag_ids is None:
+            batches = [statement]
+        else:
+            column, values = (PostTag.post_id, post_ids) if post_ids is not None else (PostTag.tag_id, tag_ids)
+            values = list(values)
+            batches = [
+                statement.where(column.in_(values[start:start + config.RELATED_SCAN_BATCH]))
+                for start in range(0, len(values), config.RELATED_SCAN_BATCH)
+            ]
+        for batch in batches:
+            result = await db.stream(batch.execution_options(yield_per=config.RELATED_SCAN_BATCH))
+            async for post_id, tag_id in result:
+                post_tags[post_id].add(tag_id)
+        return post_tags
+
+    async def _count_tags(self, db: AsyncSession, tag_ids: set, tag_counts: dict[str, int]) -> None:
+        # Adds the number of posts of the tags not counted yet
+        missing = [tag_id for tag_id in tag_ids if tag_id not in tag_counts]
+        for start in range(0, len(missing), config.RELATED_SCAN_BATCH):
+            result = await db.execute(
+                select(PostTag.tag_id, func.count())
+                .join(Post, Post.id == PostTag.post_id)
+                .where(PostTag.tag_id.in_(missing[start:start + config.RELATED_SCAN_BATCH]))
+                .group_by(PostTag.tag_id)
+            )
+            tag_counts.update(result.all())
+
+    async def _store(self, db: AsyncSession, related: dict[str, list]) -> None:
+        post_ids = list(related)
+        for start in range(0, len(post_ids), config.RELATED_WRITE_BATCH):
+            batch = post_ids[start:start + config.RELATED_WRITE_BATCH]
+            await db.execute(delete(RelatedPost).where(RelatedPost.post_id.in_(batch)))
+            rows = [
+                {"post_id": post_id, "rank": rank, "related_id": other, "score": score}
+                for post_id in batch
+                for rank, (other, score) in enumerate(related[post_id])
+            ]
+            if rows:
+                await db.execute(core_insert(RelatedPost), rows)
+
+    async def refresh(self, session_factory: async_sessionmaker) -> int:
+        """
+        Recomputes the related posts affected by up to ``RELATED_REFRESH_BATCH`` queued posts.
+        :param session_factory: The factory used to open database sessions.
+        :type session_factory: async_sessionmaker
+        :return: The number of queued posts handled.
+        :rtype: int
+        """
+        async with session_factory() as db:
+            result = await db.execute(
+                select(RelatedQueue.post_id, RelatedQueue.queued_at)
+                .order_by(RelatedQueue.queued_at)
+                .limit(config.RELATED_REFRESH_BATCH)
+            )
+            queued = result.all()
+            if not queued:
+                return 0
+            queued_ids = {post_id for post_id, _ in queued}
+
+            # Only what the affected posts are scored with is loaded, never the whole corpus:
+            # the posts sharing a tag with them and the tags of all those, for the norms
+            tag_counts: dict[str, int] = {}
+            queued_tags = set().union(*(await self._load_post_tags(db, post_ids=queued_ids)).values())
+            await self._count_tags(db, queued_tags, tag_counts)
+            # Tags on too many posts are skipped in scoring, so they relate no posts
+            scored_tags = {tag for tag in queued_tags if tag_counts[tag] <= config.RELATED_MAX_TAG_POSTS}
+            affected = set(queued_ids) | set(await self._load_post_tags(db, tag_ids=scored_tags))
+            result = await db.execute(select(RelatedPost.post_id).where(RelatedPost.related_id.in_(queued_ids)))
+            affected.update(result.scalars().all())
+
+            post_tags = await self._load_post_tags(db, post_ids=affected)
+            affected_tags = set().union(*post_tags.values())
+            await self._count_tags(db, affected_tags, tag_counts)
+            scored_tags = {tag for tag in affected_tags if tag_counts[tag] <= config.RELATED_MAX_TAG_POSTS}
+            candidates = set(await self._load_post_tags(db, tag_ids=scored_tags)) - set(post_tags)
+            post_tags.update(await self._load_post_tags(db, post_ids=candidates))
+            await self._count_tags(db, set().union(*post_tags.values()), tag_counts)
+            result = await db.execute(
+                select(func.count(distinct(PostTag.post_id))).join(Post, Post.id == PostTag.post_id)
+            )
+            post_count = result.scalar_one()
+
+            related = await run_in_threadpool(
+                compute_related, post_tags, affected, config.RELATED_TOP_K, config.RELATED_MAX_TAG_POSTS,
+                tag_counts, post_count,
+            )
+            await self._store(db, related)
+            # Posts queued again meanwhile have a newer timestamp and stay queued
+            queue = RelatedQueue.__table__
+            await db.execute(
+                delete(queue).where(
+                    queue.c.post_id == bindparam("queued_post_id"),
+                    queue.c.queued_at == bindparam("queued_queued_at"),
+                ),
+                [{"queued_post_id": post_id, "queued_queued_at": queued_at} for post_id, queued_at in queued],
+            )
+            await db.commit()
+        cdn_purger.purge(RELATED_KEY)
+        return len(queued)
+
+    async def rebuild(self, session_factory: async_sessionmaker) -> int:
+        """
+        Recomputes the related posts of every post.
+        :param session_factory: The factory used to open database sessions.
+        :type session_factory: async_sessionmaker
+        :return: The number of posts with tags.
+        :rtype: int
+        """
+        async with session_factory() as db:
+            post_tags = await self._load_post_tags(db)
+            related = await run_in_threadpool(
+                compute_related, post_tags, list(post_tags), config.RELATED_TOP_K, config.RELATED_MAX_TAG_POSTS
+            )
+            # Posts without tags, deleted ones included, have no related posts
+            await db.execute(
+                delete(RelatedPost).where(
+                    RelatedPost.post_id.not_in(select(PostTag.post_id).join(Post, Post.id == PostTag.post_id))
+                )
+            )
+            await self._store(db, related)
+            await db.commit()
+        cdn_purger.purge(RELATED_KEY)
+        return len(post_tags)
+
+    async def maintain(self, session_factory: async_sessionmaker) -> None:
+        """
+        Rebuilds everything if the last rebuild is ``RELATED_REBUILD_SECONDS`` old, then
+        refreshes every queued post. Run every ``RELATED_REFRESH_SECONDS``, so refreshes
+        and rebuilds never overlap.
+        :param session_factory: The factory used to open database sessions.
+        :type session_factory: async_sessionmaker
+        """
+        if self._rebuilt_at is None or time.monotonic() - self._rebuilt_at >= config.RELATED_REBUILD_SECONDS:
+            await self.rebuild(session_factory)
+            self._rebuilt_at = time.monotonic()
+        while await self.refresh(session_factory) == config.RELATED_REFRESH_BATCH:
+            pass
+
+
+related_index = RelatedIndex()
@@ -0,0 +1,215 @@
+import html
+import logging
+import re
+from urllib.parse import urlparse
+
+from sqlalchemy import or_, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.future import select
+from starlette.concurrency import run_in_threadpool
+
+import app.core.config as config
+from app.core.diff import content_hash
+from app.core.singleflight import post_flights
+from app.models.sql import Post
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the output of render_post changes, so stored renders get refreshed
+RENDER_VERSION = 1
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_BULLET = re.compile(r"^\s*[-*+]\s+(.*)$")
+_NUMBERED = re.compile(r"^\s*\d+[.)]\s+(.*)$")
+_FENCE = re.compile(r"^\s*```\s*([\w+-]*)")
+_INLINE = re.compile(r"`([^`]+)`|!\[([^\]]*)\]\(([^)\s]+)\)|\[([^\]]+)\]\(([^)\s]+)\)")
+_EMPHASIS = (
+    (re.compile(r"\*\*(.+?)\*\*"), r"<strong>\1</strong>"),
+    (re.compile(r"(?<!\w)__(.+?)__(?!\w)"), r"<strong>\1</strong>"),
+    (re.compile(r"\*(.+?)\*"), r"<em>\1</em>"),
+    (re.compile(r"(?<!\w)_(.+?)_(?!\w)"), r"<em>\1</em>"),
+)
+_TAG = re.compile(r"<[^>]+>")
+
+LINK_SCHEMES = ("http", "https", "mailto", "")
+IMAGE_SCHEMES = ("http", "https", "")
+
+
+def _emphasis(text: str) -> str:
+    for pattern, replacement in _EMPHASIS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _safe_url(url: str, schemes: tuple[str, ...]) -> bool:
+    try:
+        return urlparse(url).scheme.lower() in schemes
+    except ValueError:
+        return False
+
+
+def _inline(text: str) -> str:
+    # Every piece of user text is escaped, so the only markup is the one generated here
+    parts, position = [], 0
+    for match in _INLINE.finditer(text):
+        parts.append(_emphasis(html.escape(text[position:match.start()], quote=False)))
+        code, alt, src, label, href = match.groups()
+        if code is not None:
+            parts.append(f"<code>{html.escape(code, quote=False)}</code>")
+        elif src is not None:
+            if _safe_url(src, IMAGE_SCHEMES):
+                parts.append(f'<img src="{html.escape(src)}" alt="{html.escape(alt)}">')
+            else:
+                parts.append(html.escape(alt, quote=False))
+        elif _safe_url(href, LINK_SCHEMES):
+            parts.append(f'<a href="{html.escape(href)}" rel="nofollow noopener">{_emphasis(html.escape(label, quote=False))}</a>')
+        else:
+            parts.append(_emphasis(html.escape(label, quote=False)))
+        position = match.end()
+    parts.append(_emphasis(html.escape(text[position:], quote=False)))
+    return "".join(parts)
+
+
+def _is_block_start(line: str) -> bool:
+    return bool(
+        _HEADING.match(line) or _RULE.match(line) or _BULLET.match(line) or _NUMBERED.match(line)
+        or _FENCE.match(line) or line.lstrip().startswith(">")
+    )
+
+
+def _blocks(lines: list[str]) -> list[str]:
+    blocks, i = [], 0
+    while i < len(lines):
+        line = lines[i]
+        if not line.strip():
+            i += 1
+            continue
+
+        fence = _FENCE.match(line)
+        if fence:
+            code, i = [], i + 1
+            while i < len(lines) and not lines[i].strip().startswith("```"):
+                code.append(lines[i])
+                i += 1
+            i += 1
+            language = f' class="language-{fence.group(1)}"' if fence.group(1) else ""
+            blocks.append(f"<pre><code{language}>{html.escape(chr(10).join(code), quote=False)}</code></pre>")
+            continue
+
+        heading = _HEADING.match(line)
+        if heading:
+            level = len(heading.group(1))
+            blocks.append(f"<h{level}>{_inline(heading.group(2))}</h{level}>")
+            i += 1
+            continue
+
+        if _RULE.match(line):
+            blocks.append("<hr>")
+            i += 1
+            continue
+
+        if line.lstrip().startswith(">"):
+            quoted = []
+            while i < len(lines) and lines[i].lstrip().startswith(">"):
+                quoted.append(re.sub(r"^\s*>\s?", "", lines[i]))
+                i += 1
+            blocks.append(f"<blockquote>{''.join(_blocks(quoted))}</blockquote>")
+            continue
+
+        for pattern, tag in ((_BULLET, "ul"), (_NUMBERED, "ol")):
+            if pattern.match(line):
+                items = []
+                while i < len(lines) and pattern.match(lines[i]):
+                    items.append(f"<li>{_inline(pattern.match(lines[i]).group(1))}</li>")
+                    i += 1
+                blocks.append(f"<{tag}>{''.join(items)}</{tag}>")
+                break
+        else:
+            paragraph = [line.strip()]
+            i += 1
+            while i < len(lines) and lines[i].strip() and not _is_block_start(lines[i]):
+                paragraph.append(lines[i].strip())
+                i += 1
+            blocks.append(f"<p>{_inline(chr(10).join(paragraph))}</p>")
+    return blocks
+
+
+def render_markdown(text: str) -> str:
+    """
+    Renders a safe subset of Markdown to HTML: headings, paragraphs, emphasis,
+    inline and fenced code, links, images, lists, block quotes and rules. Raw HTML
+    in the input is escaped, and links and images are restricted to safe schemes.
+    :param text: The Markdown source.
+    :type text: str
+    :return: The HTML fragment.
+    :rtype: str
+    """
+    return "\n".join(_blocks(text.replace("\r\n", "\n").split("\n")))
+
+
+def render_post(content: str) -> dict:
+    """
+    Renders the content of a post along with the fields derived from it.
+    :param content: The Markdown content of the post.
+    :type content: str
+    :return: The ``html``, ``excerpt``, ``word_count``, ``content_hash`` and
+             ``render_version`` column values.
+    :rtype: dict
+    """
+    rendered = render_markdown(content)
+    text = " ".join(html.unescape(_TAG.sub(" ", rendered)).split())
+    excerpt = text
+    if len(text) > config.EXCERPT_LENGTH:
+        cut = text[:config.EXCERPT_LENGTH + 1]
+        excerpt = (cut.rsplit(" ", 1)[0] if " " in cut else cut[:-1]) + "…"
+    return {
+        "html": rendered,
+        "excerpt": excerpt,
+        "word_count": len(text.split()),
+        "content_hash": content_hash(content),
+        "render_version": RENDER_VERSION,
+    }
+
+
+async def rerender_stale(session_factory: async_sessionmaker) -> int:
+    """
+    Renders every post whose stored render is missing or comes from another renderer version.
+    :param session_factory: The factory used to open database sessions.
+    :type session_factory: async_sessionmaker
+    :return: The number of posts rendered.
+    :rtype: int
+    """
+    rendered, after = 0, ""
+    while True:
+        async with session_factory() as db:
+            result = await db.execute(
+                select(Post.id, Post.slug, Post.content, Post.revision)
+                .where(Post.id > after)
+                .where(or_(Post.render_version.is_(None), Post.render_version != RENDER_VERSION))
+                .order_by(Post.id)
+                .limit(config.RENDER_BATCH)
+            )
+            posts = result.all()
+            if not posts:
+                return rendered
+            for id, slug, content, revision in posts:
+                values = await run_in_threadpool(render_post, content)
+                # Skip posts edited meanwhile, their edit has rendered them already
+                await db.execute(update(Post).where(Post.id == id, Post.revision == revision).values(**values))
+            await db.commit()
+        for _, slug, _, _ in posts:
+            post_flights.forget(slug)
+        rendered += len(posts)
+        after = posts[-1][0]
+
+
+async def rerender_job(session_factory: async_sessionmaker) -> None:
+    """
+    Re-renders stale posts and logs how many. Run every ``RENDER_JOB_SECONDS``.
+    :param session_factory: The factory used to open database sessions.
+    :type session_factory: async_sessionmaker
+    """
+    count = await rerender_stale(session_factory)
+    if count:
+        logger.info("Re-rendered %d posts with renderer version %d", count, RENDER_VERSION)
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, UTC
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.future import select
+
+import app.core.config as config
+from app.core.metrics import metrics
+from app.models.sql import PostVersion
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def versions_to_delete(versions: list, now: datetime) -> list[str]:
+    """
+    Applies the retention policy to the versions of one post. Versions newer than
+    ``VERSIONS_KEEP_ALL_DAYS`` are all kept; up to ``VERSIONS_KEEP_DAILY_DAYS`` the
+    latest version of every day is kept, and beyond that the latest of every month.
+    With ``VERSIONS_KEEP_MONTHLY_DAYS`` set, monthly versions older than that go
+    too. Labelled versions and the latest version of the post are always kept.
+    :param versions: The (id, created_at, label) of the versions of a post, in any order.
+                     Versions newer than ``VERSIONS_KEEP_ALL_DAYS`` may be left out,
+                     except the latest one.
+    :type versions: list
+    :param now: The current time.
+    :type now: datetime
+    :return: The ids of the versions to delete.
+    :rtype: list[str]
+    """
+    keep_all = (now - timedelta(days=config.VERSIONS_KEEP_ALL_DAYS)).strftime(TIMESTAMP_FORMAT)
+    keep_daily = (now - timedelta(days=config.VERSIONS_KEEP_DAILY_DAYS)).strftime(TIMESTAMP_FORMAT)
+    keep_monthly = None
+    if config.VERSIONS_KEEP_MONTHLY_DAYS:
+        keep_monthly = (now - timedelta(days=config.VERSIONS_KEEP_MONTHLY_DAYS)).strftime(TIMESTAMP_FORMAT)
+
+    doomed, buckets = [], set()
+    # Newest first, so the first version seen in a day or month is the one kept
+    ordered = sorted(versions, key=lambda version: (version[1], version[0]), reverse=True)
+    for index, (id, created_at, label) in enumerate(ordered):
+        if label or created_at >= keep_all:
+            continue
+        # Timestamps are stored as text, their prefixes are the day and the month
+        bucket = created_at[:10] if created_at >= keep_daily else created_at[:7]
+        if index == 0:
+            buckets.add(bucket)
+        elif bucket in buckets or (keep_monthly is not None and created_at < keep_monthly):
+            doomed.append(id)
+        else:
+            buckets.add(bucket)
+    return doomed
+
+
+class VersionCompactor:
+    """
+    Enforces the retention policy of ``post_versions`` in the background.
+
+    Posts are visited in batches of ``VERSIONS_SCAN_BATCH``, and only the versions
+    old enough for the policy to drop are read, along with the latest version of
+    each post, which the policy always keeps. Deletes run in transactions of at
+    most ``VERSIONS_DELETE_BATCH`` rows, with a pause of ``VERSIONS_DELETE_PAUSE``
+    seconds in between, so compaction never holds locks for long or floods the
+    database with dead rows at once.
+    """
+
+    def __init__(self):
+        self.deleted = metrics.counter("post_versions_deleted_total")
+
+    async def compact(self, session_factory: async_sessionmaker, now: Optional[datetime] = None) -> int:
+        """
+        Deletes the versions the retention policy does not keep.
+        :param session_factory: The factory used to open database sessions.
+        :type session_factory: async_sessionmaker
+        :param now: The time the policy is applied at, the current time by default.
+        :type now: Optional[datetime]
+        :return: The number of versions deleted.
+        :rtype: int
+        """
+        now = now or datetime.now(UTC)
+        cutoff = (now - timedelta(days=config.VERSIONS_KEEP_ALL_DAYS)).strftime(TIMESTAMP_FORMAT)
+        deleted, after = 0, ""
+        while True:
+            async with session_factory() as db:
+                result = await db.execute(
+                    select(PostVersion.post_id)
+                    .where(PostVersion.post_id > after, PostVersion.created_at < cutoff)
+                    .group_by(PostVersion.post_id)
+                    .order_by(PostVersion.post_id)
+                    .limit(config.VERSIONS_SCAN_BATCH)
+                )
+                post_ids = result.scalars().all()
+                if not post_ids:
+                    return deleted
+                doomed = []
+                for post_id in post_ids:
+                    columns = select(PostVersion.id, PostVersion.created_at, PostVersion.label).where(
+                        PostVersion.post_id == post_id
+                    )
+                    result = await db.execute(columns.where(PostVersion.created_at < cutoff))
+                    versions = set(result.all())
+                    # Versions kept in full are never read, except the latest, which is always kept
+                    result = await db.execute(
+                        columns.order_by(PostVersion.created_at.desc(), PostVersion.id.desc()).limit(1)
+                    )
+                    versions.update(result.all())
+                    doomed.extend(versions_to_delete(list(versions), now))
+                await db.rollback()
+
+            for start in range(0, len(doomed), config.VERSIONS_DELETE_BATCH):
+                async with session_factory() as db:
+                    batch = doomed[start:start + config.VERSIONS_DELETE_BATCH]
+                    # Labels set meanwhile still protect their versions
+                    result = await db.execute(
+                        delete(PostVersion).where(PostVersion.id.in_(batch), PostVersion.label.is_(None))
+                    )
+                    await db.commit()
+                deleted += result.rowcount
+                self.deleted.incr(result.rowcount)
+                await asyncio.sleep(config.VERSIONS_DELETE_PAUSE)
+            after = post_ids[-1]
+
+    async def compact_job(self, session_factory: async_sessionmaker) -> None:
+        """
+        Compacts the version history and logs how many versions went. Run every
+        ``VERSIONS_COMPACT_SECONDS``, or at the times of ``VERSIONS_COMPACT_CRON``.
+        :param session_factory: The factory used to open database sessions.
+        :type session_factory: async_sessionmaker
+        """
+        count = await self.compact(session_factory)
+        if count:
+            logger.info("Deleted %d post versions past their retention", count)
+
+
+version_compactor = VersionCompactor()
@@ -0,0 +1,361 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import suppress
+from datetime import datetime, timedelta, UTC
+from typing import Any, Awaitable, Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, async_sessionmaker
+
+import app.core.config as config
+from app.core.metrics import Histogram, metrics
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from quick flushes to full rebuilds
+RUN_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Minute, hour, day of month, month and day of week, where both 0 and 7 are Sunday
+CRON_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _parse_cron_field(field: str, low: int, high: int) -> set[int]:
+    values = set()
+    for part in field.split(","):
+        expression, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if expression == "*":
+            start, end = low, high
+        elif "-" in expression:
+            start, end = (int(value) for value in expression.split("-", 1))
+        else:
+            # "5/15" counts from 5 to the end of the range
+            start = int(expression)
+            end = high if step > 1 else start
+        if step < 1 or start < low or end > high or start > end:
+            raise ValueError(f"Invalid cron field {field!r}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class Cron:
+    """
+    A cron expression with the five standard fields: minute, hour, day of month,
+    month and day of week. Fields take ``*``, values, ranges, steps and lists. As
+    in cron, when both days are restricted a time matching either of them matches.
+    Times are in UTC.
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression {expression!r} must have 5 fields")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_cron_field(field, low, high) for field, (low, high) in zip(fields, CRON_RANGES)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        self._either_day = fields[2] != "*" and fields[4] != "*"
+        self.next_after(datetime.now(UTC))
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        # Python counts weekdays from Monday, cron from Sunday
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        return day or weekday if self._either_day else day and weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        """
+        Returns the first time the expression matches after the given time.
+        :param moment: The time to start from.
+        :type moment: datetime
+        :return: The next matching time, to the minute.
+        :rtype: datetime
+        :raises ValueError: If the expression never matches, such as on the 30th of February.
+        """
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Every day that exists comes around within a leap year cycle
+        limit = moment + timedelta(days=4 * 366)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression {self.expression!r} never matches")
+
+
+class Job:
+    """
+    A periodic job of the scheduler, with the metrics of its runs.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[async_sessionmaker], Awaitable[Any]],
+        interval: Optional[float],
+        cron: Optional[Cron],
+        jitter: float,
+        timeout: Optional[float],
+        singleton: bool,
+        run_at_start: bool,
+    ):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.cron = cron
+        self.jitter = jitter
+        self.timeout = timeout
+        self.singleton = singleton
+        self.run_at_start = run_at_start
+        self.wakeup = asyncio.Event()
+        self.running = False
+        self.runs = self.failures = self.timeouts = self.skipped = 0
+        self.next_run_at: Optional[float] = None
+        self.run_seconds = Histogram(RUN_BUCKETS)
+        self.lag_seconds = Histogram(LAG_BUCKETS)
+
+    def next_time(self, now: float) -> float:
+        """
+        Returns when the job is due next.
+        :param now: The current time, as a Unix timestamp.
+        :type now: float
+        :return: The Unix timestamp of the next run.
+        :rtype: float
+        """
+        if self.cron is not None:
+            due = self.cron.next_after(datetime.fromtimestamp(now, UTC)).timestamp()
+        else:
+            due = now + self.interval
+        return due + random.uniform(0, self.jitter)
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "skipped": self.skipped,
+            "running": self.running,
+            "next_run_in": round(self.next_run_at - time.time(), 3) if self.next_run_at else None,
+            "run_seconds": self.run_seconds.snapshot(),
+            "lag_seconds": self.lag_seconds.snapshot(),
+        }
+
+
+class Scheduler:
+    """
+    Runs the periodic background jobs of a worker.
+
+    Every job runs in a task of its own, so a slow job never delays the others,
+    and runs of a job never overlap: interval jobs are timed from the end of their
+    previous run, and cron jobs skip the times that pass while a run is going on.
+    A random delay of up to the job's jitter is added to every run, so workers
+    started together do not all hit the database at once.
+
+    Jobs keeping in-process state, such as caches, run on every worker. Singleton
+    jobs, doing the same database work wherever they run, only run on the leader:
+    the worker holding the ``SCHEDULER_LOCK_KEY`` advisory lock on a connection of
+    its own. Workers try to take the lock every ``SCHEDULER_LEADER_SECONDS``, and
+    the lock is released along with the connection, so another worker takes over
+    within that time when the leader goes away. SQLite has no advisory locks, and
+    every worker leads there.
+    """
+
+    def __init__(self):
+        self.jobs: dict[str, Job] = {}
+        self.is_leader = False
+        self._connection: Optional[AsyncConnection] = None
+        self._tasks: list[asyncio.Task] = []
+
+    def add(
+        self,
+        name: str,
+        func: Callable[[async_sessionmaker], Awaitable[Any]],
+        interval: Optional[float] = None,
+        cron: Optional[str] = None,
+        jitter: Optional[float] = None,
+        timeout: Optional[float] = None,
+        singleton: bool = False,
+        run_at_start: bool = True,
+    ) -> Job:
+        """
+        Adds a job, replacing any job of the same name. Jobs added after ``start`` are not run.
+        :param name: The name of the job, as shown in the metrics.
+        :type name: str
+        :param func: The coroutine function run, called with the session factory.
+        :type func: Callable[[async_sessionmaker], Awaitable[Any]]
+        :param interval: The seconds between the end of a run and the start of the next.
+        :type interval: Optional[float]
+        :param cron: A cron expression for the times the job runs at, instead of an interval.
+        :type cron: Optional[str]
+        :param jitter: The maximum random delay added to every run, in seconds, by default
+                       ``SCHEDULER_JITTER`` of the interval, and none for cron jobs.
+        :type jitter: Optional[float]
+        :param timeout: The seconds after which a run is cancelled, ``SCHEDULER_JOB_TIMEOUT`` by default.
+        :type timeout: Optional[float]
+        :param singleton: Whether the job only runs on the leader.
+        :type singleton: bool
+        :param run_at_start: Whether an interval job runs right away rather than after an interval.
+        :type run_at_start: bool
+        :return: The job.
+        :rtype: Job
+        :raises ValueError: If neither or both of an interval and a cron expression are given.
+        """
+        if (interval is None) == (cron is None):
+            raise ValueError(f"Job {name} needs either an interval or a cron expression")
+        if jitter is None:
+            jitter = interval * config.SCHEDULER_JITTER if interval is not None else 0.0
+        job = Job(
+            name, func, interval, Cron(cron) if cron is not None else None, jitter,
+            timeout if timeout is not None else config.SCHEDULER_JOB_TIMEOUT or None,
+            singleton, run_at_start,
+        )
+        self.jobs[name] = job
+        return job
+
+    def trigger(self, name: str) -> None:
+        """
+        Runs a job as soon as it is not running, without waiting for its next time.
+        :param name: The name of the job. Unknown jobs are ignored.
+        :type name: str
+        """
+        job = self.jobs.get(name)
+        if job is not None:
+            job.wakeup.set()
+
+    async def run_job(self, job: Job, session_factory: async_sessionmaker) -> None:
+        """
+        Runs a job once, recording its run time, failures and timeouts.
+        :param job: The job.
+        :type job: Job
+        :param session_factory: The factory used to open database sessions.
+        :type session_factory: async_sessionmaker
+        """
+        job.running = True
+        start = time.perf_counter()
+        try:
+            # Unlike wait_for, timeout never swallows a cancellation racing with the end of the run
+            async with asyncio.timeout(job.timeout):
+                await job.func(session_factory)
+        except TimeoutError:
+            job.timeouts += 1
+            logger.warning("Job %s timed out after %ss", job.name, job.timeout)
+        except Exception:
+            job.failures += 1
+            logger.exception("Job %s failed", job.name)
+        finally:
+            job.running = False
+        job.runs += 1
+        job.run_seconds.observe(time.perf_counter() - start)
+
+    async def _loop(self, job: Job, session_factory: async_sessionmaker) -> None:
+        now = time.time()
+        job.next_run_at = now if job.run_at_start and job.cron is None else job.next_time(now)
+        while True:
+            delay = job.next_run_at - time.time()
+            if delay > 0:
+                with suppress(TimeoutError):
+                    async with asyncio.timeout(delay):
+                        await job.wakeup.wait()
+            # A trigger arriving during the run below is kept and starts the next one right away
+            due = time.time() if job.wakeup.is_set() else job.next_run_at
+            job.wakeup.clear()
+            job.lag_seconds.observe(max(time.time() - due, 0.0))
+            if job.singleton and not self.is_leader:
+                job.skipped += 1
+            else:
+                await self.run_job(job, session_factory)
+            job.next_run_at = job.next_time(time.time())
+
+    async def _try_lead(self, engine: AsyncEngine) -> None:
+        connection = await engine.connect()
+        try:
+            # The lock belongs to the database session, so no transaction is left open on it
+            connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+            result = await connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": config.SCHEDULER_LOCK_KEY}
+            )
+            acquired = result.scalar()
+        except Exception:
+            await connection.close()
+            raise
+        if not acquired:
+            await connection.close()
+            return
+        self._connection = connection
+        self.is_leader = True
+        logger.info("This worker now runs the singleton jobs")
+
+    async def _resign(self) -> None:
+        self.is_leader = False
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            with suppress(Exception):
+                await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": config.SCHEDULER_LOCK_KEY})
+            with suppress(Exception):
+                await connection.close()
+
+    async def _elect(self, engine: AsyncEngine) -> None:
+        while True:
+            try:
+                if self._connection is None:
+                    await self._try_lead(engine)
+                else:
+                    # A broken connection has lost the lock along with it
+                    await self._connection.execute(text("SELECT 1"))
+            except Exception:
+                if self.is_leader:
+                    logger.exception("Lost the scheduler lock")
+                else:
+                    logger.exception("Taking the scheduler lock failed")
+                await self._resign()
+            await asyncio.sleep(config.SCHEDULER_LEADER_SECONDS)
+
+    def start(self, session_factory: async_sessionmaker, engine: AsyncEngine) -> None:
+        """
+        Starts running the jobs, and the leader election.
+        :param session_factory: The factory the jobs open database sessions with.
+        :type session_factory: async_sessionmaker
+        :param engine: The engine the advisory lock is taken on.
+        :type engine: AsyncEngine
+        """
+        if engine.dialect.name == "postgresql":
+            self._tasks.append(asyncio.create_task(self._elect(engine)))
+        else:
+            self.is_leader = True
+        for job in self.jobs.values():
+            self._tasks.append(asyncio.create_task(self._loop(job, session_factory)))
+
+    async def stop(self) -> None:
+        """
+        Cancels the jobs, waits for them to finish and gives up the leadership.
+        """
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+        await self._resign()
+
+    def stats(self) -> dict:
+        """
+        Returns whether this worker leads and the metrics of every job.
+        :return: The scheduler metrics.
+        :rtype: dict
+        """
+        return {"leader": self.is_leader, "jobs": {name: job.stats() for name, job in self.jobs.items()}}
+
+
+scheduler = Scheduler()
+
+metrics.collector("scheduler", scheduler.stats)
@@ -1,20 +1,82 @@
+import logging
+import math
+import time
+
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from jose import jwt, JWTError, ExpiredSignatureError
 from datetime import datetime, timedelta, UTC
 
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.concurrency import run_in_threadpool
 
 from app.db.postgres import get_db
 from app.models.security import TokenData
 
-from app.core.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.core.config import (
+    SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, BCRYPT_ROUNDS, BCRYPT_MIN_ROUNDS, BCRYPT_TARGET_SECONDS,
+)
+from app.core.metrics import metrics
+from app.core.tracing import span
 from app.models.sql import User
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+# bcrypt refuses costs above 31
+BCRYPT_MAX_ROUNDS = 31
+
+
+def _bcrypt_policy(rounds: int) -> dict:
+    # Hashes of any other cost need an update, so the cost can go down as well as up
+    return {"bcrypt__default_rounds": rounds, "bcrypt__min_rounds": rounds, "bcrypt__max_rounds": rounds}
+
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", **_bcrypt_policy(BCRYPT_ROUNDS or BCRYPT_MIN_ROUNDS))
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+rehashed = metrics.counter("password_rehashes_total")
+
+def calibrate_bcrypt_rounds(target_seconds: float, min_rounds: int) -> int:
+    """
+    Picks the bcrypt cost whose hashes take about the target time to verify on this
+    machine. Every extra round doubles the time, so a single hash at the floor cost
+    is enough to extrapolate from.
+    :param target_seconds: The time a verify should take.
+    :type target_seconds: float
+    :param min_rounds: The lowest cost returned, however slow the machine.
+    :type min_rounds: int
+    :return: The highest cost verifying within the target time, or the floor.
+    :rtype: int
+    """
+    handler = pwd_context.handler("bcrypt").using(rounds=min_rounds)
+    start = time.perf_counter()
+    handler.hash("calibration")
+    elapsed = time.perf_counter() - start
+    extra = math.floor(math.log2(target_seconds / elapsed)) if elapsed < target_seconds else 0
+    return min(min_rounds + extra, BCRYPT_MAX_ROUNDS)
+
+def set_bcrypt_rounds(rounds: int) -> None:
+    """
+    Sets the cost of new hashes. Hashes of any other cost are rehashed on login.
+    :param rounds: The bcrypt cost.
+    :type rounds: int
+    """
+    pwd_context.update(**_bcrypt_policy(rounds))
+
+async def calibrate_password_hashing() -> int:
+    """
+    Sets the cost of new hashes at startup: ``BCRYPT_ROUNDS`` when set, otherwise the
+    cost verifying in ``BCRYPT_TARGET_SECONDS`` on this machine, but no lower than
+    ``BCRYPT_MIN_ROUNDS``. Pin the cost when workers run on differing hardware, so
+    they don't rehash each other's hashes back and forth.
+    :return: The bcrypt cost.
+    :rtype: int
+    """
+    rounds = BCRYPT_ROUNDS or await run_in_threadpool(calibrate_bcrypt_rounds, BCRYPT_TARGET_SECONDS, BCRYPT_MIN_ROUNDS)
+    set_bcrypt_rounds(rounds)
+    logger.info("Hashing passwords with bcrypt cost %d", rounds)
+    return rounds
 
 def hash_password(password: str) -> str:
     """
@@ -24,7 +86,8 @@ def hash_password(password: str) -> str:
     :return: Hashed password
     :rtype: str
     """
-    return pwd_context.hash(password)
+    with span("bcrypt.hash"):
+        return pwd_context.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
@@ -36,7 +99,43 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     :return: True if the password matches, False otherwise
     :rtype: bool
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    with span("bcrypt.verify"):
+        return pwd_context.verify(plain_password, hashed_password)
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Checks whether a hash was made with another cost than the current one.
+    :param hashed_password:
+    :type hashed_password: str
+    :return: True if the password should be hashed again, False otherwise
+    :rtype: bool
+    """
+    return pwd_context.needs_update(hashed_password)
+
+async def rehash_password(session_factory: async_sessionmaker, user_id: str, old_hash: str, password: str) -> None:
+    """
+    Replaces a hash with one of the current cost. Run after the login response is sent,
+    so the user never waits for the hash or the write.
+    :param session_factory: The factory used to open database sessions.
+    :type session_factory: async_sessionmaker
+    :param user_id: The id of the user.
+    :type user_id: str
+    :param old_hash: The hash the password was verified against.
+    :type old_hash: str
+    :param password: The verified password.
+    :type password: str
+    """
+    try:
+        new_hash = await run_in_threadpool(pwd_context.hash, password)
+        async with session_factory() as db:
+            # A password changed meanwhile is left alone
+            result = await db.execute(
+                update(User).where(User.id == user_id, User.hashed_password == old_hash).values(hashed_password=new_hash)
+            )
+            await db.commit()
+        rehashed.incr(result.rowcount)
+    except Exception:
+        logger.exception("Rehashing the password of user %s failed", user_id)
 
 def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     """
@@ -70,7 +169,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with span("auth.jwt_decode"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
@@ -79,8 +179,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     except JWTError:
         raise HTTPException(status_code=401, detail="Could not validate credentials")
 
-    result = await db.execute(select(User).where(User.email == email))
-    user = result.scalar_one_or_none()
+    with span("auth.user_lookup"):
+        result = await db.execute(select(User).where(User.email == email))
+        user = result.scalar_one_or_none()
     if user is None:
         raise credentials_exception
 
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Hashable
+
+import app.core.config as config
+from app.core.cache import LRUCache
+
+# Returned by peek() when nothing fresh is cached, since None is a valid result
+MISSING = object()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into a single in-flight call whose
+    result, or exception, is shared by every caller.
+
+    With ``ttl`` set, results are also kept for that many seconds. With ``stale_ttl``
+    set, an expired result may still be served for that many extra seconds while
+    one caller refreshes it; everyone else gets the stale value instead of waiting.
+    ``timeout`` bounds how long each caller waits for the shared call, without
+    cancelling it for the others.
+    """
+
+    def __init__(self, timeout: float = None, ttl: float = 0.0, stale_ttl: float = 0.0, max_entries: int = 1024):
+        self.timeout = timeout
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._flights: dict[Hashable, asyncio.Future] = {}
+        self._results = LRUCache(max_entries)
+        self._generation = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Returns the result of ``fn()``, sharing it with concurrent callers of the same key.
+        :param key: The key identifying identical calls.
+        :type key: Hashable
+        :param fn: The coroutine function performing the actual work.
+        :type fn: Callable[[], Awaitable[Any]]
+        :return: The (possibly cached or stale) result of the call.
+        :rtype: Any
+        :raises TimeoutError: If the shared call does not finish within ``timeout``.
+        """
+        flight = self._flights.get(key)
+        cached = self._results.get(key)
+        if cached is not None:
+            age = time.monotonic() - cached[0]
+            if age <= self.ttl:
+                return cached[1]
+            if age <= self.ttl + self.stale_ttl and flight is not None:
+                # Someone is already refreshing this key, serve the stale value meanwhile
+                return cached[1]
+
+        if flight is None:
+            flight = asyncio.ensure_future(self._run(key, fn))
+            # Nobody may be left waiting if every caller timed out
+            flight.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._flights[key] = flight
+
+        return await asyncio.wait_for(asyncio.shield(flight), self.timeout)
+
+    async def _run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        generation = self._generation
+        try:
+            value = await fn()
+            # Results of calls that raced with an invalidation are not kept
+            if (self.ttl or self.stale_ttl) and self._generation == generation:
+                self._results.set(key, (time.monotonic(), value))
+            return value
+        finally:
+            if self._flights.get(key) is asyncio.current_task():
+                del self._flights[key]
+
+    def peek(self, key: Hashable) -> Any:
+        """
+        Returns the fresh cached result for ``key`` without calling anything.
+        :param key: The key to look up.
+        :type key: Hashable
+        :return: The cached result, or ``MISSING`` if there is none.
+        :rtype: Any
+        """
+        cached = self._results.get(key)
+        if cached is None or time.monotonic() - cached[0] > self.ttl:
+            return MISSING
+        return cached[1]
+
+    def forget(self, key: Hashable) -> None:
+        """
+        Invalidates ``key``, so the next call performs a fresh lookup.
+        :param key: The key to invalidate.
+        :type key: Hashable
+        """
+        self._results.pop(key)
+        self._flights.pop(key, None)
+        self._generation += 1
+
+    def clear(self) -> None:
+        """
+        Invalidates every key.
+        """
+        self._results.clear()
+        self._flights.clear()
+        self._generation += 1
+
+
+post_flights = SingleFlight(
+    timeout=config.SINGLEFLIGHT_TIMEOUT,
+    ttl=config.POST_CACHE_TTL,
+    stale_ttl=config.POST_CACHE_STALE_TTL,
+    max_entries=config.POST_CACHE_SIZE,
+)
+feed_flights = SingleFlight(
+    timeout=config.SINGLEFLIGHT_TIMEOUT,
+    ttl=config.FEED_CACHE_TTL,
+    stale_ttl=config.FEED_CACHE_STALE_TTL,
+    max_entries=8,
+)
+tag_flights = SingleFlight(
+    timeout=config.SINGLEFLIGHT_TIMEOUT,
+    ttl=config.TAGS_CACHE_TTL,
+    stale_ttl=config.TAGS_CACHE_STALE_TTL,
+    max_entries=8,
+)
@@ -0,0 +1,184 @@
+import asyncio
+import time
+from bisect import bisect_right
+from typing import Optional
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+import app.core.config as config
+from app.models.sql import Post
+
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+def _lastmod(updated_at: Optional[str]) -> str:
+    # Timestamps are stored as "%Y-%m-%d %H:%M:%S" in UTC
+    if not updated_at:
+        return ""
+    return f"<lastmod>{updated_at.replace(' ', 'T')}+00:00</lastmod>"
+
+
+class SitemapShards:
+    """
+    Splits the posts into sitemap shards by ranges of post ids and caches the
+    rendered XML of each shard.
+
+    The shard boundaries are planned by streaming post ids in key order, and each
+    shard is rendered by streaming the posts of its key range, so posts are never
+    all loaded at once. Writes invalidate only the shard whose key range contains
+    the changed post. A shard that outgrows ``shard_size`` triggers a re-plan, and
+    every cached document also expires after ``ttl`` seconds so changes made by
+    other workers are eventually picked up.
+    """
+
+    def __init__(self, shard_size: int = None, ttl: int = None):
+        self.shard_size = shard_size or config.SITEMAP_SHARD_SIZE
+        self.ttl = config.SITEMAP_CACHE_TTL if ttl is None else ttl
+        self._plan_lock = asyncio.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Drops the shard plan and all cached documents.
+        """
+        self._boundaries: Optional[list[str]] = None
+        self._counts: list[int] = []
+        self._planned_at = 0.0
+        self._documents: dict[int, tuple[float, str, bytes]] = {}
+        self._generations: dict[int, int] = {}
+
+    def _expired(self, created_at: float) -> bool:
+        return time.monotonic() - created_at > self.ttl
+
+    async def plan(self, db: AsyncSession) -> list[str]:
+        """
+        Returns the first post id of every shard, planning the shards if needed.
+        :param db: The database session used to stream the post ids.
+        :type db: AsyncSession
+        :return: The lower key bound of each shard.
+        :rtype: list[str]
+        """
+        async with self._plan_lock:
+            if self._boundaries is not None and not self._expired(self._planned_at):
+                return self._boundaries
+
+            boundaries, counts = [], []
+            result = await db.stream(
+                select(Post.id).order_by(Post.id).execution_options(yield_per=config.SITEMAP_STREAM_BATCH)
+            )
+            async for post_id in result.scalars():
+                if not counts or counts[-1] == self.shard_size:
+                    boundaries.append(post_id)
+                    counts.append(0)
+                counts[-1] += 1
+
+            self.reset()
+            self._boundaries, self._counts = boundaries, counts
+            self._planned_at = time.monotonic()
+            return boundaries
+
+    def _shard_of(self, post_id: str) -> Optional[int]:
+        if not self._boundaries:
+            return None
+        return max(bisect_right(self._boundaries, post_id) - 1, 0)
+
+    def invalidate(self, post_id: str) -> None:
+        """
+        Drops the cached document of the shard containing ``post_id``.
+        :param post_id: The id of the changed post.
+        :type post_id: str
+        """
+        shard = self._shard_of(post_id)
+        if shard is not None:
+            self._documents.pop(shard, None)
+            self._generations[shard] = self._generations.get(shard, 0) + 1
+
+    def post_added(self, post_id: str) -> None:
+        """
+        Records a new post, re-planning the shards once its shard grows too large.
+        :param post_id: The id of the new post.
+        :type post_id: str
+        """
+        shard = self._shard_of(post_id)
+        if shard is None:
+            # Nothing planned yet, or the first post ever: start from a fresh plan
+            self.reset()
+            return
+        self.invalidate(post_id)
+        self._counts[shard] += 1
+        if self._counts[shard] > self.shard_size:
+            self.reset()
+
+    def post_removed(self, post_id: str) -> None:
+        """
+        Records a deleted post.
+        :param post_id: The id of the deleted post.
+        :type post_id: str
+        """
+        shard = self._shard_of(post_id)
+        if shard is not None:
+            self.invalidate(post_id)
+            self._counts[shard] = max(self._counts[shard] - 1, 0)
+
+    async def index(self, db: AsyncSession, base_url: str) -> bytes:
+        """
+        Renders the sitemap index listing every shard.
+        :param db: The database session used to plan the shards.
+        :type db: AsyncSession
+        :param base_url: The absolute URL the site is served from, without trailing slash.
+        :type base_url: str
+        :return: The sitemap index document.
+        :rtype: bytes
+        """
+        boundaries = await self.plan(db)
+        parts = [f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NS}">\n']
+        for shard in range(max(len(boundaries), 1)):
+            parts.append(f"<sitemap><loc>{escape(base_url)}/sitemaps/{shard}.xml</loc></sitemap>\n")
+        parts.append("</sitemapindex>\n")
+        return "".join(parts).encode("utf-8")
+
+    async def shard(self, db: AsyncSession, base_url: str, shard: int) -> Optional[bytes]:
+        """
+        Returns the document of one shard, rendering it if it is not cached.
+        :param db: The database session used to stream the posts of the shard.
+        :type db: AsyncSession
+        :param base_url: The absolute URL the site is served from, without trailing slash.
+        :type base_url: str
+        :param shard: The shard number.
+        :type shard: int
+        :return: The urlset document, or None if the shard does not exist.
+        :rtype: Optional[bytes]
+        """
+        boundaries = await self.plan(db)
+        if shard < 0 or shard >= max(len(boundaries), 1):
+            return None
+
+        cached = self._documents.get(shard)
+        if cached and cached[1] == base_url and not self._expired(cached[0]):
+            return cached[2]
+
+        generation = self._generations.get(shard, 0)
+        statement = select(Post.slug, Post.updated_at).order_by(Post.id)
+        if shard > 0:
+            statement = statement.where(Post.id >= boundaries[shard])
+        if shard + 1 < len(boundaries):
+            statement = statement.where(Post.id < boundaries[shard + 1])
+
+        parts = [f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">\n']
+        result = await db.stream(statement.execution_options(yield_per=config.SITEMAP_STREAM_BATCH))
+        async for slug, updated_at in result:
+            loc = escape(f"{base_url}/posts/{quote(slug)}")
+            parts.append(f"<url><loc>{loc}</loc>{_lastmod(updated_at)}</url>\n")
+        parts.append("</urlset>\n")
+        document = "".join(parts).encode("utf-8")
+
+        # Only cache the document if no write hit the shard while it was rendered
+        if self._generations.get(shard, 0) == generation and self._boundaries is boundaries:
+            self._documents[shard] = (time.monotonic(), base_url, document)
+        return document
+
+
+sitemap_shards = SitemapShards()
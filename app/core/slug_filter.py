@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import math
+import time
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.future import select
+
+import app.core.config as config
+from app.models.sql import Change, Post
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    A fixed size Bloom filter over strings. Membership tests may return false
+    positives at roughly ``fp_rate`` but never false negatives.
+    """
+
+    def __init__(self, capacity: int, fp_rate: float, max_bytes: int):
+        capacity = max(capacity, 1)
+        bits = math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))
+        self.size = max(min(bits, max_bytes * 8), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # Kirsch-Mitzenmacher double hashing over a single 128 bit digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class SlugFilter:
+    """
+    Answers "this slug definitely does not exist" without querying the database.
+
+    The filter is built from a streaming scan of all slugs and is kept current by
+    the post write endpoints of this worker, so misses are answered from memory.
+    Slugs written by other workers are picked up every ``SLUG_FILTER_REFRESH_SECONDS``
+    from the change log, whose ids follow commit order, past the last change id
+    seen: a post created by another worker may be reported missing for up to that
+    long, and never longer. The whole filter is rebuilt periodically to shed deleted
+    slugs, which a Bloom filter cannot remove. Until the first build completes every
+    slug is reported as possibly present.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Drops the filter, so every lookup falls through to the database again.
+        """
+        self._bloom: Optional[BloomFilter] = None
+        self._pending: Optional[set[str]] = None
+        self._cursor: Optional[int] = None
+        self._stale = 0
+        self._rebuilt_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._bloom is not None
+
+    def might_contain(self, slug: str) -> bool:
+        """
+        Checks whether a post with the given slug may exist.
+        :param slug: The slug to look up.
+        :type slug: str
+        :return: False if the slug is definitely absent, True otherwise.
+        :rtype: bool
+        """
+        return self._bloom is None or slug in self._bloom
+
+    def add(self, slug: str) -> None:
+        """
+        Records a slug that was just written.
+        :param slug: The slug of the created or renamed post.
+        :type slug: str
+        """
+        if self._bloom is not None:
+            self._bloom.add(slug)
+        if self._pending is not None:
+            # Make sure the filter being rebuilt does not miss it either
+            self._pending.add(slug)
+
+    def discard(self, slug: str) -> None:
+        """
+        Records a slug that no longer exists. Bloom filters cannot forget keys, so
+        this only counts stale entries and brings the next rebuild forward once
+        ``SLUG_FILTER_MAX_STALE`` of them have accumulated.
+        :param slug: The slug of the deleted or renamed post.
+        :type slug: str
+        """
+        if self._bloom is not None:
+            self._stale += 1
+
+    @property
+    def needs_rebuild(self) -> bool:
+        return self._stale >= config.SLUG_FILTER_MAX_STALE
+
+    async def rebuild(self, db: AsyncSession) -> None:
+        """
+        Builds a fresh filter from a streaming scan of all slugs and swaps it in.
+        :param db: The database session used to scan the posts.
+        :type db: AsyncSession
+        """
+        self._pending = set()
+        try:
+            # Read the cursor before scanning, so posts committed during the scan are
+            # caught up with afterwards rather than missed
+            cursor = (await db.execute(select(func.coalesce(func.max(Change.id), 0)))).scalar_one()
+            count = (await db.execute(select(func.count()).select_from(Post))).scalar_one()
+            bloom = BloomFilter(
+                capacity=max(int(count * config.SLUG_FILTER_HEADROOM), config.SLUG_FILTER_MIN_CAPACITY),
+                fp_rate=config.SLUG_FILTER_FP_RATE,
+                max_bytes=config.SLUG_FILTER_MAX_BYTES,
+            )
+            result = await db.stream(select(Post.slug).execution_options(yield_per=config.SLUG_FILTER_SCAN_BATCH))
+            async for slug in result.scalars():
+                bloom.add(slug)
+            for slug in self._pending:
+                bloom.add(slug)
+            self._bloom = bloom
+            self._cursor = cursor
+            self._stale = 0
+        finally:
+            self._pending = None
+
+    async def catch_up(self, db: AsyncSession) -> None:
+        """
+        Adds slugs written since the last change seen, including those written by other workers.
+        :param db: The database session used to read the change log.
+        :type db: AsyncSession
+        """
+        if self._bloom is None or self._cursor is None:
+            return
+        result = await db.stream(
+            select(Change.id, Change.action, Change.data)
+            .where(Change.id > self._cursor, Change.entity == "post")
+            .order_by(Change.id)
+        )
+        cursor = self._cursor
+        async for change_id, action, data in result:
+            if action != "deleted" and data and data.get("slug"):
+                self.add(data["slug"])
+            cursor = change_id
+        self._cursor = cursor
+
+    async def refresh(self, session_factory: async_sessionmaker) -> None:
+        """
+        Builds the filter, or catches up with recent writes if it was rebuilt less than
+        ``SLUG_FILTER_REBUILD_SECONDS`` ago. Run every ``SLUG_FILTER_REFRESH_SECONDS``.
+        :param session_factory: The factory used to open database sessions.
+        :type session_factory: async_sessionmaker
+        """
+        async with session_factory() as db:
+            if (
+                self._rebuilt_at is None
+                or self.needs_rebuild
+                or time.monotonic() - self._rebuilt_at >= config.SLUG_FILTER_REBUILD_SECONDS
+            ):
+                await self.rebuild(db)
+                self._rebuilt_at = time.monotonic()
+            else:
+                await self.catch_up(db)
+
+
+slug_filter = SlugFilter()
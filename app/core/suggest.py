@@ -0,0 +1,317 @@
+import logging
+from bisect import bisect_left, insort
+from typing import Any, Callable, Optional
+
+from sqlalchemy import func, literal, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.future import select
+
+import app.core.config as config
+from app.db.postgres import dialect_name
+from app.models.sql import Post, Tag
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(value: str) -> str:
+    """
+    Normalizes text for prefix matching: case folded, with whitespace collapsed.
+    :param value: The text to normalize.
+    :type value: str
+    :return: The normalized text.
+    :rtype: str
+    """
+    return " ".join(value.casefold().split())
+
+
+class PrefixIndex:
+    """
+    Sorted array of ``(key, id)`` pairs searched with binary search.
+
+    Every entry is indexed from the start of each of its words, so "asyncio" finds
+    "Intro to asyncio" as well as "asyncio in practice". Keys are cut after
+    ``key_length`` characters to bound the memory used by long texts.
+    """
+
+    def __init__(self, key_length: int = None):
+        self.key_length = key_length or config.SUGGEST_KEY_LENGTH
+        self._keys: list[tuple[str, str]] = []
+        self._texts: dict[str, str] = {}
+        self._values: dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def _word_keys(self, text: str) -> set[str]:
+        keys = set()
+        start = 0
+        while start < len(text):
+            keys.add(text[start:start + self.key_length])
+            space = text.find(" ", start)
+            if space == -1:
+                break
+            start = space + 1
+        return keys
+
+    def add(self, id: str, text: str, value: Any) -> None:
+        """
+        Adds an entry, replacing any previous entry with the same id.
+        :param id: The id of the entry.
+        :type id: str
+        :param text: The text the entry is found by.
+        :type text: str
+        :param value: The value returned for the entry.
+        :type value: Any
+        """
+        self.remove(id)
+        text = normalize(text)
+        for key in self._word_keys(text):
+            insort(self._keys, (key, id))
+        self._texts[id] = text
+        self._values[id] = value
+
+    def remove(self, id: str) -> None:
+        """
+        Removes an entry, if present.
+        :param id: The id of the entry.
+        :type id: str
+        """
+        text = self._texts.pop(id, None)
+        if text is None:
+            return
+        del self._values[id]
+        for key in self._word_keys(text):
+            position = bisect_left(self._keys, (key, id))
+            if position < len(self._keys) and self._keys[position] == (key, id):
+                del self._keys[position]
+
+    def extend(self, entries: list[tuple[str, str, Any]]) -> None:
+        """
+        Bulk loads ``(id, text, value)`` entries into an empty index with a single sort.
+        :param entries: The entries to load.
+        :type entries: list[tuple[str, str, Any]]
+        """
+        for id, text, value in entries:
+            text = normalize(text)
+            self._keys.extend((key, id) for key in self._word_keys(text))
+            self._texts[id] = text
+            self._values[id] = value
+        self._keys.sort()
+
+    def search(self, prefix: str, limit: int) -> list[tuple[str, Any]]:
+        """
+        Returns the entries with a word starting with ``prefix``.
+        :param prefix: The prefix to look up.
+        :type prefix: str
+        :param limit: The maximum number of entries to return.
+        :type limit: int
+        :return: The ``(id, value)`` pairs of the matching entries, ordered by matched key.
+        :rtype: list[tuple[str, Any]]
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        key_prefix = prefix[:self.key_length]
+        matches = {}
+        position = bisect_left(self._keys, (key_prefix,))
+        while position < len(self._keys) and len(matches) < limit:
+            key, id = self._keys[position]
+            if not key.startswith(key_prefix):
+                break
+            # Keys are truncated, so longer prefixes have to be checked against the full text
+            if id not in matches and (
+                len(prefix) <= self.key_length or (" " + self._texts[id]).find(" " + prefix) != -1
+            ):
+                matches[id] = self._values[id]
+            position += 1
+        return list(matches.items())
+
+
+class Suggester:
+    """
+    In-memory prefix indexes of post titles and tag names for as-you-type suggestions.
+
+    The indexes are built from a streaming scan and kept current by the write
+    endpoints of this worker. They are rebuilt every ``SUGGEST_REBUILD_SECONDS`` to
+    pick up writes made by other workers. Until the first build completes lookups
+    go to the database instead. Queries without any prefix match fall back to
+    fuzzy matching with ``pg_trgm``, when the extension is installed.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Drops the indexes, so lookups go to the database until the next build.
+        """
+        self.titles: Optional[PrefixIndex] = None
+        self.tags: Optional[PrefixIndex] = None
+        self._pending: Optional[list[Callable[[], None]]] = None
+        self._trgm: Optional[bool] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.titles is not None
+
+    def _apply(self, change: Callable[[], None]) -> None:
+        if self.titles is not None:
+            change()
+        if self._pending is not None:
+            # Replayed on the indexes being rebuilt, which may have missed it
+            self._pending.append(change)
+
+    def post_saved(self, post: Post) -> None:
+        """
+        Records a created or updated post.
+        :param post: The post as stored in the database.
+        :type post: Post
+        """
+        id, slug, title = post.id, post.slug, post.title
+        self._apply(lambda: self.titles.add(id, title, (slug, title)))
+
+    def post_removed(self, post_id: str) -> None:
+        """
+        Records a deleted post.
+        :param post_id: The id of the deleted post.
+        :type post_id: str
+        """
+        self._apply(lambda: self.titles.remove(post_id))
+
+    def tag_saved(self, tag: Tag) -> None:
+        """
+        Records a created tag.
+        :param tag: The tag as stored in the database.
+        :type tag: Tag
+        """
+        id, name = tag.id, tag.name
+        self._apply(lambda: self.tags.add(id, name, name))
+
+    async def rebuild(self, db: AsyncSession) -> None:
+        """
+        Builds fresh indexes from a streaming scan of all titles and tag names and swaps them in.
+        :param db: The database session used to scan posts and tags.
+        :type db: AsyncSession
+        """
+        self._pending = []
+        try:
+            titles, tags = PrefixIndex(), PrefixIndex()
+            entries = []
+            result = await db.stream(
+                select(Post.id, Post.slug, Post.title).execution_options(yield_per=config.SUGGEST_SCAN_BATCH)
+            )
+            async for id, slug, title in result:
+                entries.append((id, title, (slug, title)))
+            titles.extend(entries)
+
+            result = await db.stream(
+                select(Tag.id, Tag.name).execution_options(yield_per=config.SUGGEST_SCAN_BATCH)
+            )
+            tags.extend([(id, name, name) async for id, name in result])
+
+            pending, self._pending = self._pending, None
+            self.titles, self.tags = titles, tags
+            for change in pending:
+                change()
+        finally:
+            self._pending = None
+
+    async def trgm_available(self, db: AsyncSession) -> bool:
+        """
+        Checks once whether the ``pg_trgm`` extension is installed, which it never is on SQLite.
+        :param db: The database session used for the check.
+        :type db: AsyncSession
+        :return: True if fuzzy matching is available.
+        :rtype: bool
+        """
+        if self._trgm is None and dialect_name(db) != "postgresql":
+            self._trgm = False
+        if self._trgm is None:
+            result = await db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"))
+            self._trgm = result.scalar_one_or_none() is not None
+        return self._trgm
+
+    async def posts(self, db: AsyncSession, query: str, limit: int) -> list[dict]:
+        """
+        Suggests posts whose title has a word starting with ``query``.
+        :param db: The database session used when the index cannot answer.
+        :type db: AsyncSession
+        :param query: The text typed so far.
+        :type query: str
+        :param limit: The maximum number of suggestions.
+        :type limit: int
+        :return: The suggested posts, with their slug and title.
+        :rtype: list[dict]
+        """
+        if self.titles is not None:
+            rows = [value for _, value in self.titles.search(query, limit)]
+        else:
+            result = await db.execute(
+                select(Post.slug, Post.title)
+                .where(Post.title.ilike(_like_prefix(query), escape="\\"))
+                .order_by(Post.title)
+                .limit(limit)
+            )
+            rows = result.all()
+
+        if not rows and await self.trgm_available(db):
+            similarity = func.word_similarity(query, Post.title)
+            result = await db.execute(
+                select(Post.slug, Post.title)
+                .where(literal(query).op("<%")(Post.title))
+                .order_by(similarity.desc(), Post.title)
+                .limit(limit)
+            )
+            rows = result.all()
+        return [{"slug": slug, "title": title} for slug, title in rows]
+
+    async def tag_names(self, db: AsyncSession, query: str, limit: int) -> list[dict]:
+        """
+        Suggests tags whose name has a word starting with ``query``.
+        :param db: The database session used when the index cannot answer.
+        :type db: AsyncSession
+        :param query: The text typed so far.
+        :type query: str
+        :param limit: The maximum number of suggestions.
+        :type limit: int
+        :return: The suggested tags, with their id and name.
+        :rtype: list[dict]
+        """
+        if self.tags is not None:
+            rows = self.tags.search(query, limit)
+        else:
+            result = await db.execute(
+                select(Tag.id, Tag.name)
+                .where(Tag.name.ilike(_like_prefix(query), escape="\\"))
+                .order_by(Tag.name)
+                .limit(limit)
+            )
+            rows = result.all()
+
+        if not rows and await self.trgm_available(db):
+            similarity = func.word_similarity(query, Tag.name)
+            result = await db.execute(
+                select(Tag.id, Tag.name)
+                .where(literal(query).op("<%")(Tag.name))
+                .order_by(similarity.desc(), Tag.name)
+                .limit(limit)
+            )
+            rows = result.all()
+        return [{"id": id, "name": name} for id, name in rows]
+
+    async def refresh(self, session_factory: async_sessionmaker) -> None:
+        """
+        Rebuilds the indexes in a session of their own. Run every ``SUGGEST_REBUILD_SECONDS``.
+        :param session_factory: The factory used to open database sessions.
+        :type session_factory: async_sessionmaker
+        """
+        async with session_factory() as db:
+            await self.rebuild(db)
+
+
+def _like_prefix(query: str) -> str:
+    escaped = query.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%"
+
+
+suggester = Suggester()
@@ -0,0 +1,369 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import app.core.config as config
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+# The route handling the current request, set by TracedRoute
+_current_route: ContextVar[Optional["_RouteScope"]] = ContextVar("current_route", default=None)
+
+
+class Span:
+    """
+    A timed operation within a trace. Times are taken from ``time.perf_counter``
+    and reported relative to the start of the trace.
+    """
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "end", "attributes")
+
+    def __init__(self, trace: "Trace", name: str, parent: Optional["Span"], attributes: dict):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        trace.spans.append(self)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def finish(self) -> None:
+        if self.end is None:
+            self.end = time.perf_counter()
+
+    def to_dict(self) -> dict:
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ms": round((self.start - self.trace.start) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """
+    The spans recorded while serving one sampled request.
+    """
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.timestamp = time.time()
+        self.start = time.perf_counter()
+        self.spans: list[Span] = []
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "timestamp": self.timestamp,
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+class _NullSpan:
+    """
+    Stand-in returned when the current request is not sampled, so instrumented
+    code costs one context variable lookup.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _SpanScope:
+    __slots__ = ("span", "token")
+
+    def __init__(self, span: Span):
+        self.span = span
+        self.token = None
+
+    def __enter__(self) -> Span:
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.span.set_attribute("error", exc_type.__name__)
+        self.span.finish()
+        _current_span.reset(self.token)
+        return False
+
+
+def span(name: str, **attributes):
+    """
+    Opens a child span of the current span, to be used as a context manager.
+    :param name: The name of the span.
+    :type name: str
+    :param attributes: Attributes recorded on the span.
+    :return: The span scope, or a no-op stand-in if the request is not traced.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return NULL_SPAN
+    return _SpanScope(Span(parent.trace, name, parent, attributes))
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+class MemoryExporter:
+    """
+    Keeps the most recent traces in memory, mainly for tests and debugging.
+    """
+
+    def __init__(self, max_traces: int = 1000):
+        self.traces: deque = deque(maxlen=max_traces)
+
+    def export(self, trace: Trace) -> None:
+        self.traces.append(trace.to_dict())
+
+    def close(self) -> None:
+        pass
+
+
+class JsonlExporter:
+    """
+    Appends traces to a JSON lines file from a background thread, so exporting
+    never blocks the event loop. Traces are dropped, and counted, when the queue
+    is full.
+    """
+
+    def __init__(self, path: str, max_queue: int = 10_000):
+        self.path = path
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+
+    def export(self, trace: Trace) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._drain, name="trace-exporter", daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(trace.to_dict())
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as file:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                file.write(json.dumps(item) + "\n")
+                if self._queue.empty():
+                    file.flush()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+def _create_exporter():
+    if config.TRACE_EXPORTER == "memory":
+        return MemoryExporter()
+    return JsonlExporter(config.TRACE_FILE, config.TRACE_QUEUE_SIZE)
+
+
+exporter = _create_exporter()
+metrics.collector("traces_dropped_total", lambda: getattr(exporter, "dropped", 0))
+
+
+class TracingMiddleware:
+    """
+    Starts a trace for a sampled fraction of HTTP requests and exports it once the
+    response has been sent. Unsampled requests pass straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        rate = config.TRACE_SAMPLE_RATE
+        if scope["type"] != "http" or rate <= 0 or (rate < 1 and random.random() >= rate):
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        root = Span(trace, "request", None, {"method": scope["method"], "path": scope["path"]})
+        token = _current_span.set(root)
+
+        async def traced_send(message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("status", message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, traced_send)
+        except Exception as exc:
+            root.set_attribute("error", type(exc).__name__)
+            raise
+        finally:
+            root.finish()
+            _current_span.reset(token)
+            exporter.export(trace)
+
+
+class _RouteScope:
+    __slots__ = ("name", "on_return")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.on_return: list[Callable[[], Awaitable[Any]]] = []
+
+
+def current_route() -> Optional[str]:
+    """
+    Returns the route handling the current request, as its method and path template.
+    :return: The route, e.g. "GET /posts/{slug}", or None outside of a request.
+    :rtype: Optional[str]
+    """
+    scope = _current_route.get()
+    return scope.name if scope is not None else None
+
+
+def on_endpoint_return(callback: Callable[[], Awaitable[Any]]) -> bool:
+    """
+    Runs a callback as soon as the endpoint of the current request returns or
+    raises, before its response is serialized and its dependencies torn down.
+    :param callback: The coroutine function to run.
+    :type callback: Callable[[], Awaitable[Any]]
+    :return: Whether the callback was registered, False outside of a request.
+    :rtype: bool
+    """
+    scope = _current_route.get()
+    if scope is None:
+        return False
+    scope.on_return.append(callback)
+    return True
+
+
+async def _endpoint_returned() -> None:
+    scope = _current_route.get()
+    if scope is None:
+        return
+    callbacks, scope.on_return = scope.on_return, []
+    for callback in callbacks:
+        try:
+            await callback()
+        except Exception:
+            logger.exception("Endpoint return callback failed")
+
+
+class TracedRoute(APIRoute):
+    """
+    Route class that splits the time spent in a traced request into dependency
+    resolution, the endpoint itself, and serialization. The serialization span
+    also covers the teardown of dependencies with ``yield``.
+
+    Callbacks registered with ``on_endpoint_return`` run when the endpoint returns.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        self.dependant.call = self._traced_endpoint(self.dependant.call)
+
+    @staticmethod
+    def _traced_endpoint(call):
+        if asyncio.iscoroutinefunction(call):
+            @wraps(call)
+            async def traced(*args, **kwargs):
+                try:
+                    with span("endpoint"):
+                        return await call(*args, **kwargs)
+                finally:
+                    await _endpoint_returned()
+        else:
+            @wraps(call)
+            def traced(*args, **kwargs):
+                with span("endpoint"):
+                    return call(*args, **kwargs)
+        return traced
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def traced_handler(request):
+            token = _current_route.set(_RouteScope(f"{request.method} {self.path}"))
+            try:
+                if _current_span.get() is None:
+                    return await handler(request)
+
+                with span("route", route=self.path) as route_span:
+                    first_span = len(route_span.trace.spans)
+                    try:
+                        return await handler(request)
+                    finally:
+                        endpoint = next(
+                            (s for s in route_span.trace.spans[first_span:] if s.name == "endpoint"), None
+                        )
+                        if endpoint is not None:
+                            _add_span(route_span, "dependencies", route_span.start, endpoint.start)
+                            _add_span(route_span, "serialize", endpoint.end, time.perf_counter())
+            finally:
+                _current_route.reset(token)
+
+        return traced_handler
+
+
+def _add_span(parent: Span, name: str, start: float, end: float) -> None:
+    child = Span(parent.trace, name, parent, {})
+    child.start, child.end = start, end
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current_span.get()
+    if parent is not None and context is not None:
+        context._trace_span = Span(parent.trace, "sql", parent, {"statement": statement[:200]})
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    sql_span = getattr(context, "_trace_span", None)
+    if sql_span is not None:
+        sql_span.finish()
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    sql_span = getattr(exception_context.execution_context, "_trace_span", None)
+    if sql_span is not None:
+        sql_span.set_attribute("error", type(exception_context.original_exception).__name__)
+        sql_span.finish()
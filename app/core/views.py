@@ -0,0 +1,138 @@
+import logging
+from collections import Counter
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.future import select
+
+import app.core.config as config
+from app.core.singleflight import SingleFlight
+from app.db.postgres import insert
+from app.models.sql import Post, PostView
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """
+    Counts post views in memory and periodically adds them to the ``post_views``
+    table with one batched upsert, so reading a post never writes to the database.
+
+    Each worker keeps its own pending increments. Reads go through a short lived
+    cache of the stored totals, to which this worker's pending increments are added.
+    """
+
+    def __init__(self):
+        self._pending: Counter = Counter()
+        self._reads = SingleFlight(ttl=config.VIEWS_CACHE_TTL, max_entries=4096)
+
+    def reset(self) -> None:
+        """
+        Drops pending increments and cached totals.
+        """
+        self._pending.clear()
+        self._reads.clear()
+
+    def incr(self, post_id: str, views: int = 1) -> None:
+        """
+        Records views of a post.
+        :param post_id: The id of the viewed post.
+        :type post_id: str
+        :param views: The number of views to add.
+        :type views: int
+        """
+        self._pending[post_id] += views
+
+    async def flush(self, db: AsyncSession) -> int:
+        """
+        Writes the pending increments to the database and clears them.
+        :param db: The database session used for the upsert.
+        :type db: AsyncSession
+        Posts are written in id order, so concurrent flushes of other workers lock
+        their counters in the same order rather than deadlocking. Increments of posts
+        deleted meanwhile are dropped, the posts left are locked against deletion
+        until the counters commit, so no counter outlives its post.
+        :return: The number of posts whose counters were updated.
+        :rtype: int
+        """
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, Counter()
+
+        post_ids = sorted(pending)
+        updated = 0
+        try:
+            for start in range(0, len(post_ids), config.VIEWS_FLUSH_BATCH):
+                result = await db.execute(
+                    select(Post.id)
+                    .where(Post.id.in_(post_ids[start:start + config.VIEWS_FLUSH_BATCH]))
+                    .order_by(Post.id)
+                    .with_for_update(key_share=True)
+                )
+                rows = [{"post_id": post_id, "views": pending[post_id]} for post_id in result.scalars().all()]
+                if not rows:
+                    continue
+                statement = insert(db, PostView).values(rows)
+                statement = statement.on_conflict_do_update(
+                    index_elements=[PostView.post_id],
+                    set_={"views": PostView.views + statement.excluded.views},
+                )
+                await db.execute(statement)
+                updated += len(rows)
+            await db.commit()
+        except Exception:
+            # Keep the increments for the next flush rather than losing them
+            self._pending.update(pending)
+            raise
+        return updated
+
+    async def count(self, session_factory: async_sessionmaker, post_id: str) -> int:
+        """
+        Returns the number of views of a post.
+        :param session_factory: The factory used to open a session when the total is not cached.
+        :type session_factory: async_sessionmaker
+        :param post_id: The id of the post.
+        :type post_id: str
+        :return: The stored total plus this worker's pending views.
+        :rtype: int
+        """
+        # Concurrent callers share the read, so it runs in a session of its own
+        async def fetch():
+            async with session_factory() as db:
+                result = await db.execute(select(PostView.views).where(PostView.post_id == post_id))
+                return result.scalar_one_or_none() or 0
+
+        return await self._reads.do(("count", post_id), fetch) + self._pending[post_id]
+
+    async def top(self, session_factory: async_sessionmaker, limit: int) -> list[dict]:
+        """
+        Returns the most viewed posts according to the stored totals.
+        :param session_factory: The factory used to open a session when the ranking is not cached.
+        :type session_factory: async_sessionmaker
+        :param limit: The number of posts to return.
+        :type limit: int
+        :return: The posts with their slug, title and number of views, most viewed first.
+        :rtype: list[dict]
+        """
+        async def fetch():
+            async with session_factory() as db:
+                result = await db.execute(
+                    select(Post.id, Post.slug, Post.title, PostView.views)
+                    .join(PostView, PostView.post_id == Post.id)
+                    .order_by(PostView.views.desc())
+                    .limit(limit)
+                )
+                return [row._asdict() for row in result.all()]
+
+        return await self._reads.do(("top", limit), fetch)
+
+    async def flush_pending(self, session_factory: async_sessionmaker) -> None:
+        """
+        Flushes the pending increments in a session of their own. Run every ``VIEWS_FLUSH_SECONDS``.
+        :param session_factory: The factory used to open database sessions.
+        :type session_factory: async_sessionmaker
+        """
+        async with session_factory() as db:
+            await self.flush(db)
+
+
+view_counter = ViewCounter()
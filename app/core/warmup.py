@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.future import select
+from starlette.concurrency import run_in_threadpool
+
+import app.core.config as config
+from app.core.feed import build_feed
+from app.core.security import pwd_context
+from app.core.singleflight import feed_flights, post_flights
+from app.models.sql import Post, PostView, User
+
+logger = logging.getLogger(__name__)
+
+# Statements run on every request path that matters, in the exact shape the
+# endpoints build them, so their SQL hits the driver's prepared statement cache
+HOT_QUERIES = (
+    select(Post).where(Post.slug == ""),  # get, create, update and delete a post
+    select(Post.id).where(Post.slug == ""),  # post existence checks, views
+    select(User).where(User.email == ""),  # register, login, current user
+)
+
+
+async def _loaded(value):
+    return value
+
+
+class Warmup:
+    """
+    Warms a freshly started worker up before it reports ready: loads the password
+    hashing backend and starts the thread pool, opens ``WARMUP_CONNECTIONS`` pool
+    connections and prepares the hot queries on each of them, and preloads the
+    most viewed posts and the feed into their caches.
+
+    Every step is best effort: a failing step is logged and recorded, and the
+    worker still becomes ready once all steps have run or ``WARMUP_TIMEOUT`` expired.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Marks the worker as not ready and forgets the results of the last warm-up.
+        """
+        self.ready = False
+        self.steps: dict[str, dict] = {}
+
+    async def run(self, engine: AsyncEngine, session_factory: async_sessionmaker) -> None:
+        """
+        Runs every warm-up step, then marks the worker as ready.
+        :param engine: The engine whose connection pool is filled.
+        :type engine: AsyncEngine
+        :param session_factory: The factory used to open database sessions.
+        :type session_factory: async_sessionmaker
+        """
+        steps = [
+            ("libraries", self._libraries),
+            ("connections", lambda: self._connections(engine)),
+            ("hot_posts", lambda: self._hot_posts(session_factory)),
+            ("feed", lambda: self._feed(session_factory)),
+        ]
+        try:
+            await asyncio.wait_for(self._run_steps(steps), config.WARMUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Warm-up did not finish within %ss", config.WARMUP_TIMEOUT)
+        self.ready = True
+
+    async def _run_steps(self, steps) -> None:
+        for name, step in steps:
+            start = time.perf_counter()
+            try:
+                self.steps[name] = {"result": await step()}
+            except Exception as exc:
+                logger.exception("Warm-up step %s failed", name)
+                self.steps[name] = {"error": type(exc).__name__}
+            self.steps[name]["seconds"] = round(time.perf_counter() - start, 3)
+
+    async def _libraries(self) -> str:
+        # passlib picks its bcrypt backend on first use, and the thread pool starts lazily
+        await run_in_threadpool(pwd_context.handler("bcrypt").get_backend)
+        return "loaded"
+
+    async def _connections(self, engine: AsyncEngine) -> int:
+        # Connections beyond the pool size would be closed again on release
+        count = min(config.WARMUP_CONNECTIONS, engine.pool.size())
+        connections = await asyncio.gather(*(engine.connect() for _ in range(count)))
+        try:
+            for connection in connections:
+                await connection.execute(text("SELECT 1"))
+                for query in HOT_QUERIES:
+                    await connection.execute(query)
+        finally:
+            for connection in connections:
+                await connection.close()
+        return count
+
+    async def _hot_posts(self, session_factory: async_sessionmaker) -> int:
+        if post_flights.ttl <= 0:
+            # Posts are not cached, so there is nothing to preload
+            return 0
+        async with session_factory() as db:
+            result = await db.execute(
+                select(Post)
+                .join(PostView, PostView.post_id == Post.id)
+                .order_by(PostView.views.desc())
+                .limit(config.WARMUP_HOT_POSTS)
+            )
+            posts = result.scalars().all()
+        for post in posts:
+            await post_flights.do(post.slug, lambda post=post: _loaded(post))
+        return len(posts)
+
+    async def _feed(self, session_factory: async_sessionmaker) -> int:
+        if not config.SITE_URL:
+            # The feed is not served without a configured URL
+            return 0
+        base_url = config.SITE_URL.rstrip("/")
+        feed = await feed_flights.do(base_url, lambda: build_feed(base_url, session_factory))
+        return len(feed)
+
+
+warmup = Warmup()
@@ -0,0 +1,272 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from typing import Optional
+
+import httpx
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.future import select
+
+import app.core.config as config
+from app.core.metrics import metrics
+from app.core.scheduler import scheduler
+from app.models.sql import WebhookDelivery, WebhookEndpoint
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = "X-Webhook-Signature"
+LAG_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+async def enqueue_webhooks(db: AsyncSession, event: str, data: dict) -> None:
+    """
+    Adds a delivery of an event to the outbox for every active endpoint subscribed
+    to it, in the caller's transaction, so an event is delivered if and only if the
+    change it describes is committed.
+    :param db: The database session of the write the event describes.
+    :type db: AsyncSession
+    :param event: The event name, such as "post.created".
+    :type event: str
+    :param data: The payload of the event.
+    :type data: dict
+    """
+    result = await db.execute(
+        select(WebhookEndpoint.id, WebhookEndpoint.events).where(WebhookEndpoint.is_active.is_(True))
+    )
+    now = time.time()
+    rows = [
+        {"endpoint_id": endpoint_id, "event": event, "data": data, "status": "pending",
+         "attempts": 0, "enqueued_at": now, "next_attempt_at": now}
+        for endpoint_id, events in result.all()
+        if events is None or event in events
+    ]
+    if rows:
+        await db.execute(insert(WebhookDelivery), rows)
+
+
+def post_event_data(post) -> dict:
+    """
+    Returns the payload of the events of a post. Receivers fetch the content if
+    they need it, so events stay small.
+    :param post: The post the event is about.
+    :type post: Post
+    :return: The id, slug, title, revision and update time of the post.
+    :rtype: dict
+    """
+    return {"id": post.id, "slug": post.slug, "title": post.title, "revision": post.revision, "updated_at": post.updated_at}
+
+
+def sign(secret: str, body: bytes) -> str:
+    """
+    Computes the signature sent along with a delivery to an endpoint with a secret.
+    :param secret: The secret of the endpoint.
+    :type secret: str
+    :param body: The request body.
+    :type body: bytes
+    :return: The value of the ``X-Webhook-Signature`` header.
+    :rtype: str
+    """
+    return "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+def backoff(attempts: int) -> float:
+    """
+    Returns the delay before retrying a delivery, doubling with every failed
+    attempt up to ``WEBHOOK_BACKOFF_MAX`` seconds, with full jitter.
+    :param attempts: The number of failed attempts so far.
+    :type attempts: int
+    :return: The delay in seconds.
+    :rtype: float
+    """
+    return random.uniform(0, min(config.WEBHOOK_BACKOFF_MAX, config.WEBHOOK_BACKOFF_BASE * 2 ** (attempts - 1)))
+
+
+class WebhookDispatcher:
+    """
+    Delivers the outbox to the webhook endpoints in the background.
+
+    Every round claims up to ``WEBHOOK_BATCH_SIZE`` due deliveries, by pushing
+    their next attempt past the request timeout, so other workers skip them and
+    they come due again if this worker dies while sending. The events of one
+    endpoint are sent together, ``WEBHOOK_MAX_EVENTS`` per request, over a shared
+    connection pool, with at most ``WEBHOOK_ENDPOINT_CONCURRENCY`` requests in
+    flight per endpoint, so one slow endpoint never holds up the others.
+
+    Failed requests are retried with exponential backoff, up to
+    ``WEBHOOK_MAX_ATTEMPTS`` attempts, after which the deliveries are marked as
+    failed. Receivers may see an event more than once and can use its id to tell.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.reset()
+        self.lag = metrics.histogram("webhook_delivery_lag_seconds", LAG_BUCKETS)
+        self.delivered = metrics.counter("webhook_deliveries_total")
+        self.retried = metrics.counter("webhook_retries_total")
+        self.failed = metrics.counter("webhook_failures_total")
+
+    def reset(self) -> None:
+        """
+        Forgets the per-endpoint concurrency limits.
+        """
+        self._limits: dict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(config.WEBHOOK_ENDPOINT_CONCURRENCY)
+        )
+
+    def notify(self) -> None:
+        """
+        Starts the next round right away. Called after committing new deliveries.
+        """
+        scheduler.trigger("webhooks")
+
+    async def _claim(self, session_factory: async_sessionmaker) -> tuple[list, dict]:
+        now = time.time()
+        async with session_factory() as db:
+            result = await db.execute(
+                select(WebhookDelivery.id)
+                .where(WebhookDelivery.status == "pending", WebhookDelivery.next_attempt_at <= now)
+                .order_by(WebhookDelivery.id)
+                .limit(config.WEBHOOK_BATCH_SIZE)
+            )
+            ids = result.scalars().all()
+            if not ids:
+                return [], {}
+            # The conditions are checked again, so deliveries claimed meanwhile by another worker are skipped
+            result = await db.execute(
+                update(WebhookDelivery)
+                .where(
+                    WebhookDelivery.id.in_(ids),
+                    WebhookDelivery.status == "pending",
+                    WebhookDelivery.next_attempt_at <= now,
+                )
+                .values(next_attempt_at=now + 2 * config.WEBHOOK_TIMEOUT)
+                .returning(
+                    WebhookDelivery.id, WebhookDelivery.endpoint_id, WebhookDelivery.event,
+                    WebhookDelivery.data, WebhookDelivery.attempts, WebhookDelivery.enqueued_at,
+                )
+            )
+            deliveries = sorted(result.all(), key=lambda delivery: delivery.id)
+            result = await db.execute(
+                select(WebhookEndpoint).where(
+                    WebhookEndpoint.id.in_({delivery.endpoint_id for delivery in deliveries})
+                )
+            )
+            endpoints = {endpoint.id: endpoint for endpoint in result.scalars().all()}
+            await db.commit()
+        return deliveries, endpoints
+
+    async def _send(self, client: httpx.AsyncClient, endpoint: WebhookEndpoint, deliveries: list) -> Optional[str]:
+        body = json.dumps({
+            "events": [
+                {"id": delivery.id, "event": delivery.event, "data": delivery.data}
+                for delivery in deliveries
+            ]
+        }).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if endpoint.secret:
+            headers[SIGNATURE_HEADER] = sign(endpoint.secret, body)
+        async with self._limits[endpoint.id]:
+            try:
+                response = await client.post(endpoint.url, content=body, headers=headers)
+            except httpx.HTTPError as exc:
+                return f"{type(exc).__name__}: {exc}"[:500]
+        if not response.is_success:
+            return f"HTTP {response.status_code}"
+        return None
+
+    async def dispatch(self, session_factory: async_sessionmaker, client: httpx.AsyncClient) -> int:
+        """
+        Runs one round: claims the due deliveries, sends them and records the outcome.
+        :param session_factory: The factory used to open database sessions.
+        :type session_factory: async_sessionmaker
+        :param client: The HTTP client the deliveries are sent with.
+        :type client: httpx.AsyncClient
+        :return: The number of deliveries claimed.
+        :rtype: int
+        """
+        deliveries, endpoints = await self._claim(session_factory)
+        if not deliveries:
+            return 0
+
+        requests, orphans = [], []
+        by_endpoint = defaultdict(list)
+        for delivery in deliveries:
+            endpoint = endpoints.get(delivery.endpoint_id)
+            if endpoint is None or not endpoint.is_active:
+                orphans.append(delivery.id)
+            else:
+                by_endpoint[endpoint.id].append(delivery)
+        for endpoint_id, endpoint_deliveries in by_endpoint.items():
+            for start in range(0, len(endpoint_deliveries), config.WEBHOOK_MAX_EVENTS):
+                requests.append((endpoints[endpoint_id], endpoint_deliveries[start:start + config.WEBHOOK_MAX_EVENTS]))
+
+        errors = await asyncio.gather(*(self._send(client, endpoint, chunk) for endpoint, chunk in requests))
+
+        now = time.time()
+        async with session_factory() as db:
+            if orphans:
+                await db.execute(
+                    update(WebhookDelivery).where(WebhookDelivery.id.in_(orphans))
+                    .values(status="failed", last_error="Endpoint removed")
+                )
+            for (endpoint, chunk), error in zip(requests, errors):
+                ids = [delivery.id for delivery in chunk]
+                attempts = max(delivery.attempts for delivery in chunk) + 1
+                if error is None:
+                    await db.execute(
+                        update(WebhookDelivery).where(WebhookDelivery.id.in_(ids))
+                        .values(status="delivered", attempts=WebhookDelivery.attempts + 1, last_error=None)
+                    )
+                    self.delivered.incr(len(chunk))
+                    for delivery in chunk:
+                        self.lag.observe(now - delivery.enqueued_at)
+                elif attempts >= config.WEBHOOK_MAX_ATTEMPTS:
+                    await db.execute(
+                        update(WebhookDelivery).where(WebhookDelivery.id.in_(ids))
+                        .values(status="failed", attempts=WebhookDelivery.attempts + 1, last_error=error)
+                    )
+                    self.failed.incr(len(chunk))
+                    logger.warning("Giving up on %d deliveries to %s: %s", len(chunk), endpoint.url, error)
+                else:
+                    await db.execute(
+                        update(WebhookDelivery).where(WebhookDelivery.id.in_(ids))
+                        .values(
+                            attempts=WebhookDelivery.attempts + 1,
+                            next_attempt_at=now + backoff(attempts),
+                            last_error=error,
+                        )
+                    )
+                    self.retried.incr(len(chunk))
+            await db.commit()
+        return len(deliveries)
+
+    async def drain(self, session_factory: async_sessionmaker) -> None:
+        """
+        Dispatches rounds until the due deliveries are exhausted, over a connection pool
+        kept between runs. Run every ``WEBHOOK_POLL_SECONDS`` for retries and the
+        deliveries of other workers, and right away when this worker enqueues some.
+        :param session_factory: The factory used to open database sessions.
+        :type session_factory: async_sessionmaker
+        """
+        if self._client is None:
+            limits = httpx.Limits(max_connections=config.WEBHOOK_MAX_CONNECTIONS)
+            self._client = httpx.AsyncClient(timeout=config.WEBHOOK_TIMEOUT, limits=limits)
+        while await self.dispatch(session_factory, self._client) == config.WEBHOOK_BATCH_SIZE:
+            pass
+
+    async def close(self) -> None:
+        """
+        Closes the connection pool of the deliveries.
+        """
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+
+
+webhook_dispatcher = WebhookDispatcher()
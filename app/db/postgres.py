@@ -1,16 +1,154 @@
+import time
 from typing import Any, AsyncGenerator
 
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from sqlalchemy.orm import declarative_base
+from sqlalchemy import Table, event
+from sqlalchemy.dialects import postgresql, sqlite as sqlite_dialect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session, SessionTransaction, declarative_base
 import app.core.config as config
+from app.core.metrics import Histogram, metrics
+from app.core.tracing import current_route, on_endpoint_return, span
+from app.db import sqlite
 
 
-engine = create_async_engine(config.DATABASE_URL, echo=True)
-AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+def create_engines(url: str, **kwargs) -> tuple[AsyncEngine, AsyncEngine]:
+    """
+    Creates the engines of a database. Postgres uses one engine for everything,
+    SQLite a single connection writer engine and a pooled reader engine.
+    :param url: The database URL.
+    :type url: str
+    :param kwargs: Extra arguments passed to ``create_async_engine``.
+    :return: The writer and reader engines, which may be the same engine.
+    :rtype: tuple[AsyncEngine, AsyncEngine]
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return sqlite.create_engines(url, **kwargs)
+    engine = create_async_engine(url, **kwargs)
+    return engine, engine
+
+
+def create_sessionmaker(writer: AsyncEngine, reader: AsyncEngine) -> async_sessionmaker:
+    """
+    Creates the session factory of the engines returned by ``create_engines``.
+    :param writer: The engine used for writes.
+    :type writer: AsyncEngine
+    :param reader: The engine used for reads.
+    :type reader: AsyncEngine
+    :return: The session factory.
+    :rtype: async_sessionmaker
+    """
+    if writer is reader:
+        return async_sessionmaker(writer, expire_on_commit=False)
+    return sqlite.create_sessionmaker(writer, reader)
+
+
+# Statements are logged through the sqlalchemy.engine logger when LOG_SQL is set
+engine, read_engine = create_engines(config.DATABASE_URL)
+AsyncSessionLocal = create_sessionmaker(engine, read_engine)
 Base = declarative_base()
 
 
-# Database dependency
+def dialect_name(db: AsyncSession) -> str:
+    """
+    Returns the name of the database dialect of a session, "postgresql" or "sqlite".
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The dialect name.
+    :rtype: str
+    """
+    return db.get_bind().dialect.name
+
+
+def insert(db: AsyncSession, table: Table):
+    """
+    Starts an INSERT supporting ``on_conflict_do_nothing`` and ``on_conflict_do_update``
+    in the dialect of a session.
+    :param db: The database session the statement is run on.
+    :type db: AsyncSession
+    :param table: The table or model to insert into.
+    :return: The INSERT statement.
+    """
+    dialect = sqlite_dialect if dialect_name(db) == "sqlite" else postgresql
+    return dialect.insert(table)
+
+
+# Connection hold times of the sessions of each route
+_hold_times: dict[str, Histogram] = {}
+metrics.collector(
+    "db_connection_hold_seconds", lambda: {route: hold.snapshot() for route, hold in sorted(_hold_times.items())}
+)
+
+
+@event.listens_for(Session, "after_begin")
+def _connection_checked_out(session: Session, transaction: SessionTransaction, connection) -> None:
+    if "route" in session.info:
+        session.info.setdefault("held_since", time.perf_counter())
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _connection_released(session: Session, transaction: SessionTransaction) -> None:
+    if transaction.parent is None and "held_since" in session.info:
+        held = time.perf_counter() - session.info.pop("held_since")
+        route = session.info["route"]
+        if route not in _hold_times:
+            _hold_times[route] = Histogram()
+        _hold_times[route].observe(held)
+
+
+def bind_to_route(session: AsyncSession) -> AsyncSession:
+    """
+    Ties a request's session to the route handling it. The time its connections
+    are checked out is recorded per route, and the session is closed as soon as the
+    endpoint returns, so its connection goes back to the pool before the response
+    is serialized and sent. Loaded objects stay readable once closed, and a session
+    used again after that checks a connection out anew.
+    :param session: The session of the request.
+    :type session: AsyncSession
+    :return: The same session.
+    :rtype: AsyncSession
+    """
+    route = current_route()
+    if route is not None:
+        session.info["route"] = route
+
+        async def release():
+            with span("db.session_release"):
+                await session.close()
+
+        on_endpoint_return(release)
+    return session
+
+
+def route_sessionmaker(session_factory: async_sessionmaker) -> async_sessionmaker:
+    """
+    Returns a factory whose sessions record their connection hold time under the
+    route handling the current request, like the request's own session. They are
+    not closed when the endpoint returns: their users scope them themselves, and
+    shared work such as a single-flight query may outlive the request.
+    :param session_factory: The factory to derive from.
+    :type session_factory: async_sessionmaker
+    :return: The derived factory, or the same one outside of a request.
+    :rtype: async_sessionmaker
+    """
+    route = current_route()
+    if route is None:
+        return session_factory
+    info = {**session_factory.kw.get("info", {}), "route": route}
+    return async_sessionmaker(class_=session_factory.class_, **{**session_factory.kw, "info": info})
+
+
+# Database dependency. Sessions check a connection out on their first statement,
+# so requests answered without querying never take one from the pool.
 async def get_db() -> AsyncGenerator[AsyncSession, Any]:
-    async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+    with span("db.session_setup"):
+        session = bind_to_route(AsyncSessionLocal())
+    try:
+        yield session
+    finally:
+        with span("db.session_close"):
+            await session.close()
+
+# Session factory dependency, for work that outlives the request's own session
+def get_sessionmaker() -> async_sessionmaker:
+    return route_sessionmaker(AsyncSessionLocal)
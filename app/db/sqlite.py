@@ -0,0 +1,115 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+import app.core.config as config
+
+
+def _set_pragmas(read_only: bool):
+    def on_connect(dbapi_connection, connection_record):
+        # Let SQLAlchemy emit BEGIN itself, so the writer can take its lock upfront
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT}")
+        cursor.execute(f"PRAGMA cache_size={config.SQLITE_CACHE_SIZE}")
+        cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+    return on_connect
+
+
+def _begin(statement: str):
+    def on_begin(connection):
+        connection.exec_driver_sql(statement)
+    return on_begin
+
+
+def create_engines(url: str, **kwargs) -> tuple[AsyncEngine, AsyncEngine]:
+    """
+    Creates the engines of a SQLite database: a writer engine with a single
+    connection, whose pool queues writers so that exactly one writes at a time,
+    and a reader engine with a pool of ``SQLITE_READ_POOL_SIZE`` read-only
+    connections, which WAL mode lets read alongside the writer.
+
+    In-memory databases exist once per connection, so they get one shared
+    connection used for both.
+
+    :param url: The ``sqlite+aiosqlite`` database URL.
+    :type url: str
+    :param kwargs: Extra arguments passed to ``create_async_engine``.
+    :return: The writer and reader engines.
+    :rtype: tuple[AsyncEngine, AsyncEngine]
+    """
+    if make_url(url).database in (None, "", ":memory:"):
+        engine = create_async_engine(url, poolclass=StaticPool, **kwargs)
+        event.listen(engine.sync_engine, "connect", _set_pragmas(read_only=False))
+        event.listen(engine.sync_engine, "begin", _begin("BEGIN"))
+        return engine, engine
+
+    if "poolclass" not in kwargs:
+        kwargs = {**kwargs, "pool_size": 1, "max_overflow": 0, "pool_timeout": config.SQLITE_WRITE_TIMEOUT}
+    writer = create_async_engine(url, **kwargs)
+    event.listen(writer.sync_engine, "connect", _set_pragmas(read_only=False))
+    # Take the write lock when the transaction starts rather than on its first write,
+    # so a transaction never fails halfway because another process wrote first
+    event.listen(writer.sync_engine, "begin", _begin("BEGIN IMMEDIATE"))
+
+    if "poolclass" not in kwargs:
+        kwargs = {**kwargs, "pool_size": config.SQLITE_READ_POOL_SIZE, "max_overflow": 0}
+        kwargs.pop("pool_timeout")
+    reader = create_async_engine(url, **kwargs)
+    event.listen(reader.sync_engine, "connect", _set_pragmas(read_only=True))
+    event.listen(reader.sync_engine, "begin", _begin("BEGIN"))
+    return writer, reader
+
+
+class RoutingSession(Session):
+    """
+    A session sending reads to the reader engine and writes to the writer engine.
+    Once a transaction has written, the rest of it stays on the writer, so it reads
+    its own changes.
+    """
+
+    writer: AsyncEngine
+    reader: AsyncEngine
+
+    def get_bind(self, mapper=None, *, clause=None, **kwargs):
+        if (
+            self.info.get("writing")
+            or self._flushing
+            or isinstance(clause, (UpdateBase, TextClause))
+            # Locking reads come before a write that relies on them
+            or getattr(clause, "_for_update_arg", None) is not None
+        ):
+            self.info["writing"] = True
+            return self.writer.sync_engine
+        return self.reader.sync_engine
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _end_writing(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("writing", None)
+
+
+def create_sessionmaker(writer: AsyncEngine, reader: AsyncEngine) -> async_sessionmaker:
+    """
+    Creates a session factory routing reads and writes to their engines.
+    :param writer: The engine used for writes.
+    :type writer: AsyncEngine
+    :param reader: The engine used for reads.
+    :type reader: AsyncEngine
+    :return: The session factory.
+    :rtype: async_sessionmaker
+    """
+    session_class = type("RoutingSession", (RoutingSession,), {"writer": writer, "reader": reader})
+    return async_sessionmaker(sync_session_class=session_class, expire_on_commit=False)
@@ -1,17 +1,115 @@
+import asyncio
 import uvicorn
 import os
 import dotenv
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 from app.api.auth import router as auth_router
+from app.api.changes import router as changes_router
 from app.api.posts import router as posts_router
 from app.api.post_versions import router as post_versions_router
 from app.api.tags import router as tags_router
+from app.api.related import router as related_router
 from app.api.rss import router as rss_router
+from app.api.metrics import router as metrics_router
+from app.api.ready import router as ready_router
+from app.api.sitemap import router as sitemap_router
+from app.api.suggest import router as suggest_router
+from app.api.views import router as views_router
+from app.api.webhooks import router as webhooks_router
+import app.core.config as config
+from app.core.admission import AdmissionMiddleware
+from app.core.cdn import cdn_purger
+from app.core.log import AccessLogMiddleware, configure_logging, shutdown_logging
+from app.core.loop_monitor import loop_monitor
+from app.core.profiler import ProfilerMiddleware
+from app.core.related import related_index
+from app.core.render import rerender_job
+from app.core.retention import version_compactor
+from app.core.scheduler import scheduler
+from app.core.security import calibrate_password_hashing
+from app.core.slug_filter import slug_filter
+from app.core.suggest import suggester
+from app.core.tracing import TracingMiddleware, exporter as trace_exporter
+from app.core.views import view_counter
+from app.core.warmup import warmup
+from app.core.webhooks import webhook_dispatcher
+from app.db.postgres import AsyncSessionLocal, engine, read_engine
 
 
 dotenv.load_dotenv()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    await calibrate_password_hashing()
+    background_tasks = [asyncio.create_task(loop_monitor.run())]
+
+    # Jobs keeping in-process state run on every worker, the others on the leader only
+    if config.SLUG_FILTER_ENABLED:
+        scheduler.add("slug_filter", slug_filter.refresh, interval=config.SLUG_FILTER_REFRESH_SECONDS)
+    if config.SUGGEST_ENABLED:
+        scheduler.add("suggest", suggester.refresh, interval=config.SUGGEST_REBUILD_SECONDS)
+    scheduler.add("views", view_counter.flush_pending, interval=config.VIEWS_FLUSH_SECONDS, run_at_start=False)
+    scheduler.add("render", rerender_job, interval=config.RENDER_JOB_SECONDS, singleton=True)
+    if config.RELATED_ENABLED:
+        scheduler.add("related", related_index.maintain, interval=config.RELATED_REFRESH_SECONDS, singleton=True)
+    if config.VERSIONS_COMPACT_ENABLED:
+        if config.VERSIONS_COMPACT_CRON:
+            scheduler.add("versions", version_compactor.compact_job, cron=config.VERSIONS_COMPACT_CRON, singleton=True)
+        else:
+            scheduler.add("versions", version_compactor.compact_job, interval=config.VERSIONS_COMPACT_SECONDS, singleton=True)
+    if config.WEBHOOKS_ENABLED:
+        # Deliveries are claimed, so every worker can send them
+        scheduler.add("webhooks", webhook_dispatcher.drain, interval=config.WEBHOOK_POLL_SECONDS)
+    if config.CDN_PURGE_URL:
+        scheduler.add("cdn_purge", cdn_purger.drain, interval=config.CDN_PURGE_SECONDS, jitter=0)
+    scheduler.start(AsyncSessionLocal, engine)
+
+    if config.WARMUP_ENABLED:
+        background_tasks.append(asyncio.create_task(warmup.run(read_engine, AsyncSessionLocal)))
+    else:
+        warmup.ready = True
+
+    yield
+
+    # Stop receiving new traffic before anything is torn down
+    warmup.ready = False
+
+    for task in background_tasks:
+        task.cancel()
+    for task in background_tasks:
+        with suppress(asyncio.CancelledError):
+            await task
+    await scheduler.stop()
+    await webhook_dispatcher.close()
+    # Purge what the last writes changed
+    await cdn_purger.drain(AsyncSessionLocal)
+    await cdn_purger.close()
+
+    # Don't lose the views counted since the last periodic flush
+    async with AsyncSessionLocal() as db:
+        await view_counter.flush(db)
+
+    # SQLite connections each run on a thread of their own, which would keep the process alive
+    await engine.dispose()
+    await read_engine.dispose()
+
+    trace_exporter.close()
+    shutdown_logging()
+
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(TracingMiddleware)
+
+app.add_middleware(ProfilerMiddleware)
+
+app.add_middleware(AccessLogMiddleware)
+
+# Added last so it runs first and sheds load before any other work is done
+app.add_middleware(AdmissionMiddleware)
 
 
 app.include_router(auth_router)
@@ -24,8 +122,25 @@ app.include_router(posts_router)
 
 app.include_router(rss_router)
 
+app.include_router(sitemap_router)
+
+app.include_router(suggest_router)
+
+app.include_router(views_router)
+
+app.include_router(metrics_router)
+
+app.include_router(ready_router)
+
+app.include_router(changes_router)
+
+app.include_router(webhooks_router)
+
+app.include_router(related_router)
+
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", os.getenv("PORT", 8080)))
     host = os.getenv("HOST", "0.0.0.0")
-    uvicorn.run(app, host=host, port=port)
+    # Logging is configured by the app, and requests are logged by AccessLogMiddleware
+    uvicorn.run(app, host=host, port=port, log_config=None, access_log=False)
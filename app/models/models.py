@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 # =========================
@@ -41,10 +43,57 @@ class PostUpdate(PostBase):
 
 class PostRead(PostBase):
     id: str
+    revision: int
+    html: Optional[str] = None
+    excerpt: Optional[str] = None
+    word_count: Optional[int] = None
+    content_hash: Optional[str] = None
 
     class Config:
         orm_mode = True
 
+class PostAuthor(BaseModel):
+    id: str
+
+class PostListItem(PostRead):
+    user_id: str
+    updated_at: Optional[str] = None
+    author: Optional[PostAuthor] = None
+    tags: list[TagRead] = []
+
+class RelatedPostRead(BaseModel):
+    slug: str
+    title: str
+    excerpt: Optional[str] = None
+    score: float
+
+class PostBatchRequest(BaseModel):
+    slugs: Optional[list[str]] = None
+    ids: Optional[list[str]] = None
+
+class PostBatchItem(BaseModel):
+    key: str
+    found: bool
+    post: Optional[PostRead] = None
+
+class PostViews(BaseModel):
+    slug: str
+    views: int
+
+class TopPost(BaseModel):
+    id: str
+    slug: str
+    title: str
+    views: int
+
+class PostSuggestion(BaseModel):
+    slug: str
+    title: str
+
+class Suggestions(BaseModel):
+    posts: list[PostSuggestion]
+    tags: list[TagRead]
+
 # =========================
 # PostTag model
 
@@ -72,10 +121,37 @@ class PostVersionRead(PostVersionBase):
     version: int
     title: str
     created_at: str
+    label: Optional[str] = None
 
     class Config:
         orm_mode = True
 
+class PostVersionLabel(BaseModel):
+    label: Optional[str] = None
+
+class DiffWord(BaseModel):
+    op: str
+    text: str
+
+class DiffHunk(BaseModel):
+    op: str
+    a_start: int
+    a_end: int
+    b_start: int
+    b_end: int
+    a_lines: list[str]
+    b_lines: list[str]
+    words: Optional[list[DiffWord]] = None
+
+class PostVersionDiff(BaseModel):
+    slug: str
+    from_version: int
+    to_version: int
+    from_hash: str
+    to_hash: str
+    coarse: bool
+    hunks: list[DiffHunk]
+
 # =========================
 # User model
 
@@ -97,3 +173,36 @@ class UserRead(UserBase):
 
     class Config:
         orm_mode = True
+
+# =========================
+# Change model
+
+class ChangeRead(BaseModel):
+    id: int
+    entity: str
+    entity_id: str
+    action: str
+    data: Optional[dict] = None
+    created_at: str
+
+class ChangesPage(BaseModel):
+    changes: list[ChangeRead]
+    next: int
+
+# =========================
+# Webhook model
+
+class WebhookCreate(BaseModel):
+    url: str
+    events: Optional[list[str]] = None
+    secret: Optional[str] = None
+
+class WebhookRead(BaseModel):
+    id: str
+    url: str
+    events: Optional[list[str]] = None
+    is_active: bool
+    created_at: str
+
+    class Config:
+        orm_mode = True
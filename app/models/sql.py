@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean
+from sqlalchemy import BigInteger, Column, String, Boolean, Float, Index, Integer, JSON
 from app.db.postgres import Base
 
 
@@ -16,6 +16,13 @@ class Post(Base):
     title = Column(String, nullable=False)
     slug = Column(String, unique=True, nullable=False)
     content = Column(String, nullable=False)
+    revision = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(String, nullable=True, index=True)
+    html = Column(String, nullable=True)
+    excerpt = Column(String, nullable=True)
+    word_count = Column(Integer, nullable=True)
+    content_hash = Column(String, nullable=True)
+    render_version = Column(Integer, nullable=True, index=True)
 
 class PostTag(Base):
     __tablename__ = "post_tags"
@@ -25,6 +32,7 @@ class PostTag(Base):
 
 class PostVersion(Base):
     __tablename__ = "post_versions"
+    __table_args__ = (Index("ix_post_versions_post_id_created_at", "post_id", "created_at"),)
 
     id = Column(String, primary_key=True, index=True)
     post_id = Column(String, nullable=False)
@@ -32,6 +40,65 @@ class PostVersion(Base):
     title = Column(String, nullable=False)
     content = Column(String, nullable=False)
     created_at = Column(String, nullable=False)
+    # Labelled versions are kept forever
+    label = Column(String, nullable=True)
+
+class PostView(Base):
+    __tablename__ = "post_views"
+
+    post_id = Column(String, primary_key=True)
+    views = Column(BigInteger, nullable=False, default=0, index=True)
+
+class Change(Base):
+    __tablename__ = "changes"
+
+    # SQLite only autoincrements INTEGER primary keys
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    entity = Column(String, nullable=False)
+    entity_id = Column(String, nullable=False)
+    action = Column(String, nullable=False)
+    data = Column(JSON, nullable=True)
+    created_at = Column(String, nullable=False)
+
+class RelatedPost(Base):
+    __tablename__ = "related_posts"
+
+    post_id = Column(String, primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    related_id = Column(String, nullable=False, index=True)
+    score = Column(Float, nullable=False)
+
+class RelatedQueue(Base):
+    __tablename__ = "related_queue"
+
+    post_id = Column(String, primary_key=True)
+    queued_at = Column(Float, nullable=False)
+
+class WebhookEndpoint(Base):
+    __tablename__ = "webhook_endpoints"
+
+    id = Column(String, primary_key=True, index=True)
+    url = Column(String, nullable=False)
+    secret = Column(String, nullable=True)
+    # None subscribes to every event
+    events = Column(JSON, nullable=True)
+    is_active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(String, nullable=False)
+
+class WebhookDelivery(Base):
+    __tablename__ = "webhook_deliveries"
+    __table_args__ = (Index("ix_webhook_deliveries_due", "status", "next_attempt_at"),)
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    endpoint_id = Column(String, nullable=False)
+    event = Column(String, nullable=False)
+    data = Column(JSON, nullable=True)
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    # Unix timestamps, for the scheduling of retries and the delivery lag
+    enqueued_at = Column(Float, nullable=False)
+    next_attempt_at = Column(Float, nullable=False)
+    last_error = Column(String, nullable=True)
 
 class User(Base):
     __tablename__ = "users"
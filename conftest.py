@@ -1,12 +1,27 @@
+import os
+
 import pytest_asyncio
 import asyncpg
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
 from httpx import AsyncClient, ASGITransport
 from urllib.parse import urlparse
 
 from app.main import app
-from app.db.postgres import Base, get_db
+from app.core import admission
+from app.core.cdn import cdn_purger
+from app.core.singleflight import feed_flights, post_flights, tag_flights
+from app.core.sitemap import sitemap_shards
+from app.core.slug_filter import slug_filter
+from app.core.suggest import suggester
+from app.core.views import view_counter
+from app.core.warmup import warmup
+from app.core.webhooks import webhook_dispatcher
+from app.db.postgres import (
+    Base, bind_to_route, create_engines, create_sessionmaker, get_db, get_sessionmaker, route_sessionmaker,
+)
 from app.core.config import TEST_DATABASE_URL
 
 parsed_url = urlparse(TEST_DATABASE_URL)
@@ -21,8 +36,31 @@ TEST_DB_NAME = parsed_url.path.lstrip("/")
 # Save the TEST_DATABASE_URL globally (no engine yet)
 _test_database_url = TEST_DATABASE_URL
 
+# A sqlite+aiosqlite URL runs the suite on a database file, without a server
+USE_SQLITE = make_url(TEST_DATABASE_URL).get_backend_name() == "sqlite"
+SQLITE_PATH = make_url(TEST_DATABASE_URL).database if USE_SQLITE else None
+
+def _remove_sqlite_files():
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(SQLITE_PATH + suffix):
+            os.remove(SQLITE_PATH + suffix)
+
+async def _create_tables():
+    engine, read_engine = create_engines(_test_database_url, echo=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+    await read_engine.dispose()
+
 @pytest_asyncio.fixture(scope="session")
 async def setup_test_database():
+    if USE_SQLITE:
+        _remove_sqlite_files()
+        await _create_tables()
+        yield
+        _remove_sqlite_files()
+        return
+
     # Connect to admin DB and create the test DB
     admin_conn = await asyncpg.connect(
         user=POSTGRES_USER,
@@ -38,11 +76,7 @@ async def setup_test_database():
         await admin_conn.close()
 
     # Connect to the new test DB and create tables
-    engine = create_async_engine(_test_database_url, echo=True)
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
-    await engine.dispose()
+    await _create_tables()
 
     yield
 
@@ -66,26 +100,58 @@ async def setup_test_database():
 
 # Correct override: create engine + session at test runtime
 async def override_get_db() -> AsyncSession:
-    engine = create_async_engine(_test_database_url, echo=True)
-    TestingSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
-    async with TestingSessionLocal() as session:
-        yield session
-    await engine.dispose()
+    engine, read_engine = create_engines(_test_database_url, echo=True)
+    TestingSessionLocal = create_sessionmaker(engine, read_engine)
+    try:
+        async with TestingSessionLocal() as session:
+            yield bind_to_route(session)
+    finally:
+        await engine.dispose()
+        await read_engine.dispose()
+
+def override_get_sessionmaker() -> async_sessionmaker:
+    # Without pooling, connections are closed along with the sessions using them
+    return route_sessionmaker(create_sessionmaker(*create_engines(_test_database_url, poolclass=NullPool)))
 
 @pytest_asyncio.fixture
 async def async_client(setup_test_database):
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_sessionmaker] = override_get_sessionmaker
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://testserver") as client:
         yield client
 
 async def truncate_tables(session: AsyncSession):
-    await session.execute(text('TRUNCATE TABLE posts, users RESTART IDENTITY CASCADE'))
+    if USE_SQLITE:
+        for table in reversed(Base.metadata.sorted_tables):
+            await session.execute(table.delete())
+        await session.commit()
+        return
+    await session.execute(text('TRUNCATE TABLE posts, post_versions, post_views, tags, post_tags, users, changes, related_posts, related_queue, webhook_endpoints, webhook_deliveries RESTART IDENTITY CASCADE'))
     await session.commit()
 
+@pytest_asyncio.fixture
+async def db_session(setup_test_database):
+    """Database session bound to the test database, for seeding data directly."""
+    async for session in override_get_db():
+        yield session
+
 @pytest_asyncio.fixture(autouse=True)
 async def clean_database(async_client):
     """Clean database before each test."""
-    # Get a real database session
-    override_db = await override_get_db().__anext__()
-    await truncate_tables(override_db)
\ No newline at end of file
+    # Get a real database session, closed again along with its engine
+    async for session in override_get_db():
+        await truncate_tables(session)
+
+    # Drop in-process caches that would otherwise outlive the truncated rows
+    sitemap_shards.reset()
+    slug_filter.reset()
+    suggester.reset()
+    post_flights.clear()
+    feed_flights.clear()
+    tag_flights.clear()
+    view_counter.reset()
+    admission.reset()
+    warmup.reset()
+    webhook_dispatcher.reset()
+    cdn_purger.reset()
\ No newline at end of file
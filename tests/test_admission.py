@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+
+from app.core import admission
+from app.core.admission import AdmissionGate, Overloaded
+
+
+@pytest.mark.asyncio
+async def test_overloaded_requests_are_shed(async_client: AsyncClient):
+    """Test that requests beyond the limit and queue of their route class get 503 with Retry-After."""
+    gate = AdmissionGate("read", limit=1, target_latency=1.0, queue_size=0)
+    admission.gates["read"] = gate
+    await gate.acquire()
+
+    response = await async_client.get("/tags/")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == "1"
+    assert gate.shed == 1
+
+    # Other route classes are not affected
+    response = await async_client.post("/posts/missing/tags", json=[])
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    gate.release(0.0)
+    response = await async_client.get("/tags/")
+    assert response.status_code == status.HTTP_200_OK
+    assert gate.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_admitted_in_order_or_time_out():
+    """Test that queued requests get freed slots in FIFO order and give up at the deadline."""
+    gate = AdmissionGate("read", limit=1, target_latency=1.0, max_limit=1, queue_size=2, queue_timeout=0.05)
+    await gate.acquire()
+
+    first = asyncio.create_task(gate.acquire())
+    second = asyncio.create_task(gate.acquire())
+    await asyncio.sleep(0)
+    with pytest.raises(Overloaded):
+        await gate.acquire()
+    assert gate.queued == 2
+
+    gate.release(0.0)
+    await first
+    assert not second.done()
+    with pytest.raises(Overloaded):
+        await second
+    assert gate.stats() == {"limit": 1.0, "in_flight": 1, "queued": 0, "admitted": 2, "shed": 2}
+
+
+@pytest.mark.asyncio
+async def test_limit_adapts_to_latency():
+    """Test that fast requests at the limit raise it and slow ones cut it multiplicatively."""
+    gate = AdmissionGate("write", limit=4, target_latency=0.1, min_limit=2, max_limit=5, backoff=0.5)
+    for _ in range(4):
+        await gate.acquire()
+    gate.release(0.01)
+    assert gate.limit == 4.25
+
+    gate.release(1.0)
+    assert gate.limit == 2.125
+    # Slow requests finishing right after count as the same congestion signal
+    gate.release(1.0)
+    assert gate.limit == 2.125
+
+    gate._decreased_at = 0.0
+    gate.release(1.0)
+    assert gate.limit == 2
+
+
+def test_route_class():
+    """Test how requests are classified."""
+    assert admission.route_class("POST", "/auth/login") == "auth"
+    assert admission.route_class("GET", "/posts/my-post") == "read"
+    assert admission.route_class("POST", "/posts/batch") == "read"
+    assert admission.route_class("PUT", "/posts/my-post") == "write"
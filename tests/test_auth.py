@@ -1,6 +1,10 @@
 import pytest, asyncio
 from httpx import AsyncClient
 from fastapi import status
+from sqlalchemy.future import select
+
+from app.core.security import calibrate_bcrypt_rounds, pwd_context, set_bcrypt_rounds
+from app.models.sql import User
 
 test_user = {
     "email": "user@exampler.com",
@@ -78,4 +82,27 @@ async def test_get_current_user_unauthenticated(async_client: AsyncClient):
     # This test should fail because the user is not authenticated
     response = await async_client.get("/users/me")
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
-    assert "Not authenticated" in response.json()["detail"]
\ No newline at end of file
+    assert "Not authenticated" in response.json()["detail"]
+
+def test_calibrate_bcrypt_rounds():
+    """Test that calibration never goes below the floor, and raises the cost for a looser target"""
+    assert calibrate_bcrypt_rounds(0.0, 5) == 5
+    assert calibrate_bcrypt_rounds(60.0, 4) > 4
+
+@pytest.mark.asyncio
+async def test_login_rehashes_password_with_new_cost(async_client: AsyncClient, db_session):
+    """Test that logging in rehashes a password hashed with another cost, after the response"""
+    user = {"email": "rehash@example.com", "password": "password123"}
+    default_rounds = pwd_context.handler("bcrypt").default_rounds
+    try:
+        set_bcrypt_rounds(4)
+        await async_client.post("/auth/register", json=user)
+        set_bcrypt_rounds(5)
+        response = await async_client.post("/auth/login", json=user)
+        assert response.status_code == status.HTTP_200_OK
+    finally:
+        set_bcrypt_rounds(default_rounds)
+
+    result = await db_session.execute(select(User.hashed_password).where(User.email == user["email"]))
+    assert result.scalar_one().startswith("$2b$05$")
+
@@ -0,0 +1,88 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+
+import app.core.config as config
+from app.core.cdn import SURROGATE_KEY_HEADER, cdn_purger
+
+
+class StubPurgeServer(BaseHTTPRequestHandler):
+    # Answered in order, then 200 for every further request
+    statuses: list = []
+    received: list = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.received.append((dict(self.headers), json.loads(body)))
+        self.send_response(self.statuses.pop(0) if self.statuses else 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def purge_url(monkeypatch):
+    StubPurgeServer.statuses, StubPurgeServer.received = [], []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubPurgeServer)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/purge"
+    monkeypatch.setattr(config, "CDN_PURGE_URL", url)
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.asyncio
+async def test_responses_carry_surrogate_keys(async_client: AsyncClient, monkeypatch):
+    """Test that cacheable responses are tagged with the keys of what they show."""
+    monkeypatch.setattr(config, "CDN_MAX_AGE", 86400)
+    monkeypatch.setattr(config, "SITE_URL", "http://testserver")
+    payload = {"title": "My First Post", "slug": "my-first-post", "content": "Content", "user_id": "user-123"}
+    missing = await async_client.get("/posts/my-first-post")
+    assert missing.headers[SURROGATE_KEY_HEADER] == "slug-my-first-post"
+
+    post = (await async_client.post("/posts/", json=payload)).json()
+    response = await async_client.get("/posts/my-first-post")
+    assert response.headers[SURROGATE_KEY_HEADER] == f"post-{post['id']} slug-my-first-post"
+    assert response.headers["Surrogate-Control"] == "max-age=86400"
+    assert (await async_client.get("/posts/")).headers[SURROGATE_KEY_HEADER] == "posts"
+    assert (await async_client.get("/rss.xml")).headers[SURROGATE_KEY_HEADER] == "feed"
+    assert (await async_client.get("/sitemap.xml")).headers[SURROGATE_KEY_HEADER] == "sitemap"
+    assert (await async_client.get("/tags/")).headers[SURROGATE_KEY_HEADER] == "tags"
+
+
+@pytest.mark.asyncio
+async def test_writes_purge_their_keys_in_batches(async_client: AsyncClient, purge_url, monkeypatch):
+    """Test that the keys of committed writes are deduplicated, batched and retried after a failure."""
+    monkeypatch.setattr(config, "CDN_PURGE_TOKEN", "t0ken")
+    monkeypatch.setattr(config, "CDN_PURGE_BATCH", 4)
+    payload = {"title": "My First Post", "slug": "my-first-post", "content": "Content", "user_id": "user-123"}
+    post = (await async_client.post("/posts/", json=payload)).json()
+    response = await async_client.put(
+        "/posts/my-first-post", json={**payload, "slug": "renamed"}, headers={"If-Match": '"1"'}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert cdn_purger.pending == [
+        "slug-my-first-post", "posts", "feed", "sitemap", f"post-{post['id']}", "slug-renamed",
+    ]
+
+    async with httpx.AsyncClient() as client:
+        StubPurgeServer.statuses = [503]
+        assert await cdn_purger.flush(client) == 0
+        assert len(cdn_purger.pending) == 6
+        assert await cdn_purger.flush(client) == 6
+    assert cdn_purger.pending == []
+
+    # One failed request, then the keys in batches of at most four
+    batches = [body["surrogate_keys"] for _, body in StubPurgeServer.received]
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert sorted(batches[1] + batches[2]) == sorted(set(batches[1] + batches[2]))
+    assert StubPurgeServer.received[0][0]["Authorization"] == "Bearer t0ken"
@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+
+import app.core.config as config
+
+
+async def create_post(async_client: AsyncClient, slug: str):
+    payload = {"title": "My First Post", "slug": slug, "content": "Content", "user_id": "user-123"}
+    response = await async_client.post("/posts/", json=payload)
+    assert response.status_code == status.HTTP_201_CREATED
+    return response
+
+
+@pytest.mark.asyncio
+async def test_changes_are_logged_in_order(async_client: AsyncClient):
+    """Test that writes are recorded in the change log and read incrementally."""
+    response = await create_post(async_client, "my-first-post")
+    post_id = response.json()["id"]
+    await async_client.put(
+        "/posts/my-first-post",
+        json={"title": "Renamed", "slug": "renamed", "content": "Content"},
+        headers={"If-Match": response.headers["ETag"]},
+    )
+    await async_client.post("/posts/renamed/tags", json=[{"name": "python"}])
+    await async_client.delete("/posts/renamed")
+
+    response = await async_client.get("/changes", params={"limit": 2})
+    assert response.status_code == status.HTTP_200_OK
+    page = response.json()
+    assert [(c["entity"], c["action"]) for c in page["changes"]] == [("post", "created"), ("post", "updated")]
+    assert page["changes"][1]["data"] == {"slug": "renamed", "previous_slug": "my-first-post"}
+    assert page["changes"][0]["entity_id"] == post_id
+
+    response = await async_client.get("/changes", params={"since": page["next"]})
+    page = response.json()
+    assert [(c["entity"], c["action"]) for c in page["changes"]] == [
+        ("tag", "created"), ("post_tag", "created"), ("post", "deleted")
+    ]
+
+    # Nothing new: the cursor stays put
+    response = await async_client.get("/changes", params={"since": page["next"]})
+    assert response.json() == {"changes": [], "next": page["next"]}
+
+
+@pytest.mark.asyncio
+async def test_long_poll_returns_on_change(async_client: AsyncClient):
+    """Test that a long poll returns as soon as a change is committed."""
+    poll = asyncio.create_task(async_client.get("/changes", params={"wait": 5}))
+    await asyncio.sleep(0.2)
+    assert not poll.done()
+
+    await create_post(async_client, "my-first-post")
+    response = await asyncio.wait_for(poll, 2)
+    assert [c["data"]["slug"] for c in response.json()["changes"]] == ["my-first-post"]
+
+
+@pytest.mark.asyncio
+async def test_stream_changes(async_client: AsyncClient, monkeypatch):
+    """Test that changes are streamed as server-sent events, resuming after Last-Event-ID."""
+    monkeypatch.setattr(config, "CHANGES_STREAM_SECONDS", 0.3)
+    await create_post(async_client, "first")
+    await create_post(async_client, "second")
+
+    response = await async_client.get("/changes/stream", headers={"Last-Event-ID": "1"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block for block in response.text.split("\n\n") if block.startswith("id:")]
+    assert len(events) == 1
+    event_id, event, data = events[0].split("\n")
+    assert event_id == "id: 2"
+    assert event == "event: change"
+    assert json.loads(data.removeprefix("data: "))["data"] == {"slug": "second"}
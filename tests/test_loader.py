@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from app.core.loader import DataLoader
+
+
+@pytest.mark.asyncio
+async def test_loads_are_batched_and_cached():
+    """Test that keys loaded together are fetched in one batch and never fetched twice."""
+    batches = []
+
+    async def batch_load(keys):
+        batches.append(keys)
+        return {key: key.upper() for key in keys if key != "missing"}
+
+    loader = DataLoader(batch_load, missing=lambda: "?", max_batch_size=2)
+    results = await asyncio.gather(loader.load("a"), loader.load("b"), loader.load("a"), loader.load("missing"))
+    assert results == ["A", "B", "A", "?"]
+    assert batches == [["a", "b"], ["missing"]]
+
+    assert await loader.load_many(["b", "c"]) == ["B", "C"]
+    assert batches[-1] == ["c"]
+
+
+@pytest.mark.asyncio
+async def test_failed_batches_are_retried():
+    """Test that a failing batch fails every load in it without caching the error."""
+    calls = 0
+
+    async def batch_load(keys):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("database unavailable")
+        return {key: key for key in keys}
+
+    loader = DataLoader(batch_load)
+    with pytest.raises(RuntimeError):
+        await loader.load_many(["a", "b"])
+    assert await loader.load("a") == "a"
@@ -0,0 +1,68 @@
+import json
+import logging
+import queue
+import sys
+
+import pytest
+from httpx import AsyncClient
+
+import app.core.config as config
+from app.core.log import DroppingQueueHandler, JsonFormatter, SamplingFilter
+
+
+def _record(name: str, level: int, msg: str = "message", *args, **extra) -> logging.LogRecord:
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_records_are_formatted_as_json():
+    """Test that records become one JSON object per line, with their extra fields and exception."""
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord("app.test", logging.ERROR, __file__, 1, "failed %s", ("job",), sys.exc_info())
+    record.duration_ms = 12.5
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["level"] == "ERROR"
+    assert entry["logger"] == "app.test"
+    assert entry["message"] == "failed job"
+    assert entry["duration_ms"] == 12.5
+    assert "ValueError: boom" in entry["exception"]
+
+
+def test_sampling_keeps_warnings():
+    """Test that sampled loggers lose their info records but never their warnings."""
+    sampling = SamplingFilter({"sqlalchemy.engine": 0.0, "sqlalchemy.engine.Engine.hot": 1.0})
+    assert not sampling.filter(_record("sqlalchemy.engine.Engine", logging.INFO))
+    assert sampling.filter(_record("sqlalchemy.engine.Engine", logging.WARNING))
+    # The longest matching prefix wins
+    assert sampling.filter(_record("sqlalchemy.engine.Engine.hot", logging.INFO))
+    assert sampling.filter(_record("app.core.views", logging.INFO))
+    assert sampling.sampled_out.value >= 1
+
+
+def test_full_queue_drops_records():
+    """Test that records are dropped and counted rather than waited on when the queue is full."""
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    dropped = handler.dropped.value
+    handler.handle(_record("app.test", logging.INFO, "first %d", 1))
+    handler.handle(_record("app.test", logging.INFO, "second"))
+
+    assert handler.dropped.value == dropped + 1
+    queued = handler.queue.get_nowait()
+    assert (queued.msg, queued.args) == ("first 1", None)
+
+
+@pytest.mark.asyncio
+async def test_slow_requests_are_logged_as_warnings(async_client: AsyncClient, caplog, monkeypatch):
+    """Test that requests slower than the threshold are logged as warnings, with their status and duration."""
+    monkeypatch.setattr(config, "LOG_SLOW_REQUEST_SECONDS", 0)
+    with caplog.at_level(logging.INFO, logger="app.access"):
+        await async_client.get("/posts/missing-post")
+
+    record = next(record for record in caplog.records if record.name == "app.access")
+    assert record.levelno == logging.WARNING
+    assert record.getMessage() == "GET /posts/missing-post 404"
+    assert record.status == 404 and record.duration_ms >= 0
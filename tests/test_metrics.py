@@ -0,0 +1,57 @@
+import asyncio
+import logging
+
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+
+import app.core.config as config
+from app.core.loop_monitor import LoopMonitor
+from app.core.metrics import Histogram
+
+
+@pytest.mark.asyncio
+async def test_get_metrics(async_client: AsyncClient):
+    """Test that the metrics endpoint reports the loop lag and admission gates."""
+    response = await async_client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    body = response.json()
+    assert "loop_lag_seconds" in body
+    assert set(body["admission"]) == {"read", "write", "auth"}
+    assert body["admission"]["read"]["in_flight"] == 1
+
+
+def test_histogram_quantiles():
+    """Test that quantiles are estimated from the bucket bounds."""
+    histogram = Histogram(buckets=(0.01, 0.1, 1.0))
+    for value in [0.005] * 90 + [0.05] * 9 + [3.0]:
+        histogram.observe(value)
+
+    assert histogram.quantile(0.5) == 0.01
+    assert histogram.quantile(0.99) == 0.1
+    assert histogram.quantile(1.0) == 3.0
+    assert histogram.snapshot()["buckets"] == {"0.01": 90, "0.1": 99, "1.0": 99, "+Inf": 100}
+
+
+@pytest.mark.asyncio
+async def test_blocking_request_is_reported(async_client: AsyncClient, monkeypatch, caplog):
+    """Test that, in debug mode, a request blocking the loop is logged with its route and stack."""
+    monkeypatch.setattr(config, "LOOP_BLOCK_DEBUG", True)
+    monkeypatch.setattr(config, "LOOP_BLOCK_THRESHOLD", 0.05)
+    monitor = LoopMonitor()
+    task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(0.05)
+
+    with caplog.at_level(logging.WARNING, logger="app.core.loop_monitor"):
+        # Hashing the password with bcrypt runs on the event loop
+        response = await async_client.post("/auth/register", json={"email": "lag@example.com", "password": "secret"})
+        await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert monitor.blocked.value >= 1
+    assert monitor.lag.max >= 0.05
+    assert "while serving POST /auth/register" in caplog.text
+    assert "hash_password" in caplog.text
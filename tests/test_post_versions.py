@@ -0,0 +1,187 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+from sqlalchemy import update
+from sqlalchemy.future import select
+
+import app.core.config as config
+from app.core.config import TEST_DATABASE_URL
+from app.core.diff import diff_texts
+from app.core.retention import version_compactor, versions_to_delete
+from app.db.postgres import create_engines, create_sessionmaker
+from app.models.sql import PostVersion
+
+payload = {
+    "title": "My First Post",
+    "slug": "my-first-post",
+    "content": "This is the content of my first post.",
+    "user_id": "user-123"
+}
+
+async def create_versions(async_client, db_session, *contents):
+    """Create the test post and store one version per given content."""
+    response = await async_client.post("/posts/", json=payload)
+    assert response.status_code == status.HTTP_201_CREATED
+    post_id = response.json()["id"]
+
+    for number, content in enumerate(contents, start=1):
+        db_session.add(PostVersion(
+            id=str(uuid.uuid4()),
+            post_id=post_id,
+            version=str(number),
+            title=payload["title"],
+            content=content,
+            created_at="2025-04-10 12:00:00",
+        ))
+    await db_session.commit()
+    return response.headers["ETag"]
+
+
+@pytest.mark.asyncio
+async def test_diff_versions(async_client: AsyncClient, db_session):
+    """Test diffing two versions of a post."""
+    await create_versions(
+        async_client,
+        db_session,
+        "Intro\nThe quick brown fox\nOutro",
+        "Intro\nThe quick red fox\nOutro\nP.S.",
+    )
+
+    response = await async_client.get(f"/posts/{payload['slug']}/versions/1/diff/2")
+    assert response.status_code == status.HTTP_200_OK
+    diff = response.json()
+    assert diff["coarse"] is False
+    assert [hunk["op"] for hunk in diff["hunks"]] == ["equal", "replace", "equal", "insert"]
+
+    replace = diff["hunks"][1]
+    assert replace["a_lines"] == ["The quick brown fox"]
+    assert replace["b_lines"] == ["The quick red fox"]
+    assert {"op": "delete", "text": "brown"} in replace["words"]
+    assert {"op": "insert", "text": "red"} in replace["words"]
+    assert diff["hunks"][3]["b_lines"] == ["P.S."]
+
+    # The same comparison is served from the cache
+    response = await async_client.get(f"/posts/{payload['slug']}/versions/1/diff/2")
+    assert response.json() == diff
+
+
+@pytest.mark.asyncio
+async def test_diff_version_not_found(async_client: AsyncClient, db_session):
+    """Test diffing against a version that does not exist."""
+    await create_versions(async_client, db_session, "First")
+    post_id = (await db_session.execute(select(PostVersion.post_id))).scalar_one()
+    # Versions are free-form strings in the table
+    db_session.add(PostVersion(
+        id=str(uuid.uuid4()), post_id=post_id, version="draft", title="Draft", content="Draft",
+        created_at="2025-04-10 12:00:00",
+    ))
+    await db_session.commit()
+
+    response = await async_client.get(f"/posts/{payload['slug']}/versions/1/diff/2")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()["detail"] == "Version does not exist"
+    assert (await async_client.get(f"/posts/{payload['slug']}/versions/1/diff/1")).status_code == status.HTTP_200_OK
+
+    response = await async_client.get("/posts/non-existent-slug/versions/1/diff/2")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()["detail"] == "Post does not exist"
+
+
+@pytest.mark.asyncio
+async def test_restore_version(async_client: AsyncClient, db_session):
+    """Test restoring a post from one of its versions."""
+    etag = await create_versions(async_client, db_session, "Original content")
+
+    response = await async_client.post(f"/posts/{payload['slug']}/restore/1", headers={"If-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["content"] == "Original content"
+    assert response.json()["html"] == "<p>Original content</p>"
+    assert response.headers["ETag"] != etag
+
+    # The old ETag no longer matches once the post has been restored
+    response = await async_client.post(f"/posts/{payload['slug']}/restore/1", headers={"If-Match": etag})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+
+@pytest.mark.asyncio
+async def test_restore_requires_if_match(async_client: AsyncClient, db_session):
+    """Test that restoring without If-Match is rejected."""
+    etag = await create_versions(async_client, db_session, "Original content")
+
+    response = await async_client.post(f"/posts/{payload['slug']}/restore/1")
+    assert response.status_code == status.HTTP_428_PRECONDITION_REQUIRED
+
+    response = await async_client.post(f"/posts/{payload['slug']}/restore/2", headers={"If-Match": etag})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()["detail"] == "Version does not exist"
+
+
+def test_diff_texts_falls_back_to_coarse_diff():
+    """Test that an exhausted CPU budget produces a coarse but correct diff."""
+    old = "\n".join(f"line {i}" for i in range(200))
+    new = "\n".join(f"line {i}" if i % 3 else f"changed {i}" for i in range(200))
+
+    exact = diff_texts(old, new)
+    coarse = diff_texts(old, new, cpu_budget=10)
+    assert exact["coarse"] is False
+    assert coarse["coarse"] is True
+    assert len(coarse["hunks"]) < len(exact["hunks"])
+
+    for diff in (exact, coarse):
+        rebuilt = [line for hunk in diff["hunks"] for line in hunk["b_lines"]]
+        assert rebuilt == new.splitlines()
+
+
+def test_retention_policy():
+    """Test that old versions thin out to one per day, then one per month."""
+    now = datetime(2025, 6, 30, 12, 0, 0)
+    versions = [
+        ("recent-1", "2025-06-29 10:00:00", None),
+        ("recent-2", "2025-06-29 09:00:00", None),
+        ("day-late", "2025-06-01 18:00:00", None),
+        ("day-early", "2025-06-01 08:00:00", None),
+        ("month-late", "2025-01-20 08:00:00", None),
+        ("month-early", "2025-01-02 08:00:00", None),
+        ("labelled", "2025-01-01 08:00:00", "v1.0"),
+    ]
+    assert sorted(versions_to_delete(versions, now)) == ["day-early", "month-early"]
+
+    # The latest version of a post is kept however old
+    assert versions_to_delete([("only", "2020-01-01 00:00:00", None)], now) == []
+
+
+@pytest.mark.asyncio
+async def test_compaction_keeps_labelled_versions(async_client: AsyncClient, db_session, monkeypatch):
+    """Test that compaction deletes unlabelled versions past their retention, in batches."""
+    monkeypatch.setattr(config, "VERSIONS_DELETE_BATCH", 1)
+    monkeypatch.setattr(config, "VERSIONS_DELETE_PAUSE", 0)
+    await create_versions(async_client, db_session, "one", "two", "three", "four")
+    for number in range(1, 5):
+        await db_session.execute(
+            update(PostVersion).where(PostVersion.version == str(number)).values(created_at=f"2025-04-10 12:0{number}:00")
+        )
+    await db_session.commit()
+
+    response = await async_client.put(f"/posts/{payload['slug']}/versions/2/label", json={"label": "published"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["label"] == "published"
+    change = (await async_client.get("/changes")).json()["changes"][-1]
+    assert (change["entity"], change["entity_id"], change["action"]) == ("post_version", response.json()["id"], "updated")
+    assert change["data"] == {"slug": payload["slug"], "version": "2", "label": "published"}
+    response = await async_client.put(f"/posts/{payload['slug']}/versions/9/label", json={"label": "published"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    # All four versions share a month, long past the daily window
+    engine, read_engine = create_engines(TEST_DATABASE_URL)
+    try:
+        deleted = await version_compactor.compact(create_sessionmaker(engine, read_engine), datetime(2026, 1, 1))
+    finally:
+        await engine.dispose()
+        await read_engine.dispose()
+    assert deleted == 2
+
+    result = await db_session.execute(select(PostVersion.version).order_by(PostVersion.version))
+    assert result.scalars().all() == ["2", "4"]
@@ -1,6 +1,12 @@
 import pytest, asyncio
 from httpx import AsyncClient
 from fastapi import status
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.changes import record_change
+from app.core.slug_filter import BloomFilter, slug_filter
+from app.models.sql import Post
 
 @pytest.mark.asyncio
 async def test_create_post_successfully(async_client: AsyncClient):
@@ -99,9 +105,79 @@ async def test_update_post_success(async_client: AsyncClient):
         "content": "This is the updated content of my first post.",
         "slug": "my-first-post"
     }
-    response = await async_client.put(f"/posts/{payload['slug']}", json=update_payload)
+    response = await async_client.put(
+        f"/posts/{payload['slug']}",
+        json=update_payload,
+        headers={"If-Match": response.headers["ETag"]},
+    )
     assert response.status_code == status.HTTP_200_OK
     assert response.json()["title"] == update_payload["title"]
+    assert response.json()["revision"] == 2
+
+
+@pytest.mark.asyncio
+async def test_update_post_requires_if_match(async_client: AsyncClient):
+    """Test that updating a post without If-Match is rejected."""
+    payload = {
+        "title": "My First Post",
+        "slug": "my-first-post",
+        "content": "This is the content of my first post.",
+        "user_id": "user-123"
+    }
+    response = await async_client.post("/posts/", json=payload)
+    assert response.status_code == status.HTTP_201_CREATED
+
+    update_payload = {
+        "title": "My Updated Post",
+        "content": "This is the updated content of my first post.",
+        "slug": "my-first-post"
+    }
+    response = await async_client.put(f"/posts/{payload['slug']}", json=update_payload)
+    assert response.status_code == status.HTTP_428_PRECONDITION_REQUIRED
+
+
+@pytest.mark.asyncio
+async def test_update_post_stale_etag(async_client: AsyncClient):
+    """Test that a concurrent edit makes an update based on a stale ETag fail."""
+    payload = {
+        "title": "My First Post",
+        "slug": "my-first-post",
+        "content": "This is the content of my first post.",
+        "user_id": "user-123"
+    }
+    response = await async_client.post("/posts/", json=payload)
+    assert response.status_code == status.HTTP_201_CREATED
+    etag = response.headers["ETag"]
+
+    # Both editors start from the same revision
+    first_edit = {"title": "First editor", "content": "First edit.", "slug": "my-first-post"}
+    second_edit = {"title": "Second editor", "content": "Second edit.", "slug": "my-first-post"}
+
+    response = await async_client.put(f"/posts/{payload['slug']}", json=first_edit, headers={"If-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] != etag
+
+    response = await async_client.put(f"/posts/{payload['slug']}", json=second_edit, headers={"If-Match": etag})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    response = await async_client.get(f"/posts/{payload['slug']}")
+    assert response.json()["title"] == first_edit["title"]
+
+
+@pytest.mark.asyncio
+async def test_update_post_slug_taken(async_client: AsyncClient):
+    """Test renaming a post to a slug that is used by another post."""
+    first = {"title": "First", "slug": "first", "content": "First.", "user_id": "user-123"}
+    second = {"title": "Second", "slug": "second", "content": "Second.", "user_id": "user-123"}
+    response = await async_client.post("/posts/", json=first)
+    assert response.status_code == status.HTTP_201_CREATED
+    response = await async_client.post("/posts/", json=second)
+    assert response.status_code == status.HTTP_201_CREATED
+
+    update_payload = {"title": "Second", "slug": "first", "content": "Second."}
+    response = await async_client.put("/posts/second", json=update_payload, headers={"If-Match": response.headers["ETag"]})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == "Slug already exists"
 
 
 @pytest.mark.asyncio
@@ -247,4 +323,131 @@ async def test_filter_posts_by_tag(async_client: AsyncClient):
     # Now filter posts by a specific tag
     response = await async_client.get("/posts/?tag=my-tag")
     assert response.status_code == status.HTTP_200_OK
-    assert isinstance(response.json(), list)
\ No newline at end of file
+    assert isinstance(response.json(), list)
+
+@pytest.mark.asyncio
+async def test_slug_filter_answers_missing_slugs(async_client: AsyncClient, db_session):
+    """Test that the slug filter rejects unknown slugs and learns about new posts."""
+    await slug_filter.rebuild(db_session)
+    assert slug_filter.ready
+    assert not slug_filter.might_contain("non-existent-slug")
+
+    response = await async_client.get("/posts/non-existent-slug")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()["detail"] == "Post does not exist"
+
+    payload = {
+        "title": "My First Post",
+        "slug": "my-first-post",
+        "content": "This is the content of my first post.",
+        "user_id": "user-123"
+    }
+    response = await async_client.post("/posts/", json=payload)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert slug_filter.might_contain(payload["slug"])
+
+    response = await async_client.get(f"/posts/{payload['slug']}")
+    assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.asyncio
+async def test_slug_filter_catches_up_from_the_change_log(async_client: AsyncClient, db_session):
+    """Test that misses never touch the database, and that posts of other workers are found after a catch-up."""
+    await slug_filter.rebuild(db_session)
+    # Written the way another worker would, without this worker's filter knowing
+    db_session.add(Post(id="elsewhere", user_id="user-123", title="Elsewhere", slug="written-elsewhere", content="Content"))
+    await record_change(db_session, "post", "elsewhere", "created", {"slug": "written-elsewhere"})
+    await db_session.commit()
+
+    statements = []
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(Engine, "before_cursor_execute", count)
+    try:
+        for i in range(20):
+            response = await async_client.get(f"/posts/unknown-{i}")
+            assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert (await async_client.get("/posts/written-elsewhere")).status_code == status.HTTP_404_NOT_FOUND
+    finally:
+        event.remove(Engine, "before_cursor_execute", count)
+    assert statements == []
+
+    await slug_filter.catch_up(db_session)
+    assert (await async_client.get("/posts/written-elsewhere")).status_code == status.HTTP_200_OK
+
+
+def test_bloom_filter_false_positive_rate():
+    """Test that the Bloom filter has no false negatives and stays near its target rate."""
+    bloom = BloomFilter(capacity=5000, fp_rate=0.01, max_bytes=1024 * 1024)
+    for i in range(5000):
+        bloom.add(f"post-{i}")
+
+    assert all(f"post-{i}" in bloom for i in range(5000))
+    false_positives = sum(f"missing-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+@pytest.mark.asyncio
+async def test_get_posts_batch(async_client: AsyncClient):
+    """Test fetching several posts at once, in request order."""
+    for i in range(3):
+        payload = {
+            "title": f"Post {i}",
+            "slug": f"post-{i}",
+            "content": f"Content of post {i}.",
+            "user_id": "user-123"
+        }
+        response = await async_client.post("/posts/", json=payload)
+        assert response.status_code == status.HTTP_201_CREATED
+
+    response = await async_client.post("/posts/batch", json={"slugs": ["post-2", "missing", "post-0", "post-2"]})
+    assert response.status_code == status.HTTP_200_OK
+    items = response.json()
+    assert [item["key"] for item in items] == ["post-2", "missing", "post-0", "post-2"]
+    assert [item["found"] for item in items] == [True, False, True, True]
+    assert items[0]["post"]["title"] == "Post 2"
+    assert items[1]["post"] is None
+
+    response = await async_client.post("/posts/batch", json={"ids": [items[2]["post"]["id"], "missing"]})
+    assert response.status_code == status.HTTP_200_OK
+    assert [item["found"] for item in response.json()] == [True, False]
+
+
+@pytest.mark.asyncio
+async def test_get_posts_batch_invalid(async_client: AsyncClient):
+    """Test that a batch needs exactly one kind of key."""
+    response = await async_client.post("/posts/batch", json={})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = await async_client.post("/posts/batch", json={"slugs": ["a"], "ids": ["b"]})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.asyncio
+async def test_list_posts_embeds_authors_and_tags(async_client: AsyncClient, db_session):
+    """Test that listed posts embed their author and tags with a constant number of queries."""
+    user = {"email": "author@example.com", "password": "secret"}
+    user_id = (await async_client.post("/auth/register", json=user)).json()["user"]["id"]
+    for i in range(5):
+        payload = {"title": f"Post {i}", "slug": f"post-{i}", "content": "Content", "user_id": user_id if i % 2 else "unknown"}
+        assert (await async_client.post("/posts/", json=payload)).status_code == status.HTTP_201_CREATED
+    await async_client.post("/posts/post-1/tags", json=[{"name": "python"}, {"name": "asyncio"}])
+
+    statements = []
+    def count(conn, cursor, statement, parameters, context, executemany):
+        # Only queries count, SQLite sessions also emit their BEGIN as a statement
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+    event.listen(Engine, "before_cursor_execute", count)
+    try:
+        response = await async_client.get("/posts/")
+    finally:
+        event.remove(Engine, "before_cursor_execute", count)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(statements) == 3
+    posts = {post["slug"]: post for post in response.json()}
+    assert posts["post-1"]["author"] == {"id": user_id}
+    assert [tag["name"] for tag in posts["post-1"]["tags"]] == ["asyncio", "python"]
+    assert posts["post-0"]["author"] is None
+    assert posts["post-0"]["tags"] == []
+    assert posts["post-0"]["user_id"] == "unknown"
@@ -0,0 +1,55 @@
+import marshal
+
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+from sqlalchemy import update
+
+from app.models.sql import User
+
+
+async def login(async_client: AsyncClient, email: str) -> dict:
+    user = {"email": email, "password": "secret"}
+    await async_client.post("/auth/register", json=user)
+    response = await async_client.post("/auth/login", json=user)
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.mark.asyncio
+async def test_profile_request(async_client: AsyncClient, db_session):
+    """Test that a superuser gets the profile of a request instead of its response."""
+    headers = await login(async_client, "admin@example.com")
+    await db_session.execute(update(User).where(User.email == "admin@example.com").values(is_superuser=True))
+    await db_session.commit()
+
+    response = await async_client.get("/tags/", headers={**headers, "X-Profile": "pstats"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["X-Profiled-Status"] == "200"
+    assert response.headers["Content-Disposition"] == 'attachment; filename="profile.prof"'
+    stats = marshal.loads(response.content)
+    assert any(name == "get_tags" for _, _, name in stats)
+
+    response = await async_client.get("/tags/", headers={**headers, "X-Profile": "collapsed"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["Content-Disposition"] == 'attachment; filename="profile.txt"'
+    for line in response.text.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack and int(count) > 0
+
+
+@pytest.mark.asyncio
+async def test_profile_requires_superuser(async_client: AsyncClient):
+    """Test that profiling is refused to anyone but superusers."""
+    response = await async_client.get("/tags/", headers={"X-Profile": "pstats"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    headers = await login(async_client, "user@example.com")
+    response = await async_client.get("/tags/", headers={**headers, "X-Profile": "pstats"})
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    response = await async_client.get("/tags/", headers={**headers, "X-Profile": "flamegraph"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    # Without the header the request is served as usual
+    response = await async_client.get("/tags/", headers=headers)
+    assert response.json() == []
@@ -0,0 +1,45 @@
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+
+import app.core.config as config
+from app.core.config import TEST_DATABASE_URL
+from app.core.singleflight import MISSING, feed_flights, post_flights
+from app.core.warmup import warmup
+from app.db.postgres import create_engines, create_sessionmaker
+from app.models.sql import Post, PostView
+
+
+@pytest.mark.asyncio
+async def test_ready_after_warmup(async_client: AsyncClient, db_session, monkeypatch):
+    """Test that the worker reports ready only once the warm-up has run, with hot caches."""
+    post = Post(id=str(uuid.uuid4()), user_id="user-123", title="Hot", slug="hot", content="Content")
+    db_session.add_all([post, PostView(post_id=post.id, views=42)])
+    await db_session.commit()
+    monkeypatch.setattr(post_flights, "ttl", 60)
+    monkeypatch.setattr(config, "SITE_URL", "https://blog.example.com/")
+
+    response = await async_client.get("/ready")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+    engine, read_engine = create_engines(TEST_DATABASE_URL)
+    try:
+        await warmup.run(read_engine, create_sessionmaker(engine, read_engine))
+    finally:
+        await engine.dispose()
+        await read_engine.dispose()
+
+    response = await async_client.get("/ready")
+    assert response.status_code == status.HTTP_200_OK
+    steps = response.json()["warmup"]
+    assert {name: step.get("result") for name, step in steps.items()} == {
+        "libraries": "loaded",
+        "connections": config.WARMUP_CONNECTIONS,
+        "hot_posts": 1,
+        "feed": steps["feed"]["result"],
+    }
+    assert steps["feed"]["result"] > 0
+    assert post_flights.peek("hot").title == "Hot"
+    assert feed_flights.peek("https://blog.example.com") is not MISSING
@@ -0,0 +1,73 @@
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+
+from app.core.config import TEST_DATABASE_URL
+from app.core.related import compute_related, related_index
+from app.db.postgres import create_engines, create_sessionmaker
+
+
+def test_compute_related():
+    """Test that neighbours are ranked by shared tags, rare tags counting for more."""
+    post_tags = {
+        "a": {"python", "asyncio"},
+        "b": {"python", "asyncio"},
+        "c": {"python"},
+        "d": {"python", "rust"},
+        "e": {"rust"},
+    }
+    related = compute_related(post_tags, ["a", "c", "e"], top_k=2, max_tag_posts=100)
+    assert [post_id for post_id, _ in related["a"]] == ["b", "c"]
+    assert related["a"][0][1] == pytest.approx(1.0)
+    assert [post_id for post_id, _ in related["e"]] == ["d"]
+
+    # Tags on too many posts are ignored
+    related = compute_related(post_tags, ["c"], top_k=2, max_tag_posts=3)
+    assert related["c"] == []
+
+    # Given the tag counts, the posts sharing a tag with "e" and their tags are enough
+    partial = {post_id: post_tags[post_id] for post_id in ("d", "e")}
+    counts = {"python": 4, "asyncio": 2, "rust": 2}
+    assert compute_related(partial, ["e"], 2, 100, counts, len(post_tags)) == compute_related(post_tags, ["e"], 2, 100)
+
+
+async def create_post(async_client: AsyncClient, slug: str, tags: list[str]):
+    payload = {"title": slug.title(), "slug": slug, "content": "Content", "user_id": "user-123"}
+    assert (await async_client.post("/posts/", json=payload)).status_code == status.HTTP_201_CREATED
+    await async_client.post(f"/posts/{slug}/tags", json=[{"name": name} for name in tags])
+
+
+@pytest.mark.asyncio
+async def test_related_posts(async_client: AsyncClient):
+    """Test that related posts are refreshed for the posts whose tags changed."""
+    await create_post(async_client, "first", ["python", "asyncio"])
+    await create_post(async_client, "second", ["python", "asyncio"])
+    await create_post(async_client, "third", ["python"])
+
+    engine, read_engine = create_engines(TEST_DATABASE_URL)
+    session_factory = create_sessionmaker(engine, read_engine)
+    try:
+        assert (await async_client.get("/posts/first/related")).json() == []
+        assert await related_index.refresh(session_factory) == 3
+        assert await related_index.refresh(session_factory) == 0
+
+        response = await async_client.get("/posts/first/related")
+        assert response.status_code == status.HTTP_200_OK
+        assert [post["slug"] for post in response.json()] == ["second", "third"]
+        assert response.json()[0]["score"] == pytest.approx(1.0)
+
+        # Deleting a post refreshes the posts it was related to
+        await async_client.delete("/posts/second")
+        await create_post(async_client, "fourth", ["python", "asyncio"])
+        assert await related_index.refresh(session_factory) == 2
+        response = await async_client.get("/posts/first/related")
+        assert [post["slug"] for post in response.json()] == ["fourth", "third"]
+
+        await related_index.rebuild(session_factory)
+        assert [post["slug"] for post in (await async_client.get("/posts/first/related")).json()] == ["fourth", "third"]
+    finally:
+        await engine.dispose()
+        await read_engine.dispose()
+
+    response = await async_client.get("/posts/missing/related")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,103 @@
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+
+import app.core.config as config
+from app.core.config import TEST_DATABASE_URL
+from app.core.render import RENDER_VERSION, render_markdown, render_post, rerender_stale
+from app.db.postgres import create_engines, create_sessionmaker
+from app.models.sql import Post
+
+
+def test_render_markdown():
+    """Test the supported Markdown syntax."""
+    source = "\n".join([
+        "# Title",
+        "Some **bold**, *italic* and `code <b>`.",
+        "Same paragraph with a [link](https://example.com).",
+        "",
+        "- one",
+        "- two",
+        "",
+        "1. first",
+        "",
+        "> quoted",
+        "",
+        "```python",
+        "print('<hi>')",
+        "```",
+        "---",
+    ])
+    assert render_markdown(source) == "\n".join([
+        "<h1>Title</h1>",
+        "<p>Some <strong>bold</strong>, <em>italic</em> and <code>code &lt;b&gt;</code>.\n"
+        'Same paragraph with a <a href="https://example.com" rel="nofollow noopener">link</a>.</p>',
+        "<ul><li>one</li><li>two</li></ul>",
+        "<ol><li>first</li></ol>",
+        "<blockquote><p>quoted</p></blockquote>",
+        '<pre><code class="language-python">print(\'&lt;hi&gt;\')</code></pre>',
+        "<hr>",
+    ])
+
+
+def test_render_markdown_is_sanitized():
+    """Test that raw HTML is escaped and unsafe URLs are dropped."""
+    html = render_markdown('<script>alert(1)</script> [click](javascript:alert) ![x](data:image/png;base64,AA) [ok](/posts/a"b)')
+    assert "<script>" not in html
+    assert "javascript:" not in html and "data:" not in html
+    assert html == (
+        '<p>&lt;script&gt;alert(1)&lt;/script&gt; click x '
+        '<a href="/posts/a&quot;b" rel="nofollow noopener">ok</a></p>'
+    )
+
+
+def test_render_post(monkeypatch):
+    """Test the derived excerpt and reading stats."""
+    monkeypatch.setattr(config, "EXCERPT_LENGTH", 20)
+    rendered = render_post("# Hello\n\nThe **quick** brown fox jumps over the lazy dog.")
+    assert rendered["excerpt"] == "Hello The quick…"
+    assert rendered["word_count"] == 10
+    assert rendered["render_version"] == RENDER_VERSION
+    assert len(rendered["content_hash"]) == 64
+
+
+@pytest.mark.asyncio
+async def test_posts_are_rendered_at_write(async_client: AsyncClient):
+    """Test that post responses include the stored render."""
+    payload = {"title": "Post", "slug": "post", "content": "Hello *world*", "user_id": "user-123"}
+    response = await async_client.post("/posts/", json=payload)
+    assert response.json()["html"] == "<p>Hello <em>world</em></p>"
+
+    response = await async_client.put(
+        "/posts/post",
+        json={"title": "Post", "slug": "post", "content": "Bye"},
+        headers={"If-Match": response.headers["ETag"]},
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await async_client.get("/posts/post")
+    post = response.json()
+    assert (post["html"], post["excerpt"], post["word_count"]) == ("<p>Bye</p>", "Bye", 1)
+    assert (await async_client.get("/posts/")).json()[0]["html"] == "<p>Bye</p>"
+
+
+@pytest.mark.asyncio
+async def test_rerender_stale_posts(async_client: AsyncClient, db_session):
+    """Test that the background job renders posts with a missing or outdated render."""
+    db_session.add_all([
+        Post(id=str(uuid.uuid4()), user_id="user-123", title="Old", slug="old", content="**old**", render_version=0),
+        Post(id=str(uuid.uuid4()), user_id="user-123", title="New", slug="new", content="new", html="<p>kept</p>", render_version=RENDER_VERSION),
+    ])
+    await db_session.commit()
+
+    engine, read_engine = create_engines(TEST_DATABASE_URL)
+    try:
+        assert await rerender_stale(create_sessionmaker(engine, read_engine)) == 1
+    finally:
+        await engine.dispose()
+        await read_engine.dispose()
+
+    assert (await async_client.get("/posts/old")).json()["html"] == "<p><strong>old</strong></p>"
+    assert (await async_client.get("/posts/new")).json()["html"] == "<p>kept</p>"
@@ -0,0 +1,55 @@
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+
+import app.core.config as config
+
+
+@pytest.fixture(autouse=True)
+def site_url(monkeypatch):
+    monkeypatch.setattr(config, "SITE_URL", "http://testserver")
+
+
+@pytest.mark.asyncio
+async def test_get_rss(async_client: AsyncClient):
+    """Test that the RSS feed lists the posts."""
+    payload = {
+        "title": "My First Post",
+        "slug": "my-first-post",
+        "content": "This is the content of my first post.",
+        "user_id": "user-123"
+    }
+    response = await async_client.post("/posts/", json=payload)
+    assert response.status_code == status.HTTP_201_CREATED
+
+    response = await async_client.get("/rss.xml")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/rss+xml")
+    assert "<title>My First Post</title>" in response.text
+    assert "http://testserver/posts/my-first-post" in response.text
+
+    # Writes invalidate the cached feed
+    payload["slug"] = "my-second-post"
+    payload["title"] = "My Second Post"
+    response = await async_client.post("/posts/", json=payload)
+    assert response.status_code == status.HTTP_201_CREATED
+
+    response = await async_client.get("/rss.xml")
+    assert "<title>My Second Post</title>" in response.text
+
+
+@pytest.mark.asyncio
+async def test_rss_describes_posts_with_their_rendered_html(async_client: AsyncClient):
+    """Test that feed items carry the sanitized HTML of the posts rather than their raw content."""
+    payload = {
+        "title": "Unsafe",
+        "slug": "unsafe",
+        "content": "**bold** <script>alert(1)</script>",
+        "user_id": "user-123"
+    }
+    response = await async_client.post("/posts/", json=payload)
+    assert response.status_code == status.HTTP_201_CREATED
+
+    response = await async_client.get("/rss.xml")
+    assert "&lt;strong&gt;bold&lt;/strong&gt;" in response.text
+    assert "&lt;script&gt;" not in response.text
@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime, UTC
+
+import pytest
+from sqlalchemy.engine import make_url
+
+import app.core.config as config
+from app.core.config import TEST_DATABASE_URL
+from app.core.scheduler import Cron, Scheduler
+from app.db.postgres import create_engines, create_sessionmaker
+
+
+def test_cron_next_after():
+    """Test that cron expressions match the times cron would run them at."""
+    start = datetime(2026, 1, 1, 10, 7, 30, tzinfo=UTC)
+    assert Cron("*/15 * * * *").next_after(start) == datetime(2026, 1, 1, 10, 15, tzinfo=UTC)
+    assert Cron("0 3 * * *").next_after(start) == datetime(2026, 1, 2, 3, 0, tzinfo=UTC)
+    # The 1st of January 2026 is a Thursday, the next Monday the 5th
+    assert Cron("30 9 * * 1").next_after(start) == datetime(2026, 1, 5, 9, 30, tzinfo=UTC)
+    # With both days restricted either one matches
+    assert Cron("0 0 10 * 1").next_after(start) == datetime(2026, 1, 5, 0, 0, tzinfo=UTC)
+    assert Cron("0 0 29 2 *").next_after(start) == datetime(2028, 2, 29, 0, 0, tzinfo=UTC)
+    for expression in ("* * * *", "60 * * * *", "0 0 30 2 *", "*/0 * * * *"):
+        with pytest.raises(ValueError):
+            Cron(expression)
+
+
+@pytest.mark.asyncio
+async def test_jobs_never_overlap(monkeypatch):
+    """Test that runs of a job never overlap, and that run times, timeouts and failures are recorded."""
+    monkeypatch.setattr(config, "SCHEDULER_JITTER", 0)
+    running, overlaps = [], []
+
+    async def slow(session_factory):
+        overlaps.append(len(running))
+        running.append(1)
+        await asyncio.sleep(0.02)
+        running.pop()
+
+    async def stuck(session_factory):
+        await asyncio.sleep(10)
+
+    async def broken(session_factory):
+        raise RuntimeError("boom")
+
+    scheduler = Scheduler()
+    slow_job = scheduler.add("slow", slow, interval=0.001)
+    stuck_job = scheduler.add("stuck", stuck, interval=0.001, timeout=0.01)
+    broken_job = scheduler.add("broken", broken, interval=0.01)
+    engine, read_engine = create_engines(TEST_DATABASE_URL)
+    try:
+        scheduler.start(create_sessionmaker(engine, read_engine), engine)
+        await asyncio.sleep(0.2)
+        scheduler.trigger("slow")
+        await scheduler.stop()
+    finally:
+        await engine.dispose()
+        await read_engine.dispose()
+
+    assert slow_job.runs > 2
+    assert set(overlaps) == {0}
+    assert stuck_job.timeouts > 0 and stuck_job.failures == 0
+    assert broken_job.failures == broken_job.runs > 0
+    stats = scheduler.stats()["jobs"]["slow"]
+    assert stats["run_seconds"]["count"] == slow_job.runs
+    assert stats["run_seconds"]["p50"] >= 0.02
+    assert stats["lag_seconds"]["count"] >= slow_job.runs
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(
+    make_url(TEST_DATABASE_URL).get_backend_name() != "postgresql", reason="Advisory locks need Postgres"
+)
+async def test_singleton_jobs_run_on_the_leader_only(monkeypatch):
+    """Test that one worker leads at a time, and that another takes over when it stops."""
+    monkeypatch.setattr(config, "SCHEDULER_LEADER_SECONDS", 0.01)
+    engine, read_engine = create_engines(TEST_DATABASE_URL)
+    session_factory = create_sessionmaker(engine, read_engine)
+
+    async def noop(session_factory):
+        pass
+
+    workers = [Scheduler(), Scheduler()]
+    jobs = [worker.add("singleton", noop, interval=0.01, singleton=True) for worker in workers]
+    try:
+        for worker in workers:
+            worker.start(session_factory, engine)
+        await asyncio.sleep(0.2)
+        assert sorted(worker.is_leader for worker in workers) == [False, True]
+        leader = 0 if workers[0].is_leader else 1
+        assert jobs[leader].runs > 0
+        assert jobs[1 - leader].runs == 0 and jobs[1 - leader].skipped > 0
+
+        await workers[leader].stop()
+        await asyncio.sleep(0.2)
+        assert workers[1 - leader].is_leader
+        assert jobs[1 - leader].runs > 0
+    finally:
+        for worker in workers:
+            await worker.stop()
+        await engine.dispose()
+        await read_engine.dispose()
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import MISSING, SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_flight():
+    """Test that concurrent calls for the same key run the work once."""
+    flights = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "post"
+
+    results = await asyncio.gather(*(flights.do("slug", fetch) for _ in range(50)))
+    assert results == ["post"] * 50
+    assert calls == 1
+
+    # Without a ttl nothing is cached once the flight has landed
+    await flights.do("slug", fetch)
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_propagate_to_every_caller():
+    """Test that a failing flight raises in every waiting caller and is not cached."""
+    flights = SingleFlight(ttl=60)
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(*(flights.do("slug", fail) for _ in range(5)), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flights.peek("slug") is MISSING
+
+
+@pytest.mark.asyncio
+async def test_timeout_does_not_cancel_the_flight():
+    """Test that a caller timing out leaves the shared call running for others."""
+    flights = SingleFlight(timeout=0.01, ttl=60)
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "post"
+
+    with pytest.raises(TimeoutError):
+        await flights.do("slug", slow)
+    await asyncio.sleep(0.1)
+    assert flights.peek("slug") == "post"
+
+
+@pytest.mark.asyncio
+async def test_stale_value_is_served_while_refreshing():
+    """Test that an expired value is served to others while one caller refreshes it."""
+    flights = SingleFlight(ttl=0.01, stale_ttl=60)
+    version = 0
+
+    async def fetch():
+        nonlocal version
+        await asyncio.sleep(0.02)
+        version += 1
+        return version
+
+    assert await flights.do("slug", fetch) == 1
+    await asyncio.sleep(0.02)
+
+    refresher = asyncio.ensure_future(flights.do("slug", fetch))
+    await asyncio.sleep(0)
+    assert await flights.do("slug", fetch) == 1
+    assert await refresher == 2
+
+    flights.forget("slug")
+    assert flights.peek("slug") is MISSING
@@ -0,0 +1,88 @@
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+
+import app.core.config as config
+from app.core.sitemap import sitemap_shards
+
+
+@pytest.fixture(autouse=True)
+def site_url(monkeypatch):
+    monkeypatch.setattr(config, "SITE_URL", "http://testserver")
+
+
+async def create_posts(async_client, count):
+    for i in range(count):
+        payload = {
+            "title": f"Post {i}",
+            "slug": f"post-{i}",
+            "content": f"Content of post {i}.",
+            "user_id": "user-123"
+        }
+        response = await async_client.post("/posts/", json=payload)
+        assert response.status_code == status.HTTP_201_CREATED
+
+
+@pytest.mark.asyncio
+async def test_sitemap_index_and_shard(async_client: AsyncClient):
+    """Test that the sitemap index links a shard listing every post."""
+    await create_posts(async_client, 3)
+
+    response = await async_client.get("/sitemap.xml")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/xml"
+    assert "<loc>http://testserver/sitemaps/0.xml</loc>" in response.text
+    assert "/sitemaps/1.xml" not in response.text
+
+    response = await async_client.get("/sitemaps/0.xml")
+    assert response.status_code == status.HTTP_200_OK
+    for i in range(3):
+        assert f"<loc>http://testserver/posts/post-{i}</loc>" in response.text
+    assert "<lastmod>" in response.text
+
+
+@pytest.mark.asyncio
+async def test_sitemap_shards_split_and_invalidate(async_client: AsyncClient, monkeypatch):
+    """Test that posts are split into shards and writes only refresh their own shard."""
+    monkeypatch.setattr(sitemap_shards, "shard_size", 2)
+    await create_posts(async_client, 5)
+
+    response = await async_client.get("/sitemap.xml")
+    assert "/sitemaps/2.xml" in response.text
+    assert "/sitemaps/3.xml" not in response.text
+
+    shards = [(await async_client.get(f"/sitemaps/{n}.xml")).text for n in range(3)]
+    assert sum(shard.count("<url>") for shard in shards) == 5
+
+    # Delete a post and check only its shard is re-rendered without it
+    deleted = next(n for n, shard in enumerate(shards) if "/posts/post-0<" in shard)
+    response = await async_client.delete("/posts/post-0")
+    assert response.status_code == status.HTTP_200_OK
+    for n in range(3):
+        assert (n == deleted) == (n not in sitemap_shards._documents)
+
+    response = await async_client.get(f"/sitemaps/{deleted}.xml")
+    assert "/posts/post-0<" not in response.text
+
+
+@pytest.mark.asyncio
+async def test_sitemap_shard_not_found(async_client: AsyncClient):
+    """Test requesting a shard beyond the last one."""
+    response = await async_client.get("/sitemaps/5.xml")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()["detail"] == "Sitemap does not exist"
+
+
+@pytest.mark.asyncio
+async def test_urls_never_come_from_the_host_header(async_client: AsyncClient, monkeypatch):
+    """Test that absolute URLs use the configured base URL whatever Host the client sends."""
+    await create_posts(async_client, 1)
+    monkeypatch.setattr(config, "SITEMAP_BASE_URL", "https://blog.example.com/")
+    response = await async_client.get("/sitemap.xml", headers={"Host": "evil.example.com"})
+    assert "<loc>https://blog.example.com/sitemaps/0.xml</loc>" in response.text
+    assert "evil" not in response.text
+
+    monkeypatch.setattr(config, "SITEMAP_BASE_URL", None)
+    monkeypatch.setattr(config, "SITE_URL", None)
+    assert (await async_client.get("/sitemap.xml")).status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert (await async_client.get("/rss.xml")).status_code == status.HTTP_503_SERVICE_UNAVAILABLE
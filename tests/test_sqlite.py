@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.future import select
+
+from app.db.postgres import Base, create_engines, create_sessionmaker
+from app.models.sql import Tag
+
+
+@pytest.mark.asyncio
+async def test_sqlite_routes_reads_and_writes(tmp_path):
+    """Test that SQLite sessions read on the reader pool and write on the single writer connection."""
+    writer, reader = create_engines(f"sqlite+aiosqlite:///{tmp_path / 'blog.db'}")
+    assert writer.pool.size() == 1
+    used = []
+    for name, engine in (("writer", writer), ("reader", reader)):
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args, name=name: used.append(name))
+    try:
+        async with writer.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            assert (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar() == "wal"
+
+        session_factory = create_sessionmaker(writer, reader)
+        async with session_factory() as db:
+            used.clear()
+            await db.execute(select(Tag))
+            assert set(used) == {"reader"}
+
+            used.clear()
+            db.add(Tag(id="tag-1", name="python"))
+            await db.flush()
+            # The transaction reads its own write on the writer
+            assert (await db.execute(select(Tag.name))).scalar_one() == "python"
+            await db.commit()
+            assert "reader" not in used
+
+            used.clear()
+            assert (await db.execute(select(Tag.name))).scalar_one() == "python"
+            assert set(used) == {"reader"}
+    finally:
+        await writer.dispose()
+        await reader.dispose()
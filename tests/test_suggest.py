@@ -0,0 +1,83 @@
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+
+from app.core.suggest import PrefixIndex, suggester
+
+
+async def create_post(async_client: AsyncClient, title: str, slug: str):
+    payload = {"title": title, "slug": slug, "content": "Content", "user_id": "user-123"}
+    response = await async_client.post("/posts/", json=payload)
+    assert response.status_code == status.HTTP_201_CREATED
+    return response
+
+
+@pytest.mark.asyncio
+async def test_suggest_before_index_is_built(async_client: AsyncClient):
+    """Test that suggestions are looked up in the database until the index is built."""
+    await create_post(async_client, "Asyncio in practice", "asyncio-in-practice")
+    await create_post(async_client, "100% coverage", "full-coverage")
+
+    response = await async_client.get("/suggest", params={"q": "ASYNC"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"posts": [{"slug": "asyncio-in-practice", "title": "Asyncio in practice"}], "tags": []}
+
+    # LIKE wildcards in the query are matched literally
+    response = await async_client.get("/suggest", params={"q": "1%", "kind": "posts"})
+    assert response.json()["posts"] == []
+
+
+@pytest.mark.asyncio
+async def test_suggest_from_index(async_client: AsyncClient, db_session):
+    """Test that the index matches word prefixes and follows post writes."""
+    await create_post(async_client, "Intro to asyncio", "intro-to-asyncio")
+    await suggester.rebuild(db_session)
+    assert suggester.ready
+
+    await create_post(async_client, "Async generators", "async-generators")
+    response = await async_client.get("/suggest", params={"q": "async", "kind": "posts"})
+    assert response.status_code == status.HTTP_200_OK
+    assert [post["slug"] for post in response.json()["posts"]] == ["async-generators", "intro-to-asyncio"]
+
+    etag = (await async_client.get("/posts/intro-to-asyncio")).headers["ETag"]
+    response = await async_client.put(
+        "/posts/intro-to-asyncio",
+        json={"title": "Intro to trio", "slug": "intro-to-trio", "content": "Content"},
+        headers={"If-Match": etag},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    await async_client.delete("/posts/async-generators")
+
+    response = await async_client.get("/suggest", params={"q": "async"})
+    assert response.json()["posts"] == []
+    response = await async_client.get("/suggest", params={"q": "intro t", "limit": 1})
+    assert response.json()["posts"] == [{"slug": "intro-to-trio", "title": "Intro to trio"}]
+
+
+@pytest.mark.asyncio
+async def test_suggest_tags(async_client: AsyncClient, db_session):
+    """Test that tags added to posts are suggested."""
+    await create_post(async_client, "My First Post", "my-first-post")
+    await suggester.rebuild(db_session)
+
+    response = await async_client.post("/posts/my-first-post/tags", json=[{"name": "Python"}, {"name": "pytest"}])
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await async_client.get("/suggest", params={"q": "py", "kind": "tags"})
+    assert [tag["name"] for tag in response.json()["tags"]] == ["pytest", "Python"]
+    assert response.json()["posts"] == []
+
+
+def test_prefix_index_long_texts():
+    """Test that prefixes longer than the stored keys are checked against the full text."""
+    index = PrefixIndex(key_length=4)
+    index.add("1", "abcdef", "first")
+    index.add("2", "abcdxy", "second")
+    index.add("1", "abcdeg", "first")
+
+    assert index.search("abcd", 10) == [("1", "first"), ("2", "second")]
+    assert index.search("abcdeg", 10) == [("1", "first")]
+    assert index.search("abcdef", 10) == []
+    index.remove("1")
+    assert index.search("abc", 10) == [("2", "second")]
+    assert len(index) == 1
@@ -0,0 +1,40 @@
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+
+from app.models.sql import Tag
+
+
+@pytest.mark.asyncio
+async def test_get_tags(async_client: AsyncClient, db_session):
+    """Test listing all tags ordered by name."""
+    db_session.add_all([Tag(id=str(uuid.uuid4()), name=name) for name in ("python", "asyncio")])
+    await db_session.commit()
+
+    response = await async_client.get("/tags/")
+    assert response.status_code == status.HTTP_200_OK
+    assert [tag["name"] for tag in response.json()] == ["asyncio", "python"]
+
+
+@pytest.mark.asyncio
+async def test_add_post_tags(async_client: AsyncClient, db_session):
+    """Test adding new and existing tags to a post."""
+    db_session.add(Tag(id=str(uuid.uuid4()), name="python"))
+    await db_session.commit()
+    payload = {"title": "My First Post", "slug": "my-first-post", "content": "Content", "user_id": "user-123"}
+    await async_client.post("/posts/", json=payload)
+
+    response = await async_client.post("/posts/my-first-post/tags", json=[{"name": "python"}, {"name": " asyncio "}])
+    assert response.status_code == status.HTTP_200_OK
+    assert [tag["name"] for tag in response.json()] == ["asyncio", "python"]
+
+    response = await async_client.post("/posts/my-first-post/tags", json=[{"name": "python"}])
+    assert [tag["name"] for tag in response.json()] == ["asyncio", "python"]
+
+    response = await async_client.get("/tags/")
+    assert [tag["name"] for tag in response.json()] == ["asyncio", "python"]
+
+    response = await async_client.post("/posts/missing/tags", json=[{"name": "python"}])
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,105 @@
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+
+import app.core.config as config
+import app.core.tracing as tracing
+from app.core.slug_filter import slug_filter
+
+
+@pytest.fixture
+def memory_exporter(monkeypatch):
+    exporter = tracing.MemoryExporter()
+    monkeypatch.setattr(tracing, "exporter", exporter)
+    return exporter
+
+
+@pytest.mark.asyncio
+async def test_sampled_request_is_traced(async_client: AsyncClient, memory_exporter, monkeypatch):
+    """Test that a sampled request produces a trace with its stages as child spans."""
+    payload = {
+        "title": "My First Post",
+        "slug": "my-first-post",
+        "content": "This is the content of my first post.",
+        "user_id": "user-123"
+    }
+    response = await async_client.post("/posts/", json=payload)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert not memory_exporter.traces
+
+    monkeypatch.setattr(config, "TRACE_SAMPLE_RATE", 1.0)
+    response = await async_client.get(f"/posts/{payload['slug']}")
+    assert response.status_code == status.HTTP_200_OK
+
+    assert len(memory_exporter.traces) == 1
+    spans = {span["name"]: span for span in memory_exporter.traces[0]["spans"]}
+    assert {"request", "route", "dependencies", "endpoint", "sql", "serialize"} <= set(spans)
+    assert spans["request"]["attributes"] == {"method": "GET", "path": "/posts/my-first-post", "status": 200}
+    assert spans["route"]["parent_id"] == spans["request"]["span_id"]
+    assert spans["endpoint"]["parent_id"] == spans["route"]["span_id"]
+    assert spans["sql"]["parent_id"] == spans["endpoint"]["span_id"]
+
+
+@pytest.mark.asyncio
+async def test_login_traces_bcrypt(async_client: AsyncClient, memory_exporter, monkeypatch):
+    """Test that password hashing shows up as its own span."""
+    monkeypatch.setattr(config, "TRACE_SAMPLE_RATE", 1.0)
+    response = await async_client.post("/auth/register", json={"email": "trace@example.com", "password": "secret"})
+    assert response.status_code == status.HTTP_201_CREATED
+
+    names = [span["name"] for span in memory_exporter.traces[-1]["spans"]]
+    assert "bcrypt.hash" in names
+
+
+def test_spans_are_noops_without_a_trace():
+    """Test that instrumentation does nothing outside of a sampled request."""
+    with tracing.span("sql") as span:
+        span.set_attribute("ignored", True)
+    assert span is tracing.NULL_SPAN
+    assert tracing.current_span() is None
+
+
+def test_jsonl_exporter_writes_traces(tmp_path):
+    """Test that the file exporter appends one JSON line per trace."""
+    exporter = tracing.JsonlExporter(str(tmp_path / "traces.jsonl"))
+    trace = tracing.Trace()
+    tracing.Span(trace, "request", None, {}).finish()
+    exporter.export(trace)
+    exporter.export(trace)
+    exporter.close()
+
+    lines = (tmp_path / "traces.jsonl").read_text().splitlines()
+    assert len(lines) == 2
+    assert '"name": "request"' in lines[0]
+
+
+@pytest.mark.asyncio
+async def test_sessions_are_released_when_the_endpoint_returns(async_client: AsyncClient, memory_exporter, monkeypatch, db_session):
+    """Test that a request's connection goes back before serialization, and its hold time is reported per route."""
+    await slug_filter.rebuild(db_session)
+    payload = {"title": "My First Post", "slug": "my-first-post", "content": "Content", "user_id": "user-123"}
+    await async_client.post("/posts/", json=payload)
+    held = (await async_client.get("/metrics")).json()["db_connection_hold_seconds"]
+
+    monkeypatch.setattr(config, "TRACE_SAMPLE_RATE", 1.0)
+    response = await async_client.get("/posts/")
+    assert response.status_code == status.HTTP_200_OK
+    spans = {span["name"]: span for span in memory_exporter.traces[-1]["spans"]}
+    assert spans["endpoint"]["start_ms"] + spans["endpoint"]["duration_ms"] <= spans["db.session_release"]["start_ms"]
+
+    # The slug filter answers for unknown slugs, without a connection being checked out
+    assert (await async_client.get("/posts/non-existent-slug")).status_code == status.HTTP_404_NOT_FOUND
+    holds = (await async_client.get("/metrics")).json()["db_connection_hold_seconds"]
+    assert holds["GET /posts/"]["count"] == held.get("GET /posts/", {"count": 0})["count"] + 1
+    assert holds.get("GET /posts/{slug}") == held.get("GET /posts/{slug}")
+    assert holds["POST /posts/"]["count"] >= 1
+
+    # Sessions opened through the session factory are reported under their route too
+    monkeypatch.setattr(config, "SITE_URL", "http://testserver")
+    assert (await async_client.get("/posts/my-first-post")).status_code == status.HTTP_200_OK
+    assert (await async_client.get("/rss.xml")).status_code == status.HTTP_200_OK
+    assert (await async_client.get("/tags/")).status_code == status.HTTP_200_OK
+    holds = (await async_client.get("/metrics")).json()["db_connection_hold_seconds"]
+    assert holds["GET /posts/{slug}"]["count"] >= 1
+    assert holds["GET /rss.xml"]["count"] >= 1
+    assert holds["GET /tags/"]["count"] >= 1
@@ -0,0 +1,71 @@
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+from sqlalchemy.future import select
+
+from app.core.views import view_counter
+from app.models.sql import PostView
+
+
+async def create_post(async_client, slug):
+    payload = {
+        "title": f"Title of {slug}",
+        "slug": slug,
+        "content": "Some content.",
+        "user_id": "user-123"
+    }
+    response = await async_client.post("/posts/", json=payload)
+    assert response.status_code == status.HTTP_201_CREATED
+
+
+@pytest.mark.asyncio
+async def test_views_are_counted_and_flushed(async_client: AsyncClient, db_session):
+    """Test that post views are buffered in memory and flushed in one batch."""
+    await create_post(async_client, "popular")
+    await create_post(async_client, "quiet")
+
+    for _ in range(3):
+        await async_client.get("/posts/popular")
+    await async_client.get("/posts/quiet")
+
+    # Pending views are visible before they reach the database
+    response = await async_client.get("/posts/popular/views")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"slug": "popular", "views": 3}
+
+    assert await view_counter.flush(db_session) == 2
+    assert await view_counter.flush(db_session) == 0
+    view_counter.reset()
+
+    response = await async_client.get("/posts/popular/views")
+    assert response.json()["views"] == 3
+
+    # Flushing again adds to the stored totals
+    await async_client.get("/posts/quiet")
+    await view_counter.flush(db_session)
+    view_counter.reset()
+
+    response = await async_client.get("/stats/top-posts", params={"limit": 5})
+    assert response.status_code == status.HTTP_200_OK
+    assert [(post["slug"], post["views"]) for post in response.json()] == [("popular", 3), ("quiet", 2)]
+
+
+@pytest.mark.asyncio
+async def test_views_of_missing_post(async_client: AsyncClient):
+    """Test asking for the views of a post that does not exist."""
+    response = await async_client.get("/posts/non-existent-slug/views")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_views_of_deleted_posts_are_dropped(async_client: AsyncClient, db_session):
+    """Test that pending views of a post deleted before the flush do not leave a counter behind."""
+    await create_post(async_client, "kept")
+    await create_post(async_client, "deleted")
+    await async_client.get("/posts/kept")
+    await async_client.get("/posts/deleted")
+    assert (await async_client.delete("/posts/deleted")).status_code == status.HTTP_200_OK
+
+    assert await view_counter.flush(db_session) == 1
+    result = await db_session.execute(select(PostView.post_id))
+    assert len(result.scalars().all()) == 1
@@ -0,0 +1,119 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+from sqlalchemy import update
+from sqlalchemy.future import select
+
+import app.core.config as config
+from app.core.config import TEST_DATABASE_URL
+from app.core.metrics import metrics
+from app.core.webhooks import SIGNATURE_HEADER, sign, webhook_dispatcher
+from app.db.postgres import create_engines, create_sessionmaker
+from app.models.sql import User, WebhookDelivery
+
+
+class StubReceiver(BaseHTTPRequestHandler):
+    # Answered in order, then 200 for every further request
+    statuses: list = []
+    received: list = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.received.append((dict(self.headers), body))
+        self.send_response(self.statuses.pop(0) if self.statuses else 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def receiver():
+    StubReceiver.statuses, StubReceiver.received = [], []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubReceiver)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/hook"
+    server.shutdown()
+    server.server_close()
+
+
+async def superuser_headers(async_client: AsyncClient, db_session) -> dict:
+    user = {"email": "admin@example.com", "password": "secret"}
+    await async_client.post("/auth/register", json=user)
+    await db_session.execute(update(User).where(User.email == user["email"]).values(is_superuser=True))
+    await db_session.commit()
+    response = await async_client.post("/auth/login", json=user)
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.mark.asyncio
+async def test_webhooks_are_delivered_with_retries(async_client: AsyncClient, db_session, receiver, monkeypatch):
+    """Test that post events go through the outbox and are retried until the endpoint accepts them."""
+    monkeypatch.setattr(config, "WEBHOOK_BACKOFF_BASE", 0)
+    headers = await superuser_headers(async_client, db_session)
+    response = await async_client.post("/webhooks/", json={"url": receiver, "secret": "s3cret"}, headers=headers)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["events"] is None
+
+    payload = {"title": "My First Post", "slug": "my-first-post", "content": "Content", "user_id": "user-123"}
+    post = (await async_client.post("/posts/", json=payload)).json()
+    await async_client.delete("/posts/my-first-post")
+
+    engine, read_engine = create_engines(TEST_DATABASE_URL)
+    session_factory = create_sessionmaker(engine, read_engine)
+    delivered = metrics.counter("webhook_deliveries_total").value
+    try:
+        async with httpx.AsyncClient() as client:
+            StubReceiver.statuses = [500]
+            assert await webhook_dispatcher.dispatch(session_factory, client) == 2
+            async with session_factory() as db:
+                deliveries = (await db.execute(select(WebhookDelivery))).scalars().all()
+            assert {(d.status, d.attempts, d.last_error) for d in deliveries} == {("pending", 1, "HTTP 500")}
+
+            assert await webhook_dispatcher.dispatch(session_factory, client) == 2
+            assert await webhook_dispatcher.dispatch(session_factory, client) == 0
+    finally:
+        await engine.dispose()
+        await read_engine.dispose()
+
+    # Both events of the endpoint went out in one request, signed
+    assert len(StubReceiver.received) == 2
+    request_headers, body = StubReceiver.received[-1]
+    assert request_headers[SIGNATURE_HEADER] == sign("s3cret", body)
+    events = json.loads(body)["events"]
+    assert [event["event"] for event in events] == ["post.created", "post.deleted"]
+    assert events[0]["data"]["id"] == post["id"]
+    assert events[0]["data"]["revision"] == post["revision"] == 1
+    assert events[0]["id"] < events[1]["id"]
+    assert metrics.counter("webhook_deliveries_total").value == delivered + 2
+
+
+@pytest.mark.asyncio
+async def test_webhook_subscriptions(async_client: AsyncClient, db_session, receiver):
+    """Test that endpoints only get the events they subscribed to, and that only superusers manage them."""
+    response = await async_client.post("/webhooks/", json={"url": receiver})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    headers = await superuser_headers(async_client, db_session)
+    response = await async_client.post("/webhooks/", json={"url": receiver, "events": ["post.nope"]}, headers=headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    response = await async_client.post("/webhooks/", json={"url": receiver, "events": ["post.deleted"]}, headers=headers)
+    webhook_id = response.json()["id"]
+
+    payload = {"title": "My First Post", "slug": "my-first-post", "content": "Content", "user_id": "user-123"}
+    await async_client.post("/posts/", json=payload)
+    deliveries = (await db_session.execute(select(WebhookDelivery))).scalars().all()
+    assert deliveries == []
+
+    response = await async_client.get("/webhooks/", headers=headers)
+    assert [webhook["id"] for webhook in response.json()] == [webhook_id]
+    response = await async_client.delete(f"/webhooks/{webhook_id}", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert (await async_client.get("/webhooks/", headers=headers)).json() == []